@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'gestion_vente.settings')
+# Vues de lecture async : un worker sert plusieurs pages pendant les requêtes lentes
+os.environ.setdefault('VENTE_VUES_ASYNC', '1')
 
 application = get_asgi_application()
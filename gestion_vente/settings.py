@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -30,11 +31,85 @@ ALLOWED_HOSTS = []
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# Profil choisi par la variable d'environnement VENTE_DB : 'sqlite' (défaut) ou 'postgresql'
+VENTE_DB = os.environ.get('VENTE_DB', 'sqlite')
+
+if VENTE_DB == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('POSTGRES_DB', 'gestion_vente'),
+            'USER': os.environ.get('POSTGRES_USER', 'gestion_vente'),
+            'PASSWORD': os.environ.get('POSTGRES_PASSWORD', ''),
+            'HOST': os.environ.get('POSTGRES_HOST', 'localhost'),
+            'PORT': os.environ.get('POSTGRES_PORT', '5432'),
+            'CONN_HEALTH_CHECKS': True,
+        }
     }
+    if os.environ.get('POSTGRES_POOL', '1') == '1':
+        # Pool de connexions psycopg (paquet psycopg[pool]) partagé par les threads
+        # du processus ; incompatible avec CONN_MAX_AGE, qui reste à 0
+        DATABASES['default']['OPTIONS'] = {
+            'pool': {
+                'min_size': int(os.environ.get('POSTGRES_POOL_MIN', 2)),
+                'max_size': int(os.environ.get('POSTGRES_POOL_MAX', 10)),
+                'timeout': int(os.environ.get('POSTGRES_POOL_TIMEOUT', 10)),
+            },
+        }
+    else:
+        # Sans pool (ex. derrière PgBouncer) : connexions persistantes par thread
+        DATABASES['default']['CONN_MAX_AGE'] = int(os.environ.get('POSTGRES_CONN_MAX_AGE', 600))
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('SQLITE_PATH', BASE_DIR / 'db.sqlite3'),
+            # Connexion gardée d'une requête à l'autre (PRAGMA appliqués une fois)
+            'CONN_MAX_AGE': int(os.environ.get('SQLITE_CONN_MAX_AGE', 600)),
+            'OPTIONS': {
+                # BEGIN IMMEDIATE : le verrou d'écriture est pris au début de la
+                # transaction, en respectant busy_timeout. Une transaction différée
+                # qui lit puis écrit échoue aussitôt en "database is locked" si un
+                # autre écrivain est passé entre-temps.
+                'transaction_mode': 'IMMEDIATE',
+            },
+        }
+    }
+
+# Réplique en lecture pour le tableau de bord, les rapports et les totaux des
+# listes (voir vente/replica.py). En local, un second fichier SQLite tenu à jour
+# par la commande synchroniser_replica en tient lieu.
+if VENTE_DB == 'postgresql' and os.environ.get('POSTGRES_REPLICA_HOST'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': os.environ.get('POSTGRES_REPLICA_DB', DATABASES['default']['NAME']),
+        'HOST': os.environ['POSTGRES_REPLICA_HOST'],
+        'PORT': os.environ.get('POSTGRES_REPLICA_PORT', DATABASES['default']['PORT']),
+    }
+elif VENTE_DB != 'postgresql' and os.environ.get('SQLITE_REPLICA_PATH'):
+    DATABASES['replica'] = {**DATABASES['default'], 'NAME': os.environ['SQLITE_REPLICA_PATH']}
+if 'replica' in DATABASES:
+    # Pendant les tests, la réplique est la base de test principale
+    DATABASES['replica']['TEST'] = {'MIRROR': 'default'}
+
+DATABASE_ROUTERS = ['vente.replica.RouteurReplica']
+VENTE_REPLICA_ALIAS = 'replica'
+# Retard toléré (secondes) : au-delà, les lectures repassent sur la base principale
+VENTE_REPLICA_RETARD_MAX = float(os.environ.get('VENTE_REPLICA_RETARD_MAX', 5))
+
+# PRAGMA appliqués à chaque nouvelle connexion SQLite (voir vente/signals.py) :
+# attente du verrou plutôt qu'une erreur immédiate et lecture du fichier par
+# mmap. Ils ne valent que pour la connexion et ne modifient pas le fichier.
+VENTE_SQLITE_PRAGMAS = {
+    'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT', 5000)),
+    'mmap_size': int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)),
+}
+# Appliqués en plus quand la base est en WAL : fsync seulement aux checkpoints
+# (sans risque de corruption en WAL, contrairement au journal classique).
+# Le passage en WAL est persistant et crée les fichiers -wal / -shm à côté de
+# la base : c'est une étape d'installation explicite, `manage.py activer_wal`.
+VENTE_SQLITE_PRAGMAS_WAL = {
+    'synchronous': 'normal',
 }
 
 
@@ -53,6 +128,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # En tête : mesure aussi le temps des autres middlewares (voir vente/metriques.py)
+    'vente.metriques.MetriquesMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -60,12 +137,14 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'vente.replica.EpinglagePrimaireMiddleware',
 ]
 
 # Templates — ajouter DIRS si tu veux templates globaux
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates qui mesure le temps de rendu pour /metrics
+        'BACKEND': 'vente.metriques.GabaritsMesures',
         'DIRS': [],  # ou ['templates'] si tu utilises templates partagés
         'APP_DIRS': True,
         'OPTIONS': {
@@ -95,3 +174,49 @@ STATIC_URL = '/static/'
 STATICFILES_DIRS = [
     BASE_DIR / 'static',
 ]
+
+# Durée (en secondes) de mise en cache des statistiques du tableau de bord.
+# Le cache est aussi invalidé à chaque modification de vente ou de produit ;
+# en production, utiliser un cache partagé (Redis, Memcached) dans CACHES.
+DASHBOARD_CACHE_TTL = 60
+
+# Jetons autorisés pour l'API d'import de ventes (en-tête "Authorization: Bearer <jeton>"),
+# séparés par des virgules dans la variable d'environnement VENTE_API_TOKENS.
+VENTE_API_TOKENS = [t for t in os.environ.get('VENTE_API_TOKENS', '').split(',') if t]
+VENTE_API_MAX_VENTES = 5000
+
+# Jetons autorisés à lire /metrics (en-tête "Authorization: Bearer <jeton>") ;
+# sans jeton configuré, l'URL est ouverte : la réserver alors au réseau interne
+VENTE_METRIQUES_JETONS = [t for t in os.environ.get('VENTE_METRIQUES_JETONS', '').split(',') if t]
+# Au-delà de cette durée (ms), une requête est journalisée avec ses requêtes SQL les plus coûteuses
+VENTE_REQUETE_LENTE_MS = int(os.environ.get('VENTE_REQUETE_LENTE_MS', 500))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'vente.performances': {'handlers': ['console'], 'level': 'WARNING'},
+    },
+}
+
+# Répertoire des rapports PDF générés en arrière-plan (commande run_report_worker)
+RAPPORTS_DIR = BASE_DIR / 'rapports_cache'
+# Au-delà de cette durée (secondes), un job resté "en cours" (worker arrêté
+# brutalement) est remis en attente
+RAPPORTS_DELAI_BLOCAGE = 600
+# Les PDF plus anciens (secondes) sont supprimés par le worker ; un rapport
+# expiré est simplement regénéré à la demande suivante
+RAPPORTS_DUREE_CONSERVATION = 7 * 24 * 3600
+
+# Variantes async des vues de lecture (tableau de bord, listes, rapports),
+# activées par gestion_vente/asgi.py : sous WSGI, les vues sync restent servies
+VENTE_VUES_ASYNC = os.environ.get('VENTE_VUES_ASYNC', '0') == '1'
+
+# Jeux de données et résultats du banc de performance (commande bench_vente)
+VENTE_BENCH_DIR = BASE_DIR / 'bench'
+
+# Nombre de lignes par page des listes (modifiable par ?taille=, au plus 100)
+VENTE_PAGE_TAILLE = 5
@@ -0,0 +1,155 @@
+"""
+Analyse RFM des clients : récence du dernier achat, fréquence (nombre
+d'achats) et montant total, notés de 1 à 5 parmi tous les clients, et le
+segment qui en découle. Le résultat est matérialisé dans ProfilClient, que
+la liste des clients ayant acheté et leur rapport PDF lisent au lieu
+d'agréger tout l'historique des ventes.
+
+La commande refresh_customer_analytics (à lancer régulièrement) ne lit que
+les ventes d'id supérieur à la dernière prise en compte, en une requête
+groupée par client, et les ajoute aux cumuls. Les notes de tous les clients
+sont ensuite recalculées d'un coup avec NumPy ; seules les lignes dont les
+cumuls ou les notes ont changé sont réécrites.
+
+Une vente modifiée ou supprimée après sa prise en compte (ou validée après
+une vente d'id supérieur déjà lue) n'est rattrapée que par un recalcul
+complet (--complet).
+"""
+from collections import Counter
+
+import numpy as np
+from django.db import connection, transaction
+from django.db.models import Count, Max, Min, Sum
+
+from .jobs import marquer_modification
+from .models import ProfilClient, Vente
+
+CLASSES = 5
+
+# Colonnes réécrites, dans l'ordre des tuples passés à executemany
+CHAMPS = (
+    'nb_achats', 'montant_total', 'premier_achat', 'dernier_achat', 'derniere_vente',
+    'score_recence', 'score_frequence', 'score_montant', 'segment',
+)
+
+
+def noter(valeurs, classes=CLASSES):
+    """
+    Note de 1 à `classes` selon le rang de chaque valeur parmi toutes (1 pour
+    les plus faibles). Les ex aequo reçoivent la note de leur rang moyen.
+    """
+    valeurs = np.asarray(valeurs, np.float64)
+    if not len(valeurs):
+        return np.empty(0, np.int64)
+    triees = np.sort(valeurs)
+    rang = (np.searchsorted(triees, valeurs, 'left') + np.searchsorted(triees, valeurs, 'right') - 1) / 2
+    return np.clip(1 + np.floor(classes * (rang + 0.5) / len(valeurs)), 1, classes).astype(np.int64)
+
+
+def segmenter(recence, frequence, montant, nb_achats):
+    """Segment de chaque client à partir de ses notes (première règle vérifiée)"""
+    regles = [
+        (ProfilClient.CHAMPION, (recence >= 4) & (frequence >= 4) & (montant >= 4)),
+        (ProfilClient.FIDELE, (recence >= 3) & (frequence >= 4)),
+        (ProfilClient.A_RISQUE, (recence <= 2) & (frequence >= 3) & (nb_achats > 1)),
+        (ProfilClient.NOUVEAU, (recence >= 4) & (nb_achats == 1)),
+        (ProfilClient.PROMETTEUR, recence >= 3),
+    ]
+    return np.select([condition for _, condition in regles], [segment for segment, _ in regles], ProfilClient.PERDU)
+
+
+def rafraichir_profils(complet=False):
+    """
+    Ajoute aux profils les ventes arrivées depuis le dernier rafraîchissement
+    (toutes si `complet`) et recalcule notes et segments. Retourne les nombres
+    de ventes lues, de profils et de profils réécrits, et la répartition par
+    segment.
+    """
+    with transaction.atomic():
+        if complet:
+            ProfilClient.objects.all().delete()
+        depuis = ProfilClient.objects.aggregate(dernier=Max('derniere_vente'))['dernier'] or 0
+        achats = (
+            Vente.objects.filter(id__gt=depuis, client__isnull=False)
+            .values_list('client_id')
+            .annotate(Count('id'), Sum('total'), Min('date_vente'), Max('date_vente'), Max('id'))
+            .order_by()
+        )
+        profils = {
+            client_id: list(valeurs)
+            for client_id, *valeurs in ProfilClient.objects.values_list('client_id', *CHAMPS)
+        }
+        existants = set(profils)
+        modifies = set()
+        nb_ventes = 0
+        for client_id, nb, montant, premier, dernier, derniere in achats:
+            nb_ventes += nb
+            modifies.add(client_id)
+            profil = profils.get(client_id)
+            if profil is None:
+                profils[client_id] = [nb, montant, premier, dernier, derniere, 0, 0, 0, '']
+                continue
+            profil[0] += nb
+            profil[1] += montant
+            profil[2] = min(profil[2], premier)
+            profil[3] = max(profil[3], dernier)
+            profil[4] = max(profil[4], derniere)
+
+        ids = list(profils)
+        if not ids:
+            return {'ventes': 0, 'clients': 0, 'modifies': 0, 'segments': Counter()}
+        colonnes = list(zip(*profils.values()))
+        nb_achats = np.array(colonnes[0], np.int64)
+        notes = np.array([
+            noter([date.timestamp() for date in colonnes[3]]),
+            noter(nb_achats),
+            noter([float(montant) for montant in colonnes[1]]),
+        ])
+        segments = segmenter(*notes, nb_achats)
+        changes = (
+            (notes != np.array(colonnes[5:8])).any(axis=0)
+            | (segments != np.array(colonnes[8]))
+            | np.isin(ids, list(modifies))
+        )
+
+        mis_a_jour, crees = [], []
+        for i in np.flatnonzero(changes).tolist():
+            profil = profils[ids[i]]
+            profil[5:] = [*notes[:, i].tolist(), str(segments[i])]
+            (mis_a_jour if ids[i] in existants else crees).append((ids[i], profil))
+        _ecrire(mis_a_jour, crees)
+        if mis_a_jour or crees:
+            transaction.on_commit(marquer_modification)
+
+    return {
+        'ventes': nb_ventes,
+        'clients': len(ids),
+        'modifies': len(mis_a_jour) + len(crees),
+        'segments': Counter(segments.tolist()),
+    }
+
+
+def _ecrire(mis_a_jour, crees):
+    """
+    UPDATE et INSERT par executemany : instancier et compiler une requête par
+    profil coûtait l'essentiel d'un rafraîchissement complet
+    """
+    champs = [ProfilClient._meta.get_field(champ) for champ in CHAMPS]
+
+    def valeurs(profil):
+        return [champ.get_db_prep_save(valeur, connection) for champ, valeur in zip(champs, profil)]
+
+    table = ProfilClient._meta.db_table
+    colonnes = [champ.column for champ in champs]
+    with connection.cursor() as cursor:
+        if mis_a_jour:
+            cursor.executemany(
+                f"UPDATE {table} SET {', '.join(f'{colonne} = %s' for colonne in colonnes)} WHERE client_id = %s",
+                [(*valeurs(profil), client_id) for client_id, profil in mis_a_jour],
+            )
+        if crees:
+            cursor.executemany(
+                f"INSERT INTO {table} (client_id, {', '.join(colonnes)}) "
+                f"VALUES ({', '.join(['%s'] * (len(colonnes) + 1))})",
+                [(client_id, *valeurs(profil)) for client_id, profil in crees],
+            )
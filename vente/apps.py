@@ -4,3 +4,11 @@ from django.apps import AppConfig
 class VenteConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'vente'
+
+    def ready(self):
+        from django.db.models.signals import post_migrate
+
+        from . import signals  # noqa: F401
+        from .recherche import installer_recherche
+
+        post_migrate.connect(installer_recherche, sender=self)
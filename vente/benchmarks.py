@@ -0,0 +1,526 @@
+"""
+Banc de performance de l'application (commande bench_vente).
+
+Les mesures tournent sur des jeux de données figés (seed_ventes, graine et
+date de fin fixes) de plusieurs tailles : 1k, 100k et 1M ventes. Chaque jeu
+est généré une fois dans VENTE_BENCH_DIR, puis copié avant chaque passage :
+les mesures qui écrivent (passage en caisse, décrément de stock) ne modifient
+pas le jeu de référence.
+
+Quatre familles de mesures :
+- micro : méthodes des modèles (calculer_total, decrementer_stock) ;
+- pages : chaque URL de vente/urls.py via le client de test, cache vidé
+  avant chaque appel (calcul complet des statistiques) ;
+- charge : passages en caisse concurrents, un processus par caisse ;
+- concurrence : navigateurs simultanés sur les pages de lecture, servis par
+  un worker WSGI à quelques threads (vues sync) puis par un worker ASGI
+  (vues async), sans cache du tableau de bord.
+
+Chaque mesure donne p50/p95 (ms), requêtes SQL par appel et pic de mémoire
+résidente (Ko). Les résultats sont un dict sérialisable en JSON, comparable
+à un fichier de référence enregistré (comparer()).
+"""
+import asyncio
+import importlib
+import io
+import json
+import multiprocessing
+import random
+import sqlite3
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import date
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management import call_command
+from django.db import OperationalError, connection, connections
+from django.db.backends.signals import connection_created
+from django.test import Client as ClientTest
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import clear_url_caches, reverse
+
+from .generation import JeuDeDonnees
+from .models import Produit, Client, Vente, RapportJob
+from .services import passer_vente, StockInsuffisant
+
+TAILLES = {
+    '1k': {'ventes': 1_000, 'clients': 100, 'produits': 50},
+    '100k': {'ventes': 100_000, 'clients': 2_000, 'produits': 500},
+    '1m': {'ventes': 1_000_000, 'clients': 20_000, 'produits': 2_000},
+}
+GRAINE = 42
+# Date de fin fixe : le même jeu d'un jour à l'autre
+FIN = date(2026, 1, 31)
+
+# Une mesure s'arrête après `repetitions` appels ou DUREE_MAX secondes
+REPETITIONS = 20
+DUREE_MAX = 10
+# Hausse de p95 au-delà de laquelle comparer() signale une régression
+TOLERANCE = 0.2
+
+
+class BenchImpossible(Exception):
+    pass
+
+
+# -----------------------
+# Jeux de données
+# -----------------------
+def chemin_jeu(taille):
+    return Path(settings.VENTE_BENCH_DIR) / f'ventes_{taille}.sqlite3'
+
+
+def preparer_jeu(taille, rappel=None):
+    """
+    Génère le jeu `taille` s'il n'existe pas, puis bascule les connexions sur
+    une copie de travail. Réservé à SQLite (un fichier par jeu).
+    """
+    if taille not in TAILLES:
+        raise BenchImpossible(f"Taille inconnue : {taille} ({', '.join(TAILLES)})")
+    if connections['default'].vendor != 'sqlite':
+        raise BenchImpossible('Jeux de données en fichiers SQLite uniquement ; sinon utiliser la base actuelle')
+    reference = chemin_jeu(taille)
+    reference.parent.mkdir(parents=True, exist_ok=True)
+    if not reference.exists():
+        en_cours = reference.with_suffix('.en_cours')
+        en_cours.unlink(missing_ok=True)
+        _utiliser(en_cours)
+        call_command('migrate', verbosity=0, interactive=False)
+        JeuDeDonnees(**TAILLES[taille], fin=FIN, graine=GRAINE, rappel=rappel).generer()
+        connections.close_all()
+        en_cours.rename(reference)
+
+    travail = reference.with_name(f'{reference.stem}_travail.sqlite3')
+    connections.close_all()
+    source = sqlite3.connect(reference)
+    cible = sqlite3.connect(travail)
+    try:
+        source.backup(cible)
+    finally:
+        cible.close()
+        source.close()
+    _utiliser(travail)
+    return travail
+
+
+def _utiliser(chemin):
+    """Les alias SQLite (réplique comprise) ouvrent désormais `chemin`"""
+    connections.close_all()
+    for alias in connections:
+        if connections[alias].vendor == 'sqlite':
+            connections[alias].settings_dict['NAME'] = str(chemin)
+
+
+# -----------------------
+# Mesures
+# -----------------------
+def _reinitialiser_pic_rss():
+    # Linux : remet VmHWM au niveau actuel
+    try:
+        with open('/proc/self/clear_refs', 'w') as fichier:
+            fichier.write('5')
+    except OSError:
+        pass
+
+
+def _pic_rss_ko():
+    try:
+        with open('/proc/self/status') as fichier:
+            for ligne in fichier:
+                if ligne.startswith('VmHWM:'):
+                    return int(ligne.split()[1])
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def _centiles(durees):
+    if len(durees) == 1:
+        return durees[0], durees[0]
+    centiles = statistics.quantiles(durees, n=100, method='inclusive')
+    return centiles[49], centiles[94]
+
+
+def mesurer(appel, repetitions=REPETITIONS, duree_max=DUREE_MAX, avant=None):
+    """Appelle `appel()` jusqu'à `repetitions` fois (au moins une, au plus `duree_max` s)"""
+    _reinitialiser_pic_rss()
+    durees = []
+    requetes = 0
+    fin = time.monotonic() + duree_max
+    while len(durees) < repetitions and (not durees or time.monotonic() < fin):
+        if avant:
+            avant()
+        with CaptureQueriesContext(connection) as capture:
+            debut = time.perf_counter()
+            appel()
+            durees.append(time.perf_counter() - debut)
+        requetes = max(requetes, len(capture))
+    p50, p95 = _centiles(durees)
+    return {
+        'iterations': len(durees),
+        'p50_ms': round(p50 * 1000, 3),
+        'p95_ms': round(p95 * 1000, 3),
+        'requetes': requetes,
+        'pic_rss_ko': _pic_rss_ko(),
+    }
+
+
+def micro_benchmarks(repetitions=REPETITIONS, duree_max=DUREE_MAX):
+    vente = Vente.objects.filter(lignes__isnull=False).order_by('pk').first()
+    produit = Produit.objects.create(nom='Produit banc micro', prix=1, stock=10 ** 9)
+    resultats = {}
+    if vente:
+        resultats['micro:calculer_total'] = mesurer(vente.calculer_total, repetitions, duree_max)
+    resultats['micro:decrementer_stock'] = mesurer(lambda: produit.decrementer_stock(1), repetitions, duree_max)
+    return resultats
+
+
+def pages(produit, vente, panier):
+    """(nom, méthode, url, options) de chaque URL mesurée ; `panier` : produits vendus par les POST"""
+    donnees_vente = {
+        'client': vente.client_id or '', 'lignes-TOTAL_FORMS': len(panier), 'lignes-INITIAL_FORMS': 0,
+        **{f'lignes-{i}-produit': p.pk for i, p in enumerate(panier)},
+        **{f'lignes-{i}-quantite': 1 for i in range(len(panier))},
+        **{f'lignes-{i}-prix_unitaire': p.prix for i, p in enumerate(panier)},
+    }
+    import_api = json.dumps({'ventes': [
+        {'client': vente.client_id, 'lignes': [{'produit': p.pk, 'quantite': 1}]} for p in panier
+    ]})
+    job = RapportJob.objects.create(type_rapport=RapportJob.TYPE_VENTES, cle_cache='banc', statut=RapportJob.TERMINE)
+    filtre_mois = {'date_from': f'{FIN:%Y-%m}-01', 'date_to': f'{FIN:%Y-%m-%d}'}
+    return [
+        ('tableau_bord', 'get', reverse('vente:tableau_bord'), {}),
+        ('liste_produits', 'get', reverse('vente:liste_produits'), {}),
+        ('modifier_produit', 'get', reverse('vente:modifier_produit', args=[produit.pk]), {}),
+        ('produits_autocomplete', 'get', reverse('vente:produits_autocomplete'), {'data': {'q': 'riz'}}),
+        ('catalogue_produits', 'get', reverse('vente:catalogue_produits'), {}),
+        ('liste_clients', 'get', reverse('vente:liste_clients'), {}),
+        ('clients_autocomplete', 'get', reverse('vente:clients_autocomplete'), {'data': {'q': 'diop'}}),
+        ('liste_ventes', 'get', reverse('vente:liste_ventes'), {}),
+        ('liste_ventes (filtre)', 'get', reverse('vente:liste_ventes'), {'data': filtre_mois}),
+        ('creer_vente', 'get', reverse('vente:creer_vente'), {}),
+        ('creer_vente (POST)', 'post', reverse('vente:creer_vente'), {'data': donnees_vente}),
+        ('api_importer_ventes', 'post', reverse('vente:api_importer_ventes'), {
+            'data': import_api, 'content_type': 'application/json', 'HTTP_AUTHORIZATION': 'Bearer banc',
+        }),
+        ('clients_achetes', 'get', reverse('vente:clients_achetes'), {'data': filtre_mois}),
+        ('exporter_clients_pdf', 'get', reverse('vente:exporter_clients_pdf'), {'data': filtre_mois}),
+        ('exporter_ventes_pdf', 'get', reverse('vente:exporter_ventes_pdf'), {'data': filtre_mois}),
+        ('exporter_lignes_ventes', 'get', reverse('vente:exporter_lignes_ventes'), {'data': filtre_mois}),
+        ('statut_rapport', 'get', reverse('vente:statut_rapport', args=[job.pk]), {}),
+        ('metriques', 'get', reverse('vente:metriques'), {}),
+    ]
+
+
+def benchmarks_pages(repetitions=REPETITIONS, duree_max=DUREE_MAX, noms=None):
+    utilisateur, _ = User.objects.get_or_create(username='banc')
+    client = ClientTest()
+    client.force_login(utilisateur)
+    produit = Produit.objects.order_by('pk').first()
+    vente = Vente.objects.exclude(client=None).order_by('-pk').first()
+    if produit is None or vente is None:
+        raise BenchImpossible('Base sans produit ni vente : lancer seed_ventes')
+
+    # Stock inépuisable : les POST répétés ne tombent jamais en rupture
+    panier = Produit.objects.bulk_create([
+        Produit(nom=f'Produit banc page {i}', prix=5 + i, stock=10 ** 9) for i in range(3)
+    ])
+
+    resultats = {}
+    reglages = override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'], VENTE_API_TOKENS=['banc'])
+    with reglages:
+        for nom, methode, url, options in pages(produit, vente, panier):
+            if noms and nom not in noms:
+                continue
+
+            def appel():
+                reponse = getattr(client, methode)(url, **options)
+                if reponse.streaming:
+                    b''.join(reponse.streaming_content)
+                reponse.close()
+                if reponse.status_code >= 400:
+                    raise BenchImpossible(f'{nom} : HTTP {reponse.status_code}')
+
+            resultats[f'page:{nom}'] = mesurer(appel, repetitions, duree_max, avant=cache.clear)
+    return resultats
+
+
+def caisse(tache):
+    """Passe `nb_ventes` ventes depuis un processus ; retourne (durées, erreurs)"""
+    numero, nb_ventes, client_id, produit_ids, nb_lignes = tache
+    hasard = random.Random(numero)
+    client = Client.objects.get(pk=client_id)
+    produits = list(Produit.objects.filter(pk__in=produit_ids))
+    durees = []
+    erreurs = []
+    try:
+        for _ in range(nb_ventes):
+            lignes = [
+                {'produit': produit, 'quantite': hasard.randint(1, 3), 'prix_unitaire': produit.prix}
+                for produit in hasard.sample(produits, min(nb_lignes, len(produits)))
+            ]
+            debut = time.perf_counter()
+            try:
+                passer_vente(Vente(client=client), lignes)
+            except (OperationalError, StockInsuffisant) as e:
+                erreurs.append(str(e))
+                continue
+            durees.append(time.perf_counter() - debut)
+    finally:
+        connections.close_all()
+    return durees, erreurs
+
+
+def passages_concurrents(client, produits, nb_caisses, nb_ventes, nb_lignes=3):
+    """
+    `nb_caisses` processus passant chacun `nb_ventes` ventes. Retourne
+    (durées de chaque vente, erreurs, durée totale).
+    """
+    # Chaque processus ouvre sa propre connexion (ou son propre pool)
+    connections.close_all()
+    taches = [
+        (numero, nb_ventes, client.pk, [produit.pk for produit in produits], nb_lignes)
+        for numero in range(nb_caisses)
+    ]
+    debut = time.perf_counter()
+    with multiprocessing.get_context('fork').Pool(nb_caisses) as pool:
+        resultats = pool.map(caisse, taches)
+    total = time.perf_counter() - debut
+    durees = [duree for mesures, _ in resultats for duree in mesures]
+    erreurs = [erreur for _, echecs in resultats for erreur in echecs]
+    return durees, erreurs, total
+
+
+def benchmark_charge(nb_caisses=8, nb_ventes=50):
+    import resource
+    client = Client.objects.create(nom='Client banc de charge')
+    produits = Produit.objects.bulk_create([
+        Produit(nom=f'Produit banc charge {i}', prix=10 + i, stock=10 ** 9) for i in range(20)
+    ])
+    durees, erreurs, total = passages_concurrents(client, produits, nb_caisses, nb_ventes)
+    p50, p95 = _centiles(durees) if durees else (0, 0)
+    return {'charge:passer_vente': {
+        'caisses': nb_caisses,
+        'iterations': len(durees),
+        'ventes_par_s': round(len(durees) / total, 1),
+        'p50_ms': round(p50 * 1000, 3),
+        'p95_ms': round(p95 * 1000, 3),
+        'echecs': len(erreurs),
+        # Plus gros processus de caisse
+        'pic_rss_ko': resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+    }}
+
+
+# -----------------------
+# Concurrence : worker ASGI (vues async) contre worker WSGI (vues sync)
+# -----------------------
+PAGES_CONCURRENCE = ('tableau_bord', 'liste_ventes', 'clients_achetes')
+
+
+@contextmanager
+def vues_async(actives=True):
+    """Sert les variantes async des vues de lecture, comme sous ASGI (VENTE_VUES_ASYNC)"""
+    from . import urls
+
+    def charger(valeur):
+        with override_settings(VENTE_VUES_ASYNC=valeur):
+            importlib.reload(urls)
+        # Le résolveur de l'include('vente.urls') garde les anciens motifs
+        importlib.reload(importlib.import_module(settings.ROOT_URLCONF))
+        clear_url_caches()
+
+    charger(actives)
+    try:
+        yield
+    finally:
+        charger(settings.VENTE_VUES_ASYNC)
+
+
+def _requete_wsgi(application, chemin, cookie):
+    statut = []
+    environ = {
+        'REQUEST_METHOD': 'GET', 'PATH_INFO': chemin, 'QUERY_STRING': '', 'SCRIPT_NAME': '',
+        'SERVER_NAME': 'testserver', 'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.1',
+        'HTTP_HOST': 'testserver', 'HTTP_COOKIE': cookie, 'REMOTE_ADDR': '127.0.0.1',
+        'wsgi.version': (1, 0), 'wsgi.url_scheme': 'http', 'wsgi.input': io.BytesIO(), 'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True, 'wsgi.multiprocess': False, 'wsgi.run_once': False,
+    }
+    reponse = application(environ, lambda status, headers, exc_info=None: statut.append(int(status[:3])))
+    try:
+        for _ in reponse:
+            pass
+    finally:
+        reponse.close()
+    return statut[0]
+
+
+async def _requete_asgi(application, chemin, cookie):
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+        'path': chemin, 'raw_path': chemin.encode(), 'query_string': b'', 'root_path': '',
+        'headers': [(b'host', b'testserver'), (b'cookie', cookie.encode())],
+        'client': ('127.0.0.1', 0), 'server': ('testserver', 80),
+    }
+    corps_envoye = False
+    statut = []
+
+    async def recevoir():
+        nonlocal corps_envoye
+        if not corps_envoye:
+            corps_envoye = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        # Le navigateur reste connecté jusqu'à la fin de la réponse
+        await asyncio.Event().wait()
+
+    async def envoyer(message):
+        if message['type'] == 'http.response.start':
+            statut.append(message['status'])
+
+    await application(scope, recevoir, envoyer)
+    return statut[0]
+
+
+def _charge_wsgi(chemins, cookie, nb_navigateurs, nb_requetes, nb_threads):
+    """Chaque navigateur attend sa réponse avant la requête suivante ; `nb_threads` les servent"""
+    application = WSGIHandler()
+    durees = []
+    echecs = []
+    with ThreadPoolExecutor(nb_threads) as serveur:
+        def navigateur(numero):
+            for i in range(nb_requetes):
+                debut = time.perf_counter()
+                statut = serveur.submit(
+                    _requete_wsgi, application, chemins[(numero + i) % len(chemins)], cookie
+                ).result()
+                durees.append(time.perf_counter() - debut)
+                if statut != 200:
+                    echecs.append(statut)
+
+        with ThreadPoolExecutor(nb_navigateurs) as navigateurs:
+            list(navigateurs.map(navigateur, range(nb_navigateurs)))
+    return durees, echecs
+
+
+async def _charge_asgi(chemins, cookie, nb_navigateurs, nb_requetes):
+    """Mêmes navigateurs, servis par une seule boucle d'événements"""
+    application = ASGIHandler()
+    durees = []
+    echecs = []
+
+    async def navigateur(numero):
+        for i in range(nb_requetes):
+            debut = time.perf_counter()
+            statut = await _requete_asgi(application, chemins[(numero + i) % len(chemins)], cookie)
+            durees.append(time.perf_counter() - debut)
+            if statut != 200:
+                echecs.append(statut)
+
+    await asyncio.gather(*(navigateur(numero) for numero in range(nb_navigateurs)))
+    return durees, echecs
+
+
+@contextmanager
+def latence_sql(secondes):
+    """
+    Ajoute `secondes` d'attente à chaque requête SQL, comme l'aller-retour
+    vers un serveur PostgreSQL distant (SQLite répond sans attente réseau)
+    """
+    def attendre(execute, sql, params, many, context):
+        time.sleep(secondes)
+        return execute(sql, params, many, context)
+
+    def poser(sender, connection, **kwargs):
+        connection.execute_wrappers.insert(0, attendre)
+
+    if not secondes:
+        yield
+        return
+    # Les connexions ouvertes dans le bloc, dans tous les threads, reçoivent l'attente
+    connections.close_all()
+    connection_created.connect(poser, weak=False)
+    try:
+        yield
+    finally:
+        connection_created.disconnect(poser)
+        connections.close_all()
+        for connexion in connections.all(initialized_only=True):
+            if attendre in connexion.execute_wrappers:
+                connexion.execute_wrappers.remove(attendre)
+
+
+def benchmark_concurrence(nb_navigateurs=20, nb_requetes=10, nb_threads=4, noms=None, latence=0):
+    """
+    Latence des pages de lecture sous `nb_navigateurs` navigateurs simultanés :
+    worker WSGI à `nb_threads` threads puis worker ASGI, statistiques
+    recalculées à chaque requête (DASHBOARD_CACHE_TTL=0). `latence` (s)
+    simule le temps réseau de chaque requête SQL.
+    """
+    utilisateur, _ = User.objects.get_or_create(username='banc')
+    client = ClientTest()
+    client.force_login(utilisateur)
+    cookie = f'{settings.SESSION_COOKIE_NAME}={client.cookies[settings.SESSION_COOKIE_NAME].value}'
+    chemins = [reverse(f'vente:{nom}') for nom in PAGES_CONCURRENCE if not noms or nom in noms]
+    if not chemins:
+        raise BenchImpossible(f'Pages de la mesure de concurrence : {", ".join(PAGES_CONCURRENCE)}')
+
+    resultats = {}
+    reglages = override_settings(
+        ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'], DASHBOARD_CACHE_TTL=0,
+        # Toutes les requêtes sont lentes sous cette charge : pas de journal
+        VENTE_REQUETE_LENTE_MS=float('inf'),
+    )
+    for serveur in ('wsgi', 'asgi'):
+        debut = time.perf_counter()
+        with reglages, vues_async(serveur == 'asgi'), latence_sql(latence):
+            if serveur == 'wsgi':
+                durees, echecs = _charge_wsgi(chemins, cookie, nb_navigateurs, nb_requetes, nb_threads)
+            else:
+                durees, echecs = asyncio.run(_charge_asgi(chemins, cookie, nb_navigateurs, nb_requetes))
+        total = time.perf_counter() - debut
+        p50, p95 = _centiles(durees)
+        resultats[f'concurrence:{serveur}'] = {
+            'navigateurs': nb_navigateurs,
+            'threads': nb_threads if serveur == 'wsgi' else None,
+            'latence_sql_ms': latence * 1000,
+            'iterations': len(durees),
+            'pages_par_s': round(len(durees) / total, 1),
+            'p50_ms': round(p50 * 1000, 3),
+            'p95_ms': round(p95 * 1000, 3),
+            'echecs': len(echecs),
+            'pic_rss_ko': _pic_rss_ko(),
+        }
+    return resultats
+
+
+# -----------------------
+# Comparaison à une référence
+# -----------------------
+def comparer(resultats, reference, tolerance=TOLERANCE):
+    """
+    Écarts avec une référence : liste de (mesure, champ, avant, après,
+    régression). Régression : p95 en hausse de plus de `tolerance`, ou
+    davantage de requêtes SQL par appel.
+    """
+    ecarts = []
+    for nom, mesure in resultats.items():
+        avant = reference.get(nom)
+        if not avant:
+            continue
+        for champ in ('p50_ms', 'p95_ms', 'requetes'):
+            if champ not in mesure or champ not in avant:
+                continue
+            if champ == 'requetes':
+                regression = mesure[champ] > avant[champ]
+            else:
+                regression = champ == 'p95_ms' and mesure[champ] > avant[champ] * (1 + tolerance)
+            ecarts.append((nom, champ, avant[champ], mesure[champ], regression))
+    return ecarts
@@ -0,0 +1,55 @@
+"""
+Instantané versionné du catalogue produits (id, nom, prix, stock).
+
+Chaque écriture d'un produit lui attribue une version (horodatage en ms, voir
+nouvelle_version_catalogue) ; la version du catalogue est la plus grande
+d'entre elles, ou celle de la dernière suppression. Un client qui connaît la
+version V ne demande que les produits modifiés depuis (?depuis=V).
+
+Deux transactions concurrentes peuvent valider leurs versions dans le
+désordre ; le delta reprend donc aussi les FENETRE_MS précédant V (le client
+fusionne par id, un produit renvoyé deux fois est sans effet).
+
+L'ETag, lui, ne peut pas reposer sur ces horodatages : une transaction
+horodatée plus tôt mais validée plus tard ne change pas leur maximum. Il est
+formé du compteur d'EtatCatalogue, incrémenté dans chaque transaction qui
+écrit des produits (marquer_catalogue) : tant que rien n'est validé, la
+revalidation (If-None-Match) répond 304.
+"""
+from django.db.models import F, Max
+
+from .models import Produit, EtatCatalogue, nouvelle_version_catalogue
+
+FENETRE_MS = 60_000
+
+
+def etat_actuel():
+    """(compteur des écritures validées, version de la dernière suppression)"""
+    return EtatCatalogue.objects.filter(pk=1).values_list('compteur', 'derniere_suppression').first() or (0, 0)
+
+
+def marquer_suppression():
+    """Appelé à la suppression d'un produit : les clients rechargeront tout le catalogue"""
+    suppression = nouvelle_version_catalogue()
+    if not EtatCatalogue.objects.filter(pk=1).update(derniere_suppression=suppression, compteur=F('compteur') + 1):
+        EtatCatalogue.objects.get_or_create(pk=1, defaults={'derniere_suppression': suppression, 'compteur': 1})
+
+
+def instantane(depuis=None, suppression=None):
+    """
+    Catalogue complet, ou produits modifiés depuis la version `depuis`.
+    Retourne un dict {'version', 'complet', 'produits': [[id, nom, prix, stock], ...]}.
+    """
+    if suppression is None:
+        suppression = etat_actuel()[1]
+    version = max(Produit.objects.aggregate(version=Max('version'))['version'] or 0, suppression)
+    # Un produit supprimé depuis n'apparaîtrait pas dans le delta : catalogue complet
+    complet = depuis is None or depuis < suppression
+    produits = Produit.objects.order_by('id')
+    if not complet:
+        produits = produits.filter(version__gt=depuis - FENETRE_MS)
+    return {
+        'version': version,
+        'complet': complet,
+        'produits': [list(ligne) for ligne in produits.values_list('id', 'nom', 'prix', 'stock')],
+    }
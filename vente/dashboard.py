@@ -0,0 +1,221 @@
+"""
+Statistiques du tableau de bord calculées en un minimum de requêtes et gardées
+en cache (voir DASHBOARD_CACHE_TTL). Le cache est invalidé par les signaux de
+vente/signals.py dès qu'une vente, une ligne ou un produit change.
+
+Calculées sur la réplique (voir vente/replica.py), elles sont gardées sous une
+clé à part et au plus VENTE_REPLICA_RETARD_MAX secondes : une réplique en
+retard ne doit pas remplir le cache lu après une écriture.
+
+Les vues async (sous ASGI) passent par asnapshot() : sur un cache vide, les
+requêtes indépendantes du calcul partent en parallèle (voir en_parallele).
+"""
+import asyncio
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections, connections
+from django.db.models import Count, F, Q, Sum
+from django.utils import timezone
+
+from .models import Produit, Client, Vente, LigneVente, StatJour, StatMois, PrevisionStock
+from .replica import base_lecture
+
+
+class DashboardStats:
+    cache_key = 'vente:dashboard_stats'
+
+    def __init__(self, now=None):
+        self.now = now or timezone.now()
+
+    @classmethod
+    def _cle_et_duree(cls):
+        cle = cls.cache_key
+        duree = getattr(settings, 'DASHBOARD_CACHE_TTL', 60)
+        if base_lecture():
+            cle = f'{cls.cache_key}:replica'
+            duree = min(duree, getattr(settings, 'VENTE_REPLICA_RETARD_MAX', 5))
+        return cle, duree
+
+    @classmethod
+    def snapshot(cls):
+        """Retourne les statistiques depuis le cache, en les recalculant si besoin"""
+        cle, duree = cls._cle_et_duree()
+        stats = cache.get(cle)
+        if stats is None:
+            stats = cls().calculer()
+            cache.set(cle, stats, duree)
+        return stats
+
+    @classmethod
+    async def asnapshot(cls):
+        """snapshot() pour les vues async"""
+        cle, duree = cls._cle_et_duree()
+        stats = await cache.aget(cle)
+        if stats is None:
+            stats = await cls().acalculer()
+            await cache.aset(cle, stats, duree)
+        return stats
+
+    @classmethod
+    def invalider(cls):
+        cache.delete_many([cls.cache_key, f'{cls.cache_key}:replica'])
+
+    def calculer(self):
+        return self.assembler({nom: requete() for nom, requete in self.requetes().items()})
+
+    async def acalculer(self):
+        requetes = self.requetes()
+        return self.assembler(dict(zip(requetes, await en_parallele(list(requetes.values())))))
+
+    def _periodes(self):
+        date_24h = self.now - timedelta(hours=24)
+        aujourdhui = timezone.localdate(self.now)
+        debut_mois = aujourdhui.replace(day=1)
+        annee, mois = debut_mois.year, debut_mois.month - 11
+        if mois < 1:
+            annee, mois = annee - 1, mois + 12
+        debut_12_mois = debut_mois.replace(year=annee, month=mois)
+        return date_24h, aujourdhui, debut_mois, debut_12_mois
+
+    def requetes(self):
+        """Requêtes indépendantes du calcul : nom -> fonction sans argument qui l'exécute"""
+        date_24h, _, _, debut_12_mois = self._periodes()
+        lignes_24h = LigneVente.objects.filter(vente__date_vente__gte=date_24h)
+        return {
+            # Produits : total, stock et alertes en une seule requête
+            'produits': lambda: Produit.objects.aggregate(
+                nb=Count('id'),
+                stock_total=Sum('stock'),
+                nb_seuil=Count('id', filter=Q(stock__lte=F('seuil_alerte'))),
+            ),
+            'produits_seuil': lambda: list(
+                Produit.objects.filter(stock__lte=F('seuil_alerte'))
+                .order_by('stock')
+                .values('id', 'nom', 'stock', 'seuil_alerte')
+            ),
+            'clients': Client.objects.count,
+            # Cumuls tous temps (agrégats mensuels)
+            'cumul': lambda: StatMois.objects.aggregate(
+                nb_ventes=Sum('nb_ventes'),
+                chiffre_affaires=Sum('chiffre_affaires'),
+                quantite=Sum('quantite'),
+            ),
+            # Dernières 24 heures
+            'ventes_24h': lambda: Vente.objects.filter(date_vente__gte=date_24h).aggregate(
+                nb=Count('id'),
+                ca=Sum('total'),
+            ),
+            'produits_vendus_24h': lambda: lignes_24h.aggregate(total=Sum('quantite'))['total'] or 0,
+            'top_produits': lambda: list(
+                lignes_24h.values('produit__nom')
+                .annotate(quantite_totale=Sum('quantite'))
+                .order_by('-quantite_totale')[:5]
+            ),
+            'top_clients': lambda: list(
+                Vente.objects.filter(date_vente__gte=date_24h, client__isnull=False)
+                .values('client__nom')
+                .annotate(nb_achats=Count('id'), montant_total=Sum('total'))
+                .order_by('-montant_total')[:5]
+            ),
+            # Séries 7 jours et 12 mois à partir d'une seule lecture des agrégats journaliers
+            'stat_jours': lambda: list(
+                StatJour.objects.filter(date__gte=debut_12_mois).values_list('date', 'nb_ventes', 'chiffre_affaires')
+            ),
+            # Ruptures les plus proches (prévisions de la commande refresh_forecasts)
+            'ruptures_prevues': lambda: list(
+                PrevisionStock.objects.filter(jours_avant_rupture__isnull=False)
+                .order_by('jours_avant_rupture')
+                .values('produit__nom', 'stock', 'demande_jour', 'jours_avant_rupture',
+                        'date_rupture', 'quantite_a_commander')[:5]
+            ),
+        }
+
+    def assembler(self, resultats):
+        """Statistiques du tableau de bord à partir des résultats de requetes()"""
+        _, aujourdhui, debut_mois, _ = self._periodes()
+        produits = resultats['produits']
+        cumul = resultats['cumul']
+        ventes_24h = resultats['ventes_24h']
+
+        par_jour = {}
+        par_mois = {}
+        for date, nb_ventes, ca in resultats['stat_jours']:
+            par_jour[date] = (nb_ventes, ca)
+            cle = (date.year, date.month)
+            par_mois[cle] = par_mois.get(cle, 0) + ca
+
+        ventes_par_jour = {}
+        ventes_7j = 0
+        for i in range(7):
+            date = aujourdhui - timedelta(days=6-i)
+            nb_ventes, ca = par_jour.get(date, (0, 0))
+            ventes_par_jour[date.strftime('%d/%m')] = float(ca)
+            ventes_7j += nb_ventes
+
+        ventes_par_mois = {}
+        annee, mois = aujourdhui.year, aujourdhui.month
+        for i in range(12):
+            mois_str = debut_mois.replace(year=annee, month=mois).strftime('%b %Y')
+            ventes_par_mois[mois_str] = float(par_mois.get((annee, mois), 0))
+            annee, mois = (annee, mois - 1) if mois > 1 else (annee - 1, 12)
+
+        return {
+            'produits_count': produits['nb'],
+            'total_stock': produits['stock_total'] or 0,
+            'produits_seuil': resultats['produits_seuil'],
+            'produits_seuil_count': produits['nb_seuil'],
+            'clients_count': resultats['clients'],
+            'ventes_count': cumul['nb_ventes'] or 0,
+            'total_ca': cumul['chiffre_affaires'] or 0,
+            'produits_vendus': cumul['quantite'] or 0,
+            'ventes_count_24h': ventes_24h['nb'],
+            'total_ca_24h': ventes_24h['ca'] or 0,
+            'produits_vendus_24h': resultats['produits_vendus_24h'],
+            'top_produits': resultats['top_produits'],
+            'top_clients': resultats['top_clients'],
+            'ruptures_prevues': resultats['ruptures_prevues'],
+            'ventes_7j': ventes_7j,
+            'ventes_par_jour': ventes_par_jour,
+            'ventes_par_mois': ventes_par_mois,
+        }
+
+
+async def en_parallele(requetes):
+    """
+    Résultats de requêtes indépendantes (fonctions sans argument), exécutées
+    en même temps, chacune dans un thread du pool avec sa propre connexion.
+
+    L'ORM async (acount, aaggregate...) exécute toutes les requêtes d'une
+    requête HTTP dans un même thread : rassemblées par asyncio.gather, elles
+    s'enchaîneraient quand même.
+    """
+    resultats = await sync_to_async(_en_serie_dans_transaction)(requetes)
+    if resultats is not None:
+        return resultats
+    return await asyncio.gather(*(
+        sync_to_async(_sur_sa_connexion(requete), thread_sensitive=False)() for requete in requetes
+    ))
+
+
+def _en_serie_dans_transaction(requetes):
+    """
+    Dans une transaction (ATOMIC_REQUESTS, tests), exécute les requêtes l'une
+    après l'autre sur la connexion courante, seule à voir ses écritures non
+    validées ; sinon None.
+    """
+    if any(connexion.in_atomic_block for connexion in connections.all(initialized_only=True)):
+        return [requete() for requete in requetes]
+    return None
+
+
+def _sur_sa_connexion(requete):
+    def executer():
+        try:
+            return requete()
+        finally:
+            # Comme en fin de requête HTTP : connexion gardée selon CONN_MAX_AGE
+            close_old_connections()
+    return executer
@@ -0,0 +1,169 @@
+"""
+Export brut des lignes de vente (comptabilité), en CSV ou en XLSX.
+
+Les lignes sont lues par paquets (QuerySet.iterator) et le fichier est produit
+au fil de l'eau par un générateur, destiné à une StreamingHttpResponse : le
+téléchargement commence aussitôt et la mémoire utilisée ne dépend pas du
+nombre de lignes.
+
+Le XLSX est écrit sans bibliothèque tierce : une archive zip (écrite en
+flux, sans retour en arrière) contenant une seule feuille, dont les textes
+sont en ligne (inlineStr) plutôt que dans une table partagée qu'il faudrait
+garder en mémoire.
+"""
+import csv
+from datetime import datetime
+from xml.sax.saxutils import escape
+import zipfile
+
+from django.utils import timezone
+
+from .models import LigneVente
+
+COLONNES = ['vente', 'date', 'client', 'produit', 'quantite', 'prix_unitaire', 'total_ligne']
+TAILLE_PAQUET = 2000
+# Lignes écrites avant de rendre la main à la réponse HTTP
+LIGNES_PAR_MORCEAU = 500
+
+
+def lignes_ventes(filtre, taille_paquet=TAILLE_PAQUET):
+    """
+    Lignes de vente retenues par `filtre` (mêmes critères que la liste des
+    ventes), triées par date de vente. Génère des tuples dans l'ordre de COLONNES.
+    """
+    lignes = (
+        LigneVente.objects.filter(filtre.q('vente__'))
+        .order_by('vente__date_vente', 'vente_id', 'id')
+        .values_list(
+            'vente_id', 'vente__date_vente', 'vente__client__nom', 'produit__nom', 'quantite', 'prix_unitaire'
+        )
+    )
+    for vente_id, date, client, produit, quantite, prix in lignes.iterator(chunk_size=taille_paquet):
+        yield vente_id, timezone.localtime(date), client or '', produit, quantite, prix, quantite * prix
+
+
+class _Tampon:
+    """Objet fichier minimal : accumule ce qui est écrit jusqu'au prochain vider()"""
+
+    def __init__(self, vide=''):
+        self.vide = vide
+        self.morceaux = []
+
+    def write(self, donnees):
+        self.morceaux.append(donnees)
+        return len(donnees)
+
+    def flush(self):
+        pass
+
+    def vider(self):
+        donnees = self.vide.join(self.morceaux)
+        self.morceaux = []
+        return donnees
+
+
+def exporter_csv(lignes):
+    """Morceaux (str) du fichier CSV : en-tête puis lignes"""
+    tampon = _Tampon()
+    ecrivain = csv.writer(tampon)
+    # BOM : Excel reconnaît l'UTF-8 (noms accentués)
+    tampon.write('\ufeff')
+    ecrivain.writerow(COLONNES)
+    for numero, (vente_id, date, client, produit, quantite, prix, total) in enumerate(lignes, start=1):
+        ecrivain.writerow([vente_id, f'{date:%Y-%m-%d %H:%M:%S}', client, produit, quantite, prix, total])
+        if numero % LIGNES_PAR_MORCEAU == 0:
+            yield tampon.vider()
+    yield tampon.vider()
+
+
+# Fichiers fixes du classeur : une feuille, un style de date (format intégré 22)
+_FICHIERS_XLSX = {
+    '[Content_Types].xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '<Override PartName="/xl/styles.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+        '</Types>'
+    ),
+    '_rels/.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    ),
+    'xl/workbook.xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="Lignes de vente" sheetId="1" r:id="rId1"/></sheets>'
+        '</workbook>'
+    ),
+    'xl/_rels/workbook.xml.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+        'Target="worksheets/sheet1.xml"/>'
+        '<Relationship Id="rId2" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" '
+        'Target="styles.xml"/>'
+        '</Relationships>'
+    ),
+    'xl/styles.xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+        '<fonts count="1"><font><sz val="11"/><name val="Calibri"/></font></fonts>'
+        '<fills count="1"><fill><patternFill patternType="none"/></fill></fills>'
+        '<borders count="1"><border/></borders>'
+        '<cellStyleXfs count="1"><xf/></cellStyleXfs>'
+        '<cellXfs count="2"><xf/><xf numFmtId="22" applyNumberFormat="1"/></cellXfs>'
+        '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+        '</styleSheet>'
+    ),
+}
+
+_ORIGINE_EXCEL = datetime(1899, 12, 30)
+
+
+def _cellule_texte(valeur):
+    return f'<c t="inlineStr"><is><t>{escape(str(valeur))}</t></is></c>'
+
+
+def _cellule_date(date):
+    ecart = date.replace(tzinfo=None) - _ORIGINE_EXCEL
+    return f'<c s="1"><v>{ecart.days + ecart.seconds / 86400:.6f}</v></c>'
+
+
+def exporter_xlsx(lignes):
+    """Morceaux (bytes) du classeur XLSX : une feuille, en-tête puis lignes"""
+    tampon = _Tampon(b'')
+    # Flux sans seek() : zipfile écrit les tailles après chaque fichier (data descriptor)
+    with zipfile.ZipFile(tampon, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for nom, contenu in _FICHIERS_XLSX.items():
+            archive.writestr(nom, contenu)
+        with archive.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as feuille:
+            feuille.write((
+                '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+                '<row>' + ''.join(_cellule_texte(colonne) for colonne in COLONNES) + '</row>'
+            ).encode())
+            morceau = []
+            for vente_id, date, client, produit, quantite, prix, total in lignes:
+                morceau.append(
+                    f'<row><c><v>{vente_id}</v></c>{_cellule_date(date)}{_cellule_texte(client)}'
+                    f'{_cellule_texte(produit)}<c><v>{quantite}</v></c><c><v>{prix}</v></c><c><v>{total}</v></c></row>'
+                )
+                if len(morceau) == LIGNES_PAR_MORCEAU:
+                    feuille.write(''.join(morceau).encode())
+                    morceau = []
+                    yield tampon.vider()
+            feuille.write((''.join(morceau) + '</sheetData></worksheet>').encode())
+    yield tampon.vider()
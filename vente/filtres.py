@@ -0,0 +1,123 @@
+"""
+Filtres communs aux listes et rapports de ventes (période, client, produit).
+
+Les dates sont traduites en intervalles semi-ouverts sur date_vente
+([début du jour, lendemain du dernier jour[) pour que la base puisse utiliser
+un index sur la colonne plutôt que d'appliquer une fonction à chaque ligne.
+"""
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
+from urllib.parse import urlencode
+
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import ID_MAX, LigneVente
+
+
+class FiltreVentes:
+    def __init__(self, date_from=None, date_to=None, client=None, produit=None):
+        self.date_from = date_from
+        self.date_to = date_to
+        self.client = client
+        self.produit = produit
+
+    @classmethod
+    def depuis_requete(cls, params):
+        """Construit le filtre à partir de request.GET (valeurs invalides ignorées)"""
+        return cls(
+            date_from=_lire_date(params.get('date_from')),
+            date_to=_lire_date(params.get('date_to')),
+            client=_lire_id(params.get('client')),
+            produit=_lire_id(params.get('produit')),
+        )
+
+    @classmethod
+    def depuis_dict(cls, donnees):
+        return cls.depuis_requete(donnees or {})
+
+    def as_dict(self):
+        """Valeurs du filtre sérialisables en JSON (paramètres de RapportJob)"""
+        donnees = {}
+        if self.date_from:
+            donnees['date_from'] = self.date_from.isoformat()
+        if self.date_to:
+            donnees['date_to'] = self.date_to.isoformat()
+        if self.client:
+            donnees['client'] = self.client
+        if self.produit:
+            donnees['produit'] = self.produit
+        return donnees
+
+    def querystring(self):
+        """Paramètres d'URL pour transmettre le filtre (liens d'export, pagination)"""
+        return urlencode(self.as_dict())
+
+    @property
+    def est_actif(self):
+        return bool(self.as_dict())
+
+    def q(self, prefixe=''):
+        """
+        Conditions sur les ventes, sous forme de Q.
+        `prefixe` permet de filtrer depuis un modèle lié (ex. 'vente__').
+        """
+        condition = Q()
+        # Une borne hors des dates représentables (ex. 9999-12-31) laisse la période ouverte
+        debut = self.date_from and _debut_du_jour(self.date_from)
+        if debut:
+            condition &= Q(**{f'{prefixe}date_vente__gte': debut})
+        fin = self.date_to and self.date_to < date.max and _debut_du_jour(self.date_to + timedelta(days=1))
+        if fin:
+            condition &= Q(**{f'{prefixe}date_vente__lt': fin})
+        if self.client:
+            condition &= Q(**{f'{prefixe}client_id': self.client})
+        if self.produit:
+            condition &= Q(**{f'{prefixe}id__in': LigneVente.objects.filter(
+                produit_id=self.produit
+            ).values('vente_id')})
+        return condition
+
+    def filtrer(self, ventes):
+        return ventes.filter(self.q())
+
+    def description(self):
+        """Résumé lisible du filtre, affiché dans les rapports"""
+        parties = []
+        if self.date_from and self.date_to:
+            parties.append(f"du {self.date_from:%d/%m/%Y} au {self.date_to:%d/%m/%Y}")
+        elif self.date_from:
+            parties.append(f"depuis le {self.date_from:%d/%m/%Y}")
+        elif self.date_to:
+            parties.append(f"jusqu'au {self.date_to:%d/%m/%Y}")
+        if self.client:
+            parties.append(f"client #{self.client}")
+        if self.produit:
+            parties.append(f"produit #{self.produit}")
+        return ', '.join(parties)
+
+
+def _debut_du_jour(jour):
+    """Début du jour en heure locale, None s'il n'a pas d'équivalent UTC (année 1 ou 9999)"""
+    debut = timezone.make_aware(datetime.combine(jour, time.min))
+    try:
+        debut.astimezone(dt_timezone.utc)
+    except OverflowError:
+        return None
+    return debut
+
+
+def _lire_date(valeur):
+    if not valeur:
+        return None
+    try:
+        return datetime.strptime(valeur, '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        return None
+
+
+def _lire_id(valeur):
+    try:
+        valeur = int(valeur)
+    except (TypeError, ValueError):
+        return None
+    return valeur if 0 < valeur <= ID_MAX else None
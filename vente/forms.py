@@ -1,6 +1,47 @@
 from django import forms
-from .models import Produit, Client, Vente, LigneVente
-from django.forms import inlineformset_factory
+from django.core.exceptions import ValidationError
+from django.urls import reverse_lazy
+from .models import ID_MAX, Produit, Client, Vente, LigneVente
+from django.forms import inlineformset_factory, BaseInlineFormSet
+from django.forms.models import ModelChoiceIterator
+
+
+def _ids_valides(valeurs):
+    """
+    Valeurs envoyées pouvant être des identifiants ; les autres (texte, 0, ou
+    au-delà de ID_MAX, que la base refuserait en paramètre) ne désignent aucun objet
+    """
+    return {int(v) for v in valeurs if str(v).isdigit() and 0 < int(v) <= ID_MAX}
+
+
+class SelectionAutocomplete(forms.Select):
+    """
+    <select> dont les options sont chargées à la demande depuis `url`
+    (voir recherche.py) : seule l'option sélectionnée est rendue, jamais la table entière.
+    """
+
+    def __init__(self, url, attrs=None):
+        super().__init__(attrs)
+        self.url = url
+
+    def get_context(self, name, value, attrs):
+        context = super().get_context(name, value, attrs)
+        context['widget']['attrs']['data-autocomplete'] = str(self.url)
+        return context
+
+    def optgroups(self, name, value, attrs=None):
+        choix = self.choices
+        selection = [v for v in value if v]
+        if isinstance(choix, ModelChoiceIterator):
+            ids = _ids_valides(selection)
+            objets = choix.queryset.filter(pk__in=ids) if ids else []
+            self.choices = [('', choix.field.empty_label)] + [choix.choice(objet) for objet in objets]
+        else:
+            self.choices = [(v, libelle) for v, libelle in choix if v in ('', None) or str(v) in selection]
+        try:
+            return super().optgroups(name, value, attrs)
+        finally:
+            self.choices = choix
 
 class ProduitForm(forms.ModelForm):
     class Meta:
@@ -16,9 +57,86 @@ class VenteForm(forms.ModelForm):
     class Meta:
         model = Vente
         fields = ['client', 'paiement_effectue']
+        widgets = {
+            'client': SelectionAutocomplete(url=reverse_lazy('vente:clients_autocomplete')),
+        }
+
+
+class ProduitChoiceField(forms.ModelChoiceField):
+    """Choix de produit pouvant s'appuyer sur des produits déjà chargés (voir BaseLigneVenteFormSet)"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.produits = None
+
+    def to_python(self, value):
+        if self.produits is None or value in self.empty_values:
+            return super().to_python(value)
+        try:
+            return self.produits[int(value)]
+        except (KeyError, TypeError, ValueError):
+            raise ValidationError(
+                self.error_messages['invalid_choice'], code='invalid_choice', params={'value': value}
+            )
+
+
+class LigneVenteForm(forms.ModelForm):
+    class Meta:
+        model = LigneVente
+        fields = ('produit', 'quantite', 'prix_unitaire')
+        field_classes = {'produit': ProduitChoiceField}
+        widgets = {
+            'produit': SelectionAutocomplete(url=reverse_lazy('vente:produits_autocomplete')),
+        }
+
+    def _get_validation_exclusions(self):
+        exclusions = super()._get_validation_exclusions()
+        if self.fields['produit'].produits is not None:
+            # Produit déjà validé parmi ceux chargés par le formset : pas de SELECT par ligne
+            exclusions.add('produit')
+        return exclusions
+
+
+class BaseLigneVenteFormSet(BaseInlineFormSet):
+    """
+    Sans cela, chaque ligne relirait son produit pour le valider puis
+    l'afficher : une requête par ligne du panier. Ici seuls les produits
+    envoyés sont lus, en une requête partagée par toutes les lignes ; la
+    liste complète n'est jamais chargée (options servies par l'autocomplétion).
+    """
+
+    def __init__(self, *args, **kwargs):
+        self._produits = None
+        super().__init__(*args, **kwargs)
+
+    def _produits_choisis(self):
+        if self._produits is None:
+            ids = _ids_valides(
+                self.data.get(f'{self.add_prefix(i)}-produit') for i in range(self.total_form_count())
+            ) if self.is_bound else set()
+            self._produits = Produit.objects.in_bulk(list(ids)) if ids else {}
+        return self._produits
+
+    def _partager_produits(self, form):
+        champ = form.fields['produit']
+        champ.produits = self._produits_choisis()
+        champ.choices = [('', champ.empty_label)] + [
+            (produit.pk, champ.label_from_instance(produit)) for produit in champ.produits.values()
+        ]
+        return form
+
+    def _construct_form(self, i, **kwargs):
+        return self._partager_produits(super()._construct_form(i, **kwargs))
+
+    @property
+    def empty_form(self):
+        return self._partager_produits(super().empty_form)
+
 
 LigneVenteFormSet = inlineformset_factory(
     Vente, LigneVente,
+    form=LigneVenteForm,
+    formset=BaseLigneVenteFormSet,
     fields=('produit', 'quantite', 'prix_unitaire'),
     extra=1, can_delete=True
 )
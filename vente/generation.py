@@ -0,0 +1,266 @@
+"""
+Jeu de données synthétique pour les mesures de performance (commande seed_ventes).
+
+Les volumes sont paramétrables et le tirage est reproductible : même graine,
+mêmes paramètres et même date de fin donnent les mêmes données. Les
+distributions imitent une boutique réelle :
+- popularité des produits selon une loi de Zipf (quelques produits font
+  l'essentiel des ventes), clients fidèles selon une loi plus douce ;
+- ventes réparties selon le jour de la semaine, la saison (pic en décembre),
+  une croissance sur la période et les heures d'ouverture ;
+- paniers de taille variable, Vente.total égal à la somme des lignes.
+
+Tout est écrit par lots de ventes, un lot par transaction, avec les
+mouvements de stock correspondants : le journal retombe sur Produit.stock
+(inventaire initial = stock final + quantités vendues). Les agrégats du
+tableau de bord sont recalculés à la fin.
+"""
+import math
+import random
+from collections import Counter
+from datetime import datetime, timedelta, time as heure
+from decimal import Decimal
+from itertools import accumulate
+
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .catalogue import marquer_suppression
+from .dashboard import DashboardStats
+from .jobs import marquer_modification
+from .models import (
+    Client, Produit, Vente, LigneVente, MouvementStock, InstantaneStock,
+    StatJour, StatMois, StatProduitJour, StatClientJour, PrevisionStock, ProfilClient, marquer_catalogue,
+)
+from .statistiques import reconstruire_statistiques
+
+# Lundi → dimanche
+POIDS_JOURS_SEMAINE = (0.85, 0.8, 0.9, 1.0, 1.25, 1.6, 0.6)
+# Heures d'ouverture 8h → 20h : pointes à midi et en fin de journée
+POIDS_HEURES = {8: 2, 9: 4, 10: 6, 11: 9, 12: 12, 13: 10, 14: 6, 15: 5, 16: 6, 17: 9, 18: 11, 19: 8, 20: 3}
+QUANTITES = (1, 2, 3, 4, 5, 10)
+POIDS_QUANTITES = (70, 15, 7, 4, 3, 1)
+PART_ANONYMES = 0.1
+PART_PAIEMENTS = 0.95
+
+_PRENOMS = (
+    'Awa', 'Moussa', 'Fatou', 'Ibrahima', 'Aminata', 'Cheikh', 'Mariama', 'Ousmane', 'Khady', 'Abdou',
+    'Marie', 'Jean', 'Sophie', 'Pierre', 'Claire', 'Louis', 'Camille', 'Paul', 'Julie', 'Lucas',
+)
+_NOMS = (
+    'Diop', 'Ndiaye', 'Fall', 'Sow', 'Diallo', 'Ba', 'Gueye', 'Faye', 'Sarr', 'Cissé',
+    'Martin', 'Bernard', 'Dubois', 'Thomas', 'Robert', 'Richard', 'Petit', 'Durand', 'Leroy', 'Moreau',
+)
+_ARTICLES = (
+    'Riz', 'Huile', 'Sucre', 'Lait', 'Café', 'Thé', 'Savon', 'Farine', 'Pâtes', 'Biscuits',
+    'Jus', 'Eau', 'Sardines', 'Tomate', 'Oignons', 'Beurre', 'Yaourt', 'Chocolat', 'Lessive', 'Bougies',
+)
+_QUALIFICATIFS = (
+    'premium', 'familial', 'bio', 'local', 'importé', 'économique', 'léger', 'extra', 'classique', 'maison',
+)
+
+
+class JeuDeDonnees:
+    """
+    Paramètres d'un jeu de données ; generer() écrit tout et retourne les
+    nombres de lignes créées par table.
+    """
+
+    def __init__(self, clients=1000, produits=500, ventes=100_000, lignes=3, jours=365, fin=None,
+                 graine=42, zipf=1.1, taille_lot=5000, rappel=None):
+        self.nb_clients = clients
+        self.nb_produits = produits
+        self.nb_ventes = ventes
+        self.lignes_moyennes = max(1, lignes)
+        self.nb_jours = max(1, jours)
+        self.fin = fin or timezone.localdate()
+        self.zipf = zipf
+        self.taille_lot = max(1, taille_lot)
+        # `rappel(ventes, lignes)` après chaque lot (progression)
+        self.rappel = rappel
+        self.hasard = random.Random(graine)
+
+    def generer(self):
+        clients = self._creer_clients()
+        produits = self._creer_produits()
+        # Rang de popularité tiré au hasard : le produit n° 1 n'est pas forcément le plus vendu
+        poids_produits = self._poids_zipf(len(produits), self.zipf)
+        poids_clients = self._poids_zipf(len(clients), 0.8)
+        vendus = Counter()
+        nb_lignes = 0
+
+        # Prix unitaires convertis une fois pour la base
+        champ_prix = LigneVente._meta.get_field('prix_unitaire')
+        prix = {produit.pk: (produit.prix, champ_prix.get_db_prep_save(produit.prix, connection)) for produit in produits}
+
+        lot = []
+        for date_vente in self._dates_ventes():
+            client = None
+            if clients and self.hasard.random() >= PART_ANONYMES:
+                client = self.hasard.choices(clients, cum_weights=poids_clients)[0]
+            # Un produit tiré deux fois ne fait qu'une ligne
+            panier = {
+                produit.pk: self.hasard.choices(QUANTITES, POIDS_QUANTITES)[0]
+                for produit in self.hasard.choices(produits, cum_weights=poids_produits, k=self._taille_panier())
+            }
+            total = sum(prix[pid][0] * quantite for pid, quantite in panier.items())
+            lot.append((
+                client.pk if client else None, date_vente, total, self.hasard.random() < PART_PAIEMENTS,
+                [(pid, quantite, prix[pid][1]) for pid, quantite in panier.items()],
+            ))
+            if len(lot) >= self.taille_lot:
+                nb_lignes += self._ecrire_lot(lot, vendus)
+                lot = []
+        if lot:
+            nb_lignes += self._ecrire_lot(lot, vendus)
+        _recaler_sequence(Vente)
+
+        # Inventaire initial, veille de la première vente
+        debut = timezone.make_aware(datetime.combine(self._premier_jour() - timedelta(days=1), heure(8)))
+        MouvementStock.objects.bulk_create([
+            MouvementStock(
+                produit=produit, quantite=produit.stock + vendus[produit.pk],
+                type_mouvement=MouvementStock.INVENTAIRE, date=debut,
+            )
+            for produit in produits if produit.stock + vendus[produit.pk]
+        ], batch_size=self.taille_lot)
+
+        reconstruire_statistiques(batch_size=self.taille_lot)
+        DashboardStats.invalider()
+        marquer_modification()
+        marquer_catalogue()
+        return {
+            'clients': len(clients),
+            'produits': len(produits),
+            'ventes': self.nb_ventes,
+            'lignes': nb_lignes,
+        }
+
+    def _creer_clients(self):
+        clients = []
+        for i in range(self.nb_clients):
+            prenom, nom = self.hasard.choice(_PRENOMS), self.hasard.choice(_NOMS)
+            clients.append(Client(
+                nom=f'{prenom} {nom} {i + 1}',
+                telephone=f'7{self.hasard.randint(0, 99_999_999):08d}',
+                email=f'{prenom}.{nom}.{i + 1}@example.com'.lower() if self.hasard.random() < 0.6 else '',
+            ))
+        return Client.objects.bulk_create(clients, batch_size=self.taille_lot)
+
+    def _creer_produits(self):
+        produits = []
+        for i in range(self.nb_produits):
+            # Prix log-normal autour de 12 (quelques articles chers)
+            centimes = max(50, round(self.hasard.lognormvariate(math.log(1200), 0.8)))
+            produits.append(Produit(
+                nom=f'{self.hasard.choice(_ARTICLES)} {self.hasard.choice(_QUALIFICATIFS)} {i + 1}',
+                prix=Decimal(centimes) / 100,
+                stock=self.hasard.randint(0, 500),
+                seuil_alerte=self.hasard.choice((5, 10, 20)),
+            ))
+        return Produit.objects.bulk_create(produits, batch_size=self.taille_lot)
+
+    def _poids_zipf(self, nombre, exposant):
+        """Poids cumulés (pour random.choices) d'une loi de Zipf sur des rangs mélangés"""
+        rangs = list(range(1, nombre + 1))
+        self.hasard.shuffle(rangs)
+        return list(accumulate(1 / rang ** exposant for rang in rangs))
+
+    def _taille_panier(self):
+        if self.lignes_moyennes == 1:
+            return 1
+        # 1 + exponentielle : beaucoup de petits paniers, quelques gros
+        return min(1 + round(self.hasard.expovariate(1 / (self.lignes_moyennes - 1))), 4 * self.lignes_moyennes)
+
+    def _premier_jour(self):
+        return self.fin - timedelta(days=self.nb_jours - 1)
+
+    def _dates_ventes(self):
+        """Dates des ventes, dans l'ordre chronologique"""
+        premier = self._premier_jour()
+        jours = [premier + timedelta(days=i) for i in range(self.nb_jours)]
+        poids = [
+            POIDS_JOURS_SEMAINE[jour.weekday()]
+            # Saison : +25 % mi-décembre, -25 % mi-juin
+            * (1 + 0.25 * math.cos(2 * math.pi * (jour.timetuple().tm_yday - 350) / 365.25))
+            # Croissance de 30 % sur la période
+            * (1 + 0.3 * i / self.nb_jours)
+            for i, jour in enumerate(jours)
+        ]
+        par_jour = Counter(self.hasard.choices(range(self.nb_jours), weights=poids, k=self.nb_ventes))
+        heures = list(POIDS_HEURES)
+        poids_heures = list(POIDS_HEURES.values())
+        for i, jour in enumerate(jours):
+            if not par_jour[i]:
+                continue
+            ouverture = timezone.make_aware(datetime.combine(jour, heure.min))
+            secondes = sorted(
+                h * 3600 + self.hasard.randrange(3600)
+                for h in self.hasard.choices(heures, poids_heures, k=par_jour[i])
+            )
+            for seconde in secondes:
+                yield ouverture + timedelta(seconds=seconde)
+
+    def _ecrire_lot(self, lot, vendus):
+        """
+        Tout le lot par executemany : instancier et compiler des millions de
+        Vente, LigneVente et MouvementStock coûtait l'essentiel de la
+        génération. Les id des ventes sont attribués ici, à la suite du plus
+        grand existant ; la séquence est recalée à la fin (comme loaddata).
+        """
+        champ_date = Vente._meta.get_field('date_vente')
+        champ_total = Vente._meta.get_field('total')
+        with transaction.atomic(), connection.cursor() as cursor:
+            dernier_id = Vente.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+            ventes = []
+            lignes = []
+            mouvements = []
+            for vente_id, (client_id, date, total, paye, lignes_vente) in enumerate(lot, start=dernier_id + 1):
+                date = champ_date.get_db_prep_save(date, connection)
+                ventes.append((vente_id, client_id, date, champ_total.get_db_prep_save(total, connection), paye))
+                for produit_id, quantite, prix in lignes_vente:
+                    vendus[produit_id] += quantite
+                    lignes.append((vente_id, produit_id, quantite, prix, True))
+                    mouvements.append((produit_id, -quantite, MouvementStock.VENTE, vente_id, date))
+            _inserer(cursor, Vente, ('id', 'client', 'date_vente', 'total', 'paiement_effectue'), ventes)
+            _inserer(cursor, LigneVente, ('vente', 'produit', 'quantite', 'prix_unitaire', 'stock_deduit'), lignes)
+            _inserer(cursor, MouvementStock, ('produit', 'quantite', 'type_mouvement', 'vente', 'date'), mouvements)
+        if self.rappel:
+            self.rappel(len(ventes), len(lignes))
+        return len(lignes)
+
+
+def _recaler_sequence(modele):
+    """Après des id explicites : la prochaine vente créée normalement prend la suite"""
+    with connection.cursor() as cursor:
+        for sql in connection.ops.sequence_reset_sql(no_style(), [modele]):
+            cursor.execute(sql)
+
+
+def _inserer(cursor, modele, champs, lignes):
+    colonnes = [modele._meta.get_field(champ).column for champ in champs]
+    cursor.executemany(
+        f"INSERT INTO {modele._meta.db_table} ({', '.join(colonnes)}) "
+        f"VALUES ({', '.join(['%s'] * len(colonnes))})",
+        lignes,
+    )
+
+
+def vider_ventes():
+    """
+    Supprime ventes, produits, clients, journal de stock, agrégats,
+    prévisions et profils clients. DELETE direct : QuerySet.delete()
+    chargerait chaque objet pour les signaux.
+    """
+    modeles = (
+        StatJour, StatMois, StatProduitJour, StatClientJour, PrevisionStock, ProfilClient,
+        InstantaneStock, MouvementStock, LigneVente, Vente, Produit, Client,
+    )
+    with transaction.atomic(), connection.cursor() as cursor:
+        for modele in modeles:
+            cursor.execute(f'DELETE FROM {connection.ops.quote_name(modele._meta.db_table)}')
+        # Les clients du catalogue (?depuis=) doivent tout recharger
+        marquer_suppression()
+    transaction.on_commit(DashboardStats.invalider)
+    transaction.on_commit(marquer_modification)
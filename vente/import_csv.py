@@ -0,0 +1,238 @@
+"""
+Import en masse de produits et de clients depuis un fichier CSV.
+
+Le fichier est lu au fil de l'eau (csv.reader sur un flux texte) et traité
+par lots de TAILLE_LOT lignes : la mémoire utilisée ne dépend pas de la
+taille du fichier. Chaque ligne est validée par les champs de
+ProduitForm / ClientForm, puis le lot est écrit dans sa propre transaction :
+INSERT pour les noms inconnus, UPDATE pour les noms déjà présents (le nom
+sert de clé naturelle). Une ligne invalide est signalée avec son numéro, sans
+interrompre l'import. Les variations de stock sont journalisées
+(MouvementStock) comme pour une saisie dans l'application.
+"""
+import csv
+import time
+
+from django.core.exceptions import ValidationError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .dashboard import DashboardStats
+from .forms import ProduitForm, ClientForm
+from .jobs import marquer_modification
+from .models import Produit, Client, MouvementStock, marquer_catalogue, nouvelle_version_catalogue
+from .recherche import indexation_par_lot
+
+TAILLE_LOT = 2000
+# Au-delà, les lignes rejetées sont seulement comptées
+MAX_ERREURS = 1000
+# Valeurs validées mémorisées par colonne
+TAILLE_CACHE = 10_000
+
+TYPES = {
+    'produits': (Produit, ProduitForm),
+    'clients': (Client, ClientForm),
+}
+
+
+class ImportInvalide(Exception):
+    """Fichier inutilisable : en-tête absent ou sans colonne 'nom'"""
+
+
+class ResultatImport:
+    def __init__(self):
+        self.lignes = 0
+        self.crees = 0
+        self.mis_a_jour = 0
+        self.rejetees = 0
+        self.erreurs = []
+        self.debut = time.monotonic()
+
+    def rejeter(self, numero, erreurs):
+        self.rejetees += 1
+        if len(self.erreurs) < MAX_ERREURS:
+            self.erreurs.append({'ligne': numero, 'erreurs': erreurs})
+
+    @property
+    def duree(self):
+        return time.monotonic() - self.debut
+
+    @property
+    def lignes_par_seconde(self):
+        return self.lignes / self.duree if self.duree else 0
+
+
+def importer_fichier_csv(flux, type_import, taille_lot=TAILLE_LOT, delimiteur=None, rappel=None):
+    """
+    Importe les lignes de `flux` (fichier texte ouvert avec newline='').
+    `rappel(resultat)` est appelé après chaque lot (progression).
+    Retourne un ResultatImport.
+    """
+    modele, classe_form = TYPES[type_import]
+    champs = classe_form().fields
+    resultat = ResultatImport()
+
+    premiere = flux.readline()
+    if not premiere.strip():
+        raise ImportInvalide("Fichier vide")
+    if delimiteur is None:
+        delimiteur = ';' if premiere.count(';') > premiere.count(',') else ','
+    entete = [nom.strip().lower() for nom in next(csv.reader([premiere], delimiter=delimiteur))]
+    if 'nom' not in entete:
+        raise ImportInvalide("Colonne 'nom' absente de l'en-tête")
+
+    colonnes = [
+        (index, nom, _nettoyeur(champs[nom], modele._meta.get_field(nom)))
+        for index, nom in enumerate(entete) if nom in champs
+    ]
+    presentes = [nom for _, nom, _ in colonnes]
+    # Colonnes obligatoires sans valeur par défaut : indispensables pour créer
+    manquantes = [
+        nom for nom, champ in champs.items()
+        if champ.required and nom not in presentes and not modele._meta.get_field(nom).has_default()
+    ]
+
+    lot = {}
+    for numero, ligne in enumerate(csv.reader(flux, delimiter=delimiteur), start=2):
+        if not ligne:
+            continue
+        resultat.lignes += 1
+        valeurs = {}
+        erreurs = []
+        for index, nom, nettoyer in colonnes:
+            valeur, message = nettoyer(ligne[index] if index < len(ligne) else '')
+            if message:
+                erreurs.append(f"{nom}: {message}")
+            else:
+                valeurs[nom] = valeur
+        if erreurs:
+            resultat.rejeter(numero, erreurs)
+            continue
+        # Un même nom répété dans le lot : la dernière ligne l'emporte
+        lot[valeurs['nom']] = (numero, valeurs)
+        if len(lot) >= taille_lot:
+            _ecrire_lot(modele, lot, presentes, manquantes, resultat)
+            lot = {}
+            if rappel:
+                rappel(resultat)
+    if lot:
+        _ecrire_lot(modele, lot, presentes, manquantes, resultat)
+        if rappel:
+            rappel(resultat)
+
+    transaction.on_commit(DashboardStats.invalider)
+    transaction.on_commit(marquer_modification)
+    return resultat
+
+
+def _nettoyeur(champ, champ_modele):
+    """
+    Validation d'une colonne par le champ du formulaire et les validateurs du
+    champ du modèle (bornes des entiers de la base, que le formulaire ne
+    vérifie pas), puis conversion pour la base par le champ du modèle. Retourne une fonction valeur brute ->
+    (valeur, message d'erreur ou None). Les colonnes d'un fichier répètent
+    beaucoup de valeurs (prix, stock, seuil...) : le résultat est mémorisé,
+    dans la limite de TAILLE_CACHE valeurs distinctes.
+    """
+    cache = {}
+
+    def nettoyer(brute):
+        try:
+            return cache[brute]
+        except KeyError:
+            pass
+        try:
+            valeur = champ.clean(brute.strip())
+            champ_modele.run_validators(valeur)
+            resultat = (champ_modele.get_db_prep_save(valeur, connection), None)
+        except ValidationError as e:
+            resultat = (None, ' '.join(e.messages))
+        if len(cache) >= TAILLE_CACHE:
+            cache.clear()
+        cache[brute] = resultat
+        return resultat
+
+    return nettoyer
+
+
+def _ecrire_lot(modele, lot, presentes, manquantes, resultat):
+    """
+    Écrit un lot dans sa transaction. Les valeurs sont déjà converties pour la
+    base : INSERT et UPDATE passent par executemany, sans instancier de modèle
+    ni compiler une requête par ligne (le coût de bulk_create / bulk_update
+    dominait l'import).
+    """
+    table = modele._meta.db_table
+    colonne = {nom: modele._meta.get_field(nom).column for nom in presentes}
+    a_modifier = [nom for nom in presentes if nom != 'nom']
+    produits = modele is Produit
+    stock = produits and 'stock' in presentes
+
+    # Valeurs des colonnes absentes du fichier, pour les créations
+    defauts = {}
+    for champ in modele._meta.concrete_fields:
+        if not champ.primary_key and champ.name not in presentes:
+            defauts[champ.column] = champ.get_db_prep_save(champ.get_default(), connection)
+    if produits:
+        # Visible par les clients du catalogue (?depuis=)
+        version = defauts['version'] = nouvelle_version_catalogue()
+
+    with transaction.atomic(), indexation_par_lot(modele), connection.cursor() as cursor:
+        existants = {}
+        # Tri décroissant : en cas de doublon en base, le plus ancien est mis à jour
+        champs_existants = ('nom', 'id', 'stock') if stock else ('nom', 'id')
+        for nom, *reste in modele.objects.filter(nom__in=list(lot)).order_by('-id').values_list(*champs_existants):
+            existants[nom] = reste
+
+        nouveaux = []
+        modifies = []
+        ecarts_stock = []
+        for nom, (numero, valeurs) in lot.items():
+            existant = existants.get(nom)
+            if existant is None:
+                if manquantes:
+                    resultat.rejeter(numero, [f"Colonne(s) requise(s) pour créer '{nom}': {', '.join(manquantes)}"])
+                    continue
+                nouveaux.append([*valeurs.values(), *defauts.values()])
+                continue
+            modifies.append([*(valeurs[champ] for champ in a_modifier), existant[0]])
+            if stock and valeurs['stock'] != existant[1]:
+                ecarts_stock.append((existant[0], valeurs['stock'] - existant[1]))
+
+        dernier_id = modele.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+        if nouveaux:
+            colonnes = [colonne[nom] for nom in presentes] + list(defauts)
+            cursor.executemany(
+                f"INSERT INTO {table} ({', '.join(colonnes)}) VALUES ({', '.join(['%s'] * len(colonnes))})",
+                nouveaux,
+            )
+        if modifies and a_modifier:
+            affectations = [f'{colonne[nom]} = %s' for nom in a_modifier]
+            if produits:
+                affectations.append('version = %s')
+                modifies = [[*ligne[:-1], version, ligne[-1]] for ligne in modifies]
+            cursor.executemany(f"UPDATE {table} SET {', '.join(affectations)} WHERE id = %s", modifies)
+
+        if produits:
+            _journaliser_stock(cursor, dernier_id, version, ecarts_stock)
+            marquer_catalogue()
+
+    resultat.crees += len(nouveaux)
+    resultat.mis_a_jour += len(modifies)
+
+
+def _journaliser_stock(cursor, dernier_id, version, ecarts_stock):
+    """Mouvement d'inventaire pour les produits créés par le lot, d'ajustement pour les stocks modifiés"""
+    table = MouvementStock._meta.db_table
+    date = MouvementStock._meta.get_field('date').get_db_prep_save(timezone.now(), connection)
+    # Produits du lot : ajoutés après `dernier_id` avec la version du lot
+    cursor.execute(
+        f"INSERT INTO {table} (produit_id, quantite, type_mouvement, date) "
+        f"SELECT id, stock, %s, %s FROM {Produit._meta.db_table} WHERE id > %s AND version = %s AND stock > 0",
+        [MouvementStock.INVENTAIRE, date, dernier_id, version],
+    )
+    if ecarts_stock:
+        cursor.executemany(
+            f"INSERT INTO {table} (produit_id, quantite, type_mouvement, date) VALUES (%s, %s, %s, %s)",
+            [(pid, ecart, MouvementStock.AJUSTEMENT, date) for pid, ecart in ecarts_stock],
+        )
@@ -0,0 +1,246 @@
+"""
+Import de ventes par lots (API JSON des caisses et du site marchand).
+
+Les ventes sont validées ensemble puis écrites par lots de TAILLE_LOT : pour
+chaque lot, une transaction verrouille les produits concernés en une requête,
+décrémente le stock en un UPDATE et insère ventes et lignes avec bulk_create.
+Une clé d'idempotence fournie par l'appelant évite de rejouer une vente déjà
+enregistrée (réessai après un délai dépassé, par exemple).
+"""
+from collections import defaultdict
+from decimal import Decimal, InvalidOperation
+
+from django.db import IntegrityError, transaction
+from django.db.models import Case, F, PositiveIntegerField, Q, When
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .jobs import marquer_modification
+from .models import (
+    ID_MAX, Produit, Client, Vente, LigneVente, MouvementStock, marquer_catalogue, nouvelle_version_catalogue,
+)
+from .statistiques import enregistrer_ventes
+from .stock import mouvements_vente
+
+TAILLE_LOT = 500
+
+
+class ConflitStock(Exception):
+    """Le stock a changé entre la lecture et la mise à jour (lot à rejouer)"""
+
+
+def importer_ventes(donnees, taille_lot=TAILLE_LOT):
+    """
+    Enregistre une liste de ventes (dicts décodés depuis le JSON).
+
+    Format d'une vente :
+        {"cle": "caisse1-000123", "client": 4, "paiement_effectue": true,
+         "date_vente": "2026-03-01T10:15:00",
+         "lignes": [{"produit": 7, "quantite": 2, "prix_unitaire": "150.00"}]}
+
+    Retourne un résultat par vente, dans le même ordre, avec le statut
+    'creee', 'deja_enregistree' ou 'rejetee'.
+    """
+    resultats = [None] * len(donnees)
+    valides = []
+    for index, vente in enumerate(donnees):
+        try:
+            valides.append((index, _valider(vente)))
+        except ValueError as e:
+            resultats[index] = _resultat(index, vente, 'rejetee', erreurs=[str(e)])
+
+    for debut in range(0, len(valides), taille_lot):
+        lot = valides[debut:debut + taille_lot]
+        for tentative in range(3):
+            try:
+                resultats_lot = _traiter_lot(lot)
+                break
+            except (IntegrityError, ConflitStock):
+                # Clé enregistrée ou stock modifié par une requête concurrente :
+                # on relit l'état de la base et on rejoue le lot
+                if tentative == 2:
+                    raise
+        for index, resultat in resultats_lot.items():
+            resultats[index] = resultat
+    return resultats
+
+
+def _resultat(index, vente, statut, **extra):
+    cle = vente.get('cle') if isinstance(vente, dict) else None
+    return {'index': index, 'cle': cle, 'statut': statut, **extra}
+
+
+def _valider(vente):
+    """Contrôle la structure d'une vente et retourne ses valeurs normalisées"""
+    if not isinstance(vente, dict):
+        raise ValueError("Vente invalide: objet attendu")
+
+    cle = vente.get('cle')
+    if cle is not None and (not isinstance(cle, str) or not cle or len(cle) > 64):
+        raise ValueError("Clé d'idempotence invalide (chaîne de 1 à 64 caractères)")
+
+    client = vente.get('client')
+    if client is not None and not _est_id(client):
+        raise ValueError("Client invalide: identifiant entier attendu")
+
+    date_vente = timezone.now()
+    if vente.get('date_vente'):
+        date_vente = parse_datetime(str(vente['date_vente']))
+        if date_vente is None:
+            raise ValueError("Date de vente invalide (format ISO 8601 attendu)")
+        if timezone.is_naive(date_vente):
+            date_vente = timezone.make_aware(date_vente)
+
+    paiement_effectue = vente.get('paiement_effectue', False)
+    if not isinstance(paiement_effectue, bool):
+        # bool("false") vaudrait True : seul un booléen JSON est accepté
+        raise ValueError("Paiement effectué invalide: booléen attendu")
+
+    lignes = vente.get('lignes')
+    if not isinstance(lignes, list) or not lignes:
+        raise ValueError("La vente doit contenir au moins une ligne")
+    lignes_valides = []
+    for numero, ligne in enumerate(lignes, start=1):
+        if not isinstance(ligne, dict):
+            raise ValueError(f"Ligne {numero}: objet attendu")
+        produit = ligne.get('produit')
+        quantite = ligne.get('quantite')
+        if not _est_id(produit):
+            raise ValueError(f"Ligne {numero}: produit invalide")
+        if not isinstance(quantite, int) or isinstance(quantite, bool) or quantite <= 0:
+            raise ValueError(f"Ligne {numero}: quantité invalide")
+        prix = ligne.get('prix_unitaire')
+        if prix is not None:
+            try:
+                prix = Decimal(str(prix))
+                # NaN et Infinity passent json.loads et quantize, mais pas les comparaisons
+                if not prix.is_finite():
+                    raise InvalidOperation
+                prix = prix.quantize(Decimal('0.01'))
+            except ArithmeticError:
+                raise ValueError(f"Ligne {numero}: prix unitaire invalide")
+            if prix < 0:
+                raise ValueError(f"Ligne {numero}: prix unitaire négatif")
+        lignes_valides.append((produit, quantite, prix))
+
+    return {
+        'cle': cle,
+        'client': client,
+        'paiement_effectue': paiement_effectue,
+        'date_vente': date_vente,
+        'lignes': lignes_valides,
+    }
+
+
+def _est_id(valeur):
+    return isinstance(valeur, int) and not isinstance(valeur, bool) and 0 < valeur <= ID_MAX
+
+
+def _traiter_lot(lot):
+    """Écrit un lot de ventes validées dans une seule transaction"""
+    resultats = {}
+    cles = [vente['cle'] for _, vente in lot if vente['cle']]
+    produit_ids = {pid for _, vente in lot for pid, _, _ in vente['lignes']}
+    client_ids = {vente['client'] for _, vente in lot if vente['client'] is not None}
+
+    with transaction.atomic():
+        existantes = dict(
+            Vente.objects.filter(cle_idempotence__in=cles).values_list('cle_idempotence', 'id')
+        ) if cles else {}
+        produits = Produit.objects.select_for_update().in_bulk(list(produit_ids))
+        clients = set(
+            Client.objects.filter(pk__in=client_ids).values_list('pk', flat=True)
+        ) if client_ids else set()
+
+        # Réservation du stock en mémoire, vente après vente, dans l'ordre reçu
+        disponible = {pid: produit.stock for pid, produit in produits.items()}
+        cles_vues = set()
+        acceptees = []
+        for index, vente in lot:
+            cle = vente['cle']
+            if cle and (cle in existantes or cle in cles_vues):
+                resultats[index] = _resultat(
+                    index, vente, 'deja_enregistree', vente_id=existantes.get(cle)
+                )
+                continue
+
+            erreurs = []
+            if vente['client'] is not None and vente['client'] not in clients:
+                erreurs.append(f"Client #{vente['client']} introuvable")
+            quantites = defaultdict(int)
+            for pid, quantite, _ in vente['lignes']:
+                quantites[pid] += quantite
+            for pid, quantite in quantites.items():
+                if pid not in produits:
+                    erreurs.append(f"Produit #{pid} introuvable")
+                elif disponible[pid] < quantite:
+                    erreurs.append(
+                        f"{produits[pid].nom}: {quantite} demandé(s) mais seulement "
+                        f"{disponible[pid]} en stock"
+                    )
+            if erreurs:
+                resultats[index] = _resultat(index, vente, 'rejetee', erreurs=erreurs)
+                continue
+
+            for pid, quantite in quantites.items():
+                disponible[pid] -= quantite
+            if cle:
+                cles_vues.add(cle)
+            objet = Vente(
+                client_id=vente['client'],
+                date_vente=vente['date_vente'],
+                paiement_effectue=vente['paiement_effectue'],
+                cle_idempotence=cle,
+            )
+            lignes = [
+                LigneVente(
+                    vente=objet,
+                    produit=produits[pid],
+                    quantite=quantite,
+                    prix_unitaire=prix if prix is not None else produits[pid].prix,
+                    stock_deduit=True,
+                )
+                for pid, quantite, prix in vente['lignes']
+            ]
+            objet.total = sum((ligne.total_ligne() for ligne in lignes), Decimal('0.00'))
+            acceptees.append((index, objet, lignes))
+
+        if not acceptees:
+            return resultats
+
+        # Décrément du stock de tout le lot en un UPDATE conditionnel
+        decrements = {
+            pid: produits[pid].stock - reste
+            for pid, reste in disponible.items() if produits[pid].stock != reste
+        }
+        condition = Q()
+        for pid, quantite in decrements.items():
+            condition |= Q(pk=pid, stock__gte=quantite)
+        mis_a_jour = Produit.objects.filter(condition).update(stock=Case(
+            *[When(pk=pid, then=F('stock') - quantite) for pid, quantite in decrements.items()],
+            default=F('stock'),
+            output_field=PositiveIntegerField(),
+        ), version=nouvelle_version_catalogue())
+        if mis_a_jour != len(decrements):
+            raise ConflitStock()
+        marquer_catalogue()
+
+        Vente.objects.bulk_create([objet for _, objet, _ in acceptees])
+        LigneVente.objects.bulk_create(
+            [ligne for _, _, lignes in acceptees for ligne in lignes], batch_size=1000
+        )
+        MouvementStock.objects.bulk_create(
+            [mouvement for _, objet, lignes in acceptees for mouvement in mouvements_vente(objet, lignes)],
+            batch_size=1000,
+        )
+        ventes_lignes = [(objet, lignes) for _, objet, lignes in acceptees]
+        transaction.on_commit(lambda: enregistrer_ventes(ventes_lignes))
+        # bulk_create n'envoie pas de signal : version des rapports changée ici
+        transaction.on_commit(marquer_modification)
+
+    for index, objet, _ in acceptees:
+        resultats[index] = {
+            'index': index, 'cle': objet.cle_idempotence, 'statut': 'creee',
+            'vente_id': objet.pk, 'total': str(objet.total),
+        }
+    return resultats
@@ -0,0 +1,156 @@
+"""
+File d'attente des rapports PDF générés en arrière-plan.
+
+Une demande crée un RapportJob ; la commande `run_report_worker` traite les
+jobs en attente dans un pool de processus. Les PDF sont conservés sur disque
+(RAPPORTS_DIR) sous une clé calculée à partir du type de rapport, des filtres
+et d'une version des données : tant que les données ne changent pas, une
+nouvelle demande réutilise le fichier existant sans rien recalculer.
+
+La version est un compteur en base (EtatDonnees) et non dans le cache,
+propre à chaque processus : une modification faite par le site, le worker ou
+une commande de gestion invalide les rapports pour tous. Elle est lue en une
+requête d'une ligne ; les écritures groupées (bulk_create, UPDATE ou
+executemany, qui n'envoient pas de signal) appellent marquer_modification
+elles-mêmes.
+
+Un job resté "en cours" plus de RAPPORTS_DELAI_BLOCAGE secondes (worker
+arrêté en pleine génération) est remis en attente au prochain passage du
+worker, qui supprime aussi les PDF de plus de RAPPORTS_DUREE_CONSERVATION
+secondes.
+"""
+import hashlib
+import json
+import os
+import time
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .filtres import FiltreVentes
+from .models import EtatDonnees, RapportJob
+
+NOMS_FICHIERS = {
+    RapportJob.TYPE_CLIENTS: 'rapport_clients.pdf',
+    RapportJob.TYPE_VENTES: 'rapport_ventes.pdf',
+}
+
+
+def marquer_modification():
+    """Appelé par les signaux : change la version des données des rapports"""
+    if not EtatDonnees.objects.filter(pk=1).update(version=F('version') + 1):
+        EtatDonnees.objects.get_or_create(pk=1, defaults={'version': 1})
+
+
+def version_donnees():
+    """Version des ventes, lignes et clients (changée par chaque modification validée)"""
+    return str(EtatDonnees.objects.filter(pk=1).values_list('version', flat=True).first() or 0)
+
+
+def calculer_cle_cache(type_rapport, filtres, version):
+    contenu = json.dumps([type_rapport, filtres, version], sort_keys=True)
+    return hashlib.sha256(contenu.encode()).hexdigest()[:40]
+
+
+def chemin_rapport(cle):
+    return Path(settings.RAPPORTS_DIR) / f"{cle}.pdf"
+
+
+def demander_rapport(type_rapport, filtres=None, demandeur=None):
+    """Crée (ou réutilise) le job correspondant au rapport demandé"""
+    filtres = filtres or {}
+    version = version_donnees()
+    cle = calculer_cle_cache(type_rapport, filtres, version)
+    fichier_existe = chemin_rapport(cle).exists()
+
+    existant = RapportJob.objects.filter(
+        cle_cache=cle, statut__in=[RapportJob.EN_ATTENTE, RapportJob.EN_COURS, RapportJob.TERMINE]
+    ).order_by('-id').first()
+    if existant and (existant.statut != RapportJob.TERMINE or fichier_existe):
+        return existant
+
+    return RapportJob.objects.create(
+        type_rapport=type_rapport,
+        filtres=filtres,
+        version_donnees=version,
+        cle_cache=cle,
+        demandeur=demandeur,
+        statut=RapportJob.TERMINE if fichier_existe else RapportJob.EN_ATTENTE,
+        termine_le=timezone.now() if fichier_existe else None,
+    )
+
+
+def reserver_jobs(limite):
+    """Passe au plus `limite` jobs en attente à l'état 'en cours' et retourne leurs ids"""
+    maintenant = timezone.now()
+    RapportJob.objects.filter(
+        Q(demarre_le__isnull=True) | Q(demarre_le__lt=maintenant - timedelta(seconds=settings.RAPPORTS_DELAI_BLOCAGE)),
+        statut=RapportJob.EN_COURS,
+    ).update(statut=RapportJob.EN_ATTENTE)
+    candidats = RapportJob.objects.filter(
+        statut=RapportJob.EN_ATTENTE
+    ).order_by('id').values_list('id', flat=True)[:limite]
+    # L'UPDATE conditionnel garantit qu'un job n'est pris que par un seul worker
+    return [
+        pk for pk in list(candidats)
+        if RapportJob.objects.filter(pk=pk, statut=RapportJob.EN_ATTENTE).update(
+            statut=RapportJob.EN_COURS, demarre_le=maintenant
+        )
+    ]
+
+
+def nettoyer_rapports(duree=None):
+    """
+    Supprime de RAPPORTS_DIR les PDF (et fichiers temporaires abandonnés) de
+    plus de `duree` secondes (RAPPORTS_DUREE_CONSERVATION par défaut) : chaque
+    version des données produit de nouveaux fichiers. Retourne leur nombre.
+    """
+    dossier = Path(settings.RAPPORTS_DIR)
+    if not dossier.is_dir():
+        return 0
+    limite = time.time() - (settings.RAPPORTS_DUREE_CONSERVATION if duree is None else duree)
+    supprimes = 0
+    for chemin in dossier.iterdir():
+        try:
+            if chemin.suffix in ('.pdf', '.tmp') and chemin.stat().st_mtime < limite:
+                chemin.unlink()
+                supprimes += 1
+        except FileNotFoundError:
+            # Supprimé entre-temps par un autre worker
+            pass
+    return supprimes
+
+
+def executer_job(job_id):
+    """Génère le PDF d'un job (exécuté dans un processus du pool)"""
+    from .reports import generer_rapport_clients, generer_rapport_ventes
+
+    generateurs = {
+        RapportJob.TYPE_CLIENTS: generer_rapport_clients,
+        RapportJob.TYPE_VENTES: generer_rapport_ventes,
+    }
+    job = RapportJob.objects.get(pk=job_id)
+    chemin = chemin_rapport(job.cle_cache)
+    try:
+        if not chemin.exists():
+            chemin.parent.mkdir(parents=True, exist_ok=True)
+            # Écriture dans un fichier temporaire puis renommage atomique
+            temporaire = chemin.with_name(f"{chemin.name}.{os.getpid()}.tmp")
+            try:
+                with open(temporaire, 'wb') as fichier:
+                    generateurs[job.type_rapport](fichier, FiltreVentes.depuis_dict(job.filtres))
+                os.replace(temporaire, chemin)
+            finally:
+                temporaire.unlink(missing_ok=True)
+        RapportJob.objects.filter(pk=job.pk).update(
+            statut=RapportJob.TERMINE, termine_le=timezone.now(), erreur=''
+        )
+        return job.pk, RapportJob.TERMINE
+    except Exception as e:
+        RapportJob.objects.filter(pk=job.pk).update(
+            statut=RapportJob.ERREUR, termine_le=timezone.now(), erreur=str(e)
+        )
+        return job.pk, RapportJob.ERREUR
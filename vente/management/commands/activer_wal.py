@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+class Command(BaseCommand):
+    help = (
+        "Passe la base SQLite en journal WAL (étape d'installation, une seule fois) : "
+        "les lectures ne bloquent plus l'écriture. Le mode est enregistré dans le fichier "
+        "et crée les fichiers -wal / -shm à côté de la base."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--desactiver', action='store_true',
+            help='Revient au journal classique (DELETE), par exemple avant de copier ou de versionner la base',
+        )
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS, help='Alias de la base (défaut: default)')
+
+    def handle(self, *args, **options):
+        base = connections[options['database']]
+        if base.vendor != 'sqlite':
+            raise CommandError('Réservé à SQLite')
+        voulu = 'delete' if options['desactiver'] else 'wal'
+        with base.cursor() as cursor:
+            cursor.execute(f'PRAGMA journal_mode = {voulu}')
+            mode = cursor.fetchone()[0]
+        if mode != voulu:
+            raise CommandError(f'Journal {mode} conservé (base en mémoire ou verrouillée ?)')
+        # Les PRAGMA propres au WAL (voir configurer_sqlite) s'appliquent aux nouvelles connexions
+        base.close()
+        self.stdout.write(self.style.SUCCESS(f"✅ Base {base.settings_dict['NAME']} en journal {mode}"))
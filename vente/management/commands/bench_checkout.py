@@ -0,0 +1,82 @@
+import statistics
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.utils import timezone
+
+from vente.benchmarks import passages_concurrents
+from vente.models import Produit, Client, Vente
+from vente.statistiques import reconstruire_statistiques
+
+
+class Command(BaseCommand):
+    help = (
+        'Mesure le débit de passages en caisse concurrents (passer_vente) sur la base '
+        'configurée ; à lancer avec VENTE_DB=sqlite puis VENTE_DB=postgresql pour comparer'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--caisses', type=int, default=8,
+            help='Caisses simultanées, une par processus comme les workers du serveur web (défaut: 8)',
+        )
+        parser.add_argument('--ventes', type=int, default=100, help='Ventes par caisse (défaut: 100)')
+        parser.add_argument('--produits', type=int, default=20, help='Produits se partageant les paniers')
+        parser.add_argument('--lignes', type=int, default=3, help='Lignes par panier (défaut: 3)')
+        parser.add_argument(
+            '--garder', action='store_true',
+            help='Conserve les ventes, produits et client créés pour la mesure',
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.SUCCESS(f'🏁 Banc de caisse sur {self._profil()}'))
+        client = Client.objects.create(nom='Client banc de caisse')
+        produits = Produit.objects.bulk_create([
+            Produit(nom=f'Produit banc {i}', prix=10 + i, stock=10 ** 9)
+            for i in range(max(1, options['produits']))
+        ])
+
+        nb_caisses = max(1, options['caisses'])
+        durees, erreurs, total = passages_concurrents(
+            client, produits, nb_caisses, options['ventes'], options['lignes']
+        )
+
+        self.stdout.write(
+            f"  → {len(durees)} vente(s) en {total:.1f}s : {len(durees) / total:,.0f} ventes/s, "
+            f"{nb_caisses} caisse(s)"
+        )
+        if len(durees) > 1:
+            centiles = statistics.quantiles(durees, n=100)
+            self.stdout.write(
+                f'  → latence p50 {centiles[49] * 1000:.1f} ms, p95 {centiles[94] * 1000:.1f} ms'
+            )
+        if erreurs:
+            self.stdout.write(self.style.WARNING(
+                f'  ⚠ {len(erreurs)} échec(s), ex.: {erreurs[0]}'
+            ))
+
+        if not options['garder']:
+            self.stdout.write('🧹 Suppression des données du banc...')
+            Vente.objects.filter(client=client).delete()
+            Produit.objects.filter(pk__in=[produit.pk for produit in produits]).delete()
+            client.delete()
+            reconstruire_statistiques(depuis=timezone.localdate())
+        self.stdout.write(self.style.SUCCESS('✅ Banc terminé'))
+
+    def _profil(self):
+        base = connections['default']
+        reglages = base.settings_dict
+        if base.vendor == 'sqlite':
+            with base.cursor() as cursor:
+                cursor.execute('PRAGMA journal_mode')
+                mode = cursor.fetchone()[0]
+            if mode != 'wal':
+                mode += ', voir activer_wal'
+            return (
+                f"SQLite ({reglages['NAME']}, journal {mode}, "
+                f"transactions {reglages.get('OPTIONS', {}).get('transaction_mode', 'DEFERRED')})"
+            )
+        pool = reglages.get('OPTIONS', {}).get('pool')
+        connexions = f'pool {pool}' if pool else f"CONN_MAX_AGE={reglages['CONN_MAX_AGE']}"
+        return f"{base.vendor} ({reglages['HOST'] or 'local'}/{reglages['NAME']}, {connexions})"
+
@@ -0,0 +1,136 @@
+import json
+import platform
+from pathlib import Path
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.utils import timezone
+
+from vente import benchmarks
+from vente.benchmarks import BenchImpossible
+
+FAMILLES = ['micro', 'pages', 'charge', 'concurrence']
+
+
+class Command(BaseCommand):
+    help = (
+        'Banc de performance : micro-mesures des modèles, chaque page via le client de test, '
+        'passages en caisse concurrents et pages de lecture sous ASGI et WSGI, sur un jeu de '
+        'données figé ; résultats en JSON, comparés à une référence'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--taille', choices=list(benchmarks.TAILLES), default='1k',
+            help='Jeu de données (généré au premier passage dans VENTE_BENCH_DIR ; défaut: 1k)',
+        )
+        parser.add_argument(
+            '--base-actuelle', action='store_true',
+            help='Mesure la base configurée telle quelle (PostgreSQL, base déjà peuplée) au lieu d\'un jeu figé',
+        )
+        parser.add_argument(
+            '--familles', nargs='+', choices=FAMILLES, default=FAMILLES,
+        )
+        parser.add_argument('--pages', nargs='+', help='Limite les pages mesurées (ex. tableau_bord liste_ventes)')
+        parser.add_argument(
+            '--repetitions', type=int, default=benchmarks.REPETITIONS,
+            help=f'Appels par mesure (défaut: {benchmarks.REPETITIONS})',
+        )
+        parser.add_argument(
+            '--duree-max', type=float, default=benchmarks.DUREE_MAX,
+            help=f'Secondes au plus par mesure, au moins un appel (défaut: {benchmarks.DUREE_MAX})',
+        )
+        parser.add_argument('--caisses', type=int, default=8, help='Processus de caisse de la mesure de charge')
+        parser.add_argument('--ventes-par-caisse', type=int, default=50)
+        parser.add_argument(
+            '--navigateurs', type=int, default=20, help='Navigateurs simultanés de la mesure de concurrence',
+        )
+        parser.add_argument('--requetes-par-navigateur', type=int, default=10)
+        parser.add_argument(
+            '--threads-wsgi', type=int, default=4, help='Threads du worker WSGI comparé au worker ASGI',
+        )
+        parser.add_argument(
+            '--latence-sql', type=float, default=0,
+            help='Attente ajoutée à chaque requête SQL de la mesure de concurrence, en ms (base distante)',
+        )
+        parser.add_argument('--sortie', help='Fichier JSON des résultats (défaut: VENTE_BENCH_DIR/resultats_<taille>.json)')
+        parser.add_argument('--reference', help='Résultats JSON de référence à comparer')
+        parser.add_argument(
+            '--tolerance', type=float, default=benchmarks.TOLERANCE,
+            help=f'Hausse de p95 tolérée avant de signaler une régression (défaut: {benchmarks.TOLERANCE})',
+        )
+
+    def handle(self, *args, **options):
+        taille = 'base-actuelle' if options['base_actuelle'] else options['taille']
+        try:
+            if not options['base_actuelle']:
+                if not benchmarks.chemin_jeu(taille).exists():
+                    self.stdout.write(self.style.SUCCESS(f'🌱 Génération du jeu {taille} (une seule fois)...'))
+                benchmarks.preparer_jeu(taille)
+            self.stdout.write(self.style.SUCCESS(f'🏁 Banc {taille} sur {connections["default"].vendor}'))
+
+            resultats = {}
+            if 'micro' in options['familles']:
+                resultats.update(benchmarks.micro_benchmarks(options['repetitions'], options['duree_max']))
+            if 'pages' in options['familles']:
+                resultats.update(benchmarks.benchmarks_pages(
+                    options['repetitions'], options['duree_max'], options['pages']
+                ))
+            if 'charge' in options['familles']:
+                resultats.update(benchmarks.benchmark_charge(options['caisses'], options['ventes_par_caisse']))
+            if 'concurrence' in options['familles']:
+                resultats.update(benchmarks.benchmark_concurrence(
+                    options['navigateurs'], options['requetes_par_navigateur'], options['threads_wsgi'],
+                    options['pages'], options['latence_sql'] / 1000,
+                ))
+        except BenchImpossible as e:
+            raise CommandError(str(e))
+
+        for nom, mesure in resultats.items():
+            debit = ''
+            if 'ventes_par_s' in mesure:
+                debit = f", {mesure['ventes_par_s']} ventes/s, {mesure['echecs']} échec(s)"
+            elif 'pages_par_s' in mesure:
+                debit = f", {mesure['pages_par_s']} pages/s, {mesure['echecs']} échec(s)"
+            self.stdout.write(
+                f"  → {nom:<40} p50 {mesure['p50_ms']:>9.2f} ms  p95 {mesure['p95_ms']:>9.2f} ms  "
+                f"{mesure.get('requetes', '-'):>4} req.  {mesure['pic_rss_ko'] / 1024:>6.0f} Mo{debit}"
+            )
+
+        rapport = {
+            'taille': taille,
+            'base': connections['default'].vendor,
+            'date': timezone.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'resultats': resultats,
+        }
+        sortie = Path(options['sortie'] or Path(settings.VENTE_BENCH_DIR) / f'resultats_{taille}.json')
+        sortie.parent.mkdir(parents=True, exist_ok=True)
+        with open(sortie, 'w') as fichier:
+            json.dump(rapport, fichier, indent=2, ensure_ascii=False)
+        self.stdout.write(self.style.SUCCESS(f'💾 Résultats écrits dans {sortie}'))
+
+        if options['reference']:
+            self.comparer(resultats, options['reference'], options['tolerance'])
+
+    def comparer(self, resultats, chemin, tolerance):
+        with open(chemin) as fichier:
+            reference = json.load(fichier)
+        self.stdout.write(self.style.SUCCESS(f"📊 Comparaison avec {chemin} ({reference.get('date', '?')})"))
+        regressions = 0
+        for nom, champ, avant, apres, regression in benchmarks.comparer(resultats, reference['resultats'], tolerance):
+            if champ == 'p50_ms':
+                continue
+            variation = f'{(apres - avant) / avant:+.0%}' if avant else 'n/a'
+            ligne = f'  {nom:<40} {champ:<9} {avant:>10} → {apres:<10} {variation}'
+            if regression:
+                regressions += 1
+                self.stdout.write(self.style.ERROR(f'{ligne}  ⚠ régression'))
+            else:
+                self.stdout.write(ligne)
+        if regressions:
+            raise CommandError(f'{regressions} régression(s) par rapport à la référence')
+        self.stdout.write(self.style.SUCCESS('✅ Aucune régression'))
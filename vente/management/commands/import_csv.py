@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from vente.import_csv import importer_fichier_csv, ImportInvalide, TAILLE_LOT, TYPES
+
+
+class Command(BaseCommand):
+    help = 'Importe (ou met à jour par nom) des produits ou des clients depuis un fichier CSV'
+
+    def add_arguments(self, parser):
+        parser.add_argument('type_import', choices=sorted(TYPES))
+        parser.add_argument('fichier', help='Fichier CSV avec une ligne d\'en-tête (colonnes du formulaire)')
+        parser.add_argument('--batch-size', type=int, default=TAILLE_LOT)
+        parser.add_argument('--encoding', default='utf-8-sig')
+        parser.add_argument('--delimiter', help='Séparateur (détecté depuis l\'en-tête par défaut)')
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.SUCCESS(f"📥 Import des {options['type_import']}..."))
+
+        def progression(resultat):
+            self.stdout.write(
+                f'  … {resultat.lignes} ligne(s) lue(s) ({resultat.lignes_par_seconde:,.0f}/s)'
+            )
+
+        try:
+            with open(options['fichier'], encoding=options['encoding'], newline='') as flux:
+                resultat = importer_fichier_csv(
+                    flux, options['type_import'], taille_lot=max(1, options['batch_size']),
+                    delimiteur=options['delimiter'], rappel=progression,
+                )
+        except OSError as e:
+            raise CommandError(f'Lecture impossible: {e}')
+        except (ImportInvalide, UnicodeDecodeError) as e:
+            raise CommandError(f'Fichier invalide: {e}')
+
+        for erreur in resultat.erreurs:
+            self.stdout.write(self.style.WARNING(f"  ⚠ Ligne {erreur['ligne']}: {'; '.join(erreur['erreurs'])}"))
+        if resultat.rejetees > len(resultat.erreurs):
+            self.stdout.write(self.style.WARNING(
+                f'  … et {resultat.rejetees - len(resultat.erreurs)} autre(s) ligne(s) rejetée(s)'
+            ))
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ {resultat.crees} créé(s), {resultat.mis_a_jour} mis à jour, {resultat.rejetees} rejeté(s) '
+            f'en {resultat.duree:.1f}s ({resultat.lignes_par_seconde:,.0f} lignes/s)'
+        ))
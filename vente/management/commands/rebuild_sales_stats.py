@@ -0,0 +1,33 @@
+from datetime import datetime
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from vente.statistiques import reconstruire_statistiques
+
+
+class Command(BaseCommand):
+    help = 'Reconstruit les tables d\'agrégats de ventes (jour, mois, produit, client)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--since',
+            help='Ne recalculer qu\'à partir de cette date (AAAA-MM-JJ, arrondie au début du mois)',
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        depuis = None
+        if options['since']:
+            try:
+                depuis = datetime.strptime(options['since'], '%Y-%m-%d').date()
+            except ValueError:
+                raise CommandError('Format de date invalide, attendu AAAA-MM-JJ')
+
+        self.stdout.write(self.style.SUCCESS('📊 Reconstruction des statistiques de ventes...'))
+        debut = time.monotonic()
+        nb_jours = reconstruire_statistiques(depuis=depuis, batch_size=options['batch_size'])
+        duree = time.monotonic() - debut
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ {nb_jours} journée(s) recalculée(s) en {duree:.1f}s'
+        ))
@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from vente.stock import verifier_stock
+
+
+class Command(BaseCommand):
+    help = 'Vérifie Produit.stock par rapport au journal des mouvements de stock'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--corriger', action='store_true',
+            help='Ajoute un mouvement d\'ajustement pour aligner le journal sur le stock courant',
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.SUCCESS('🔎 Rapprochement du stock avec le journal...'))
+        debut = time.monotonic()
+        ecarts = 0
+        for produit, attendu in verifier_stock(options['batch_size'], corriger=options['corriger']):
+            ecarts += 1
+            self.stdout.write(self.style.WARNING(
+                f"  ⚠ {produit.nom} (#{produit.pk}): stock {produit.stock}, journal {attendu} "
+                f"({produit.stock - attendu:+d})"
+            ))
+        duree = time.monotonic() - debut
+
+        if not ecarts:
+            self.stdout.write(self.style.SUCCESS(f'✅ Aucun écart ({duree:.1f}s)'))
+        elif options['corriger']:
+            self.stdout.write(self.style.SUCCESS(f'✅ {ecarts} écart(s) corrigé(s) ({duree:.1f}s)'))
+        else:
+            raise CommandError(f'{ecarts} écart(s) entre le stock et le journal')
@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from vente.models import ProfilClient
+
+
+class Command(BaseCommand):
+    help = (
+        'Met à jour l\'analyse RFM des clients (table ProfilClient) avec les ventes '
+        'enregistrées depuis le dernier passage'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--complet', action='store_true',
+            help='Recalcule tous les profils à partir de l\'historique complet des ventes',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            from vente.analyse_clients import rafraichir_profils
+        except ImportError as exc:
+            raise CommandError(f'L\'analyse des clients nécessite numpy ({exc})')
+
+        self.stdout.write(self.style.SUCCESS('👥 Analyse RFM des clients...'))
+        debut = time.monotonic()
+        resultat = rafraichir_profils(complet=options['complet'])
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ {resultat['ventes']:,} nouvelle(s) vente(s), {resultat['clients']:,} clients, "
+            f"{resultat['modifies']:,} profil(s) mis à jour en {time.monotonic() - debut:.1f}s"
+        ))
+        libelles = dict(ProfilClient.SEGMENTS)
+        for segment, nombre in resultat['segments'].most_common():
+            self.stdout.write(f'  → {libelles[segment]} : {nombre:,}')
@@ -0,0 +1,47 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = (
+        'Recalcule la demande prévue, la date de rupture estimée et la quantité à commander '
+        'de chaque produit (table PrevisionStock, affichée sur le tableau de bord)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--methode', choices=['lissage', 'moyenne'], default='lissage',
+            help='Lissage exponentiel ou moyenne mobile des ventes journalières (défaut: lissage)',
+        )
+        parser.add_argument('--alpha', type=float, default=0.1, help='Poids du dernier jour pour le lissage (défaut: 0.1)')
+        parser.add_argument('--fenetre', type=int, default=28, help='Jours de la moyenne mobile (défaut: 28)')
+        parser.add_argument('--historique', type=int, default=730, help='Jours d\'historique lus (défaut: 730)')
+        parser.add_argument('--delai', type=int, default=7, help='Délai de réapprovisionnement en jours (défaut: 7)')
+        parser.add_argument('--couverture', type=int, default=14, help='Jours couverts par une commande (défaut: 14)')
+
+    def handle(self, *args, **options):
+        if not 0 < options['alpha'] <= 1:
+            raise CommandError('--alpha doit être compris entre 0 et 1')
+        if min(options['fenetre'], options['historique']) < 1 or min(options['delai'], options['couverture']) < 0:
+            raise CommandError('--fenetre et --historique doivent être positifs, --delai et --couverture pas négatifs')
+        try:
+            from vente.previsions import rafraichir_previsions
+        except ImportError as exc:
+            raise CommandError(f'Les prévisions nécessitent numpy ({exc})')
+
+        self.stdout.write(self.style.SUCCESS('🔮 Calcul des prévisions de stock...'))
+        debut = time.monotonic()
+        resultat = rafraichir_previsions(
+            methode=options['methode'], historique=options['historique'],
+            alpha=options['alpha'], fenetre=options['fenetre'],
+            delai=options['delai'], couverture=options['couverture'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ {resultat['produits']:,} produits en {time.monotonic() - debut:.1f}s"
+        ))
+        if resultat['ruptures']:
+            self.stdout.write(self.style.WARNING(
+                f"⚠️  {resultat['ruptures']:,} rupture(s) prévue(s) sous {options['delai']} jours"
+            ))
+        self.stdout.write(f"📦 {resultat['a_commander']:,} produit(s) à réapprovisionner")
@@ -1,113 +1,160 @@
+from collections import defaultdict
+import time
+
 from django.core.management.base import BaseCommand
-from django.db.models import Count, Q
-from vente.models import Produit, Client, Vente, LigneVente
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Min, PositiveIntegerField, Value, When, Window
+from vente.jobs import marquer_modification
+from vente.models import (
+    Produit, Client, Vente, LigneVente, MouvementStock, marquer_catalogue, nouvelle_version_catalogue,
+)
+from vente.statistiques import reconstruire_statistiques
 
 
 class Command(BaseCommand):
     help = 'Supprime les doublons de produits, clients et ventes'
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Affiche les doublons trouvés sans rien modifier',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Nombre de doublons traités par transaction (défaut: 1000)',
+        )
+
     def handle(self, *args, **options):
-        self.stdout.write(self.style.SUCCESS('🧹 Début du nettoyage des doublons...'))
-        
+        self.dry_run = options['dry_run']
+        self.batch_size = max(1, options['batch_size'])
+        debut = time.monotonic()
+        if self.dry_run:
+            self.stdout.write(self.style.SUCCESS('🔎 Recherche des doublons (aucune modification)...'))
+        else:
+            self.stdout.write(self.style.SUCCESS('🧹 Début du nettoyage des doublons...'))
+
         # Supprimer les doublons de produits
-        self.remove_duplicate_produits()
-        
+        produits = self.remove_duplicate_produits()
+
         # Supprimer les doublons de clients
-        self.remove_duplicate_clients()
-        
+        clients = self.remove_duplicate_clients()
+
         # Supprimer les doublons de lignes vente
         self.remove_duplicate_lignes_vente()
-        
-        self.stdout.write(self.style.SUCCESS('✅ Nettoyage terminé!'))
+
+        # Les statistiques des produits et clients supprimés sont parties en cascade
+        if (produits or clients) and not self.dry_run:
+            self.stdout.write('\n📊 Recalcul des statistiques de ventes...')
+            reconstruire_statistiques(batch_size=self.batch_size)
+
+        self.stdout.write(self.style.SUCCESS(f'✅ Nettoyage terminé en {time.monotonic() - debut:.1f}s!'))
 
     def remove_duplicate_produits(self):
-        """Supprime les produits en doublon basé sur le nom"""
+        """Fusionne les produits de même nom dans le plus ancien (lignes et stock)"""
         self.stdout.write('\n📦 Traitement des produits...')
-        
-        produits_dupes = Produit.objects.values('nom').annotate(
-            count=Count('id')
-        ).filter(count__gt=1)
-        
-        total_supprimés = 0
-        for dupe in produits_dupes:
-            nom = dupe['nom']
-            # Garder le premier, supprimer les autres
-            produits = Produit.objects.filter(nom=nom).order_by('id')
-            premier = produits.first()
-            
-            # Fusionner les stocks
-            stock_total = produits.aggregate(stock_total=Count('id'))
-            total_stock = sum(p.stock for p in produits)
-            premier.stock = total_stock
-            premier.save()
-            
-            # Supprimer les doublons
-            supprimés = produits.exclude(id=premier.id).delete()[0]
-            total_supprimés += supprimés
-            self.stdout.write(f"  ✓ Produit '{nom}': {supprimés} doublon(s) supprimé(s)")
-        
-        if total_supprimés == 0:
-            self.stdout.write('  ℹ️  Aucun doublon de produit trouvé')
-        else:
-            self.stdout.write(self.style.WARNING(f'  → Total: {total_supprimés} produits supprimés'))
+        doublons = _doublons(Produit.objects.all(), ['nom'], 'stock')
+
+        def fusionner(lot):
+            correspondance = {pid: survivant for pid, survivant, _ in lot}
+            stocks = defaultdict(int)
+            for _, survivant, stock in lot:
+                stocks[survivant] += stock
+            LigneVente.objects.filter(produit_id__in=correspondance).update(
+                produit_id=_remplacer('produit_id', correspondance)
+            )
+            Produit.objects.filter(pk__in=stocks).update(stock=F('stock') + Case(
+                *[When(pk=survivant, then=Value(stock)) for survivant, stock in stocks.items()],
+                default=Value(0),
+                output_field=PositiveIntegerField(),
+            ), version=nouvelle_version_catalogue())
+            marquer_catalogue()
+            # L'historique des doublons part avec eux : le stock repris est journalisé
+            MouvementStock.objects.bulk_create([
+                MouvementStock(produit_id=survivant, quantite=stock, type_mouvement=MouvementStock.AJUSTEMENT)
+                for survivant, stock in stocks.items() if stock
+            ])
+            Produit.objects.filter(pk__in=correspondance).delete()
+
+        return self._traiter(doublons, fusionner, 'produits')
 
     def remove_duplicate_clients(self):
-        """Supprime les clients en doublon basé sur le nom"""
+        """Fusionne les clients de même nom dans le plus ancien (ventes rattachées)"""
         self.stdout.write('\n👥 Traitement des clients...')
-        
-        clients_dupes = Client.objects.values('nom').annotate(
-            count=Count('id')
-        ).filter(count__gt=1)
-        
-        total_supprimés = 0
-        for dupe in clients_dupes:
-            nom = dupe['nom']
-            # Garder le premier, supprimer les autres
-            clients = Client.objects.filter(nom=nom).order_by('id')
-            premier = clients.first()
-            
-            # Fusionner les ventes
-            for client in clients.exclude(id=premier.id):
-                Vente.objects.filter(client=client).update(client=premier)
-            
-            # Supprimer les doublons
-            supprimés = clients.exclude(id=premier.id).delete()[0]
-            total_supprimés += supprimés
-            self.stdout.write(f"  ✓ Client '{nom}': {supprimés} doublon(s) supprimé(s)")
-        
-        if total_supprimés == 0:
-            self.stdout.write('  ℹ️  Aucun doublon de client trouvé')
-        else:
-            self.stdout.write(self.style.WARNING(f'  → Total: {total_supprimés} clients supprimés'))
+        doublons = _doublons(Client.objects.all(), ['nom'])
+
+        def fusionner(lot):
+            correspondance = {cid: survivant for cid, survivant in lot}
+            Vente.objects.filter(client_id__in=correspondance).update(
+                client_id=_remplacer('client_id', correspondance)
+            )
+            Client.objects.filter(pk__in=correspondance).delete()
+
+        return self._traiter(doublons, fusionner, 'clients')
 
     def remove_duplicate_lignes_vente(self):
-        """Supprime les lignes de vente en doublon"""
+        """Fusionne les lignes d'une même vente pour un même produit (quantités additionnées)"""
         self.stdout.write('\n🛒 Traitement des lignes de vente...')
-        
-        total_supprimés = 0
-        
-        # Trouver les lignes en doublon (même vente + même produit)
-        ventes = Vente.objects.all()
-        for vente in ventes:
-            lignes_dupes = vente.lignes.values('produit').annotate(
-                count=Count('id')
-            ).filter(count__gt=1)
-            
-            for dupe in lignes_dupes:
-                produit_id = dupe['produit']
-                lignes = vente.lignes.filter(produit_id=produit_id).order_by('id')
-                premiere = lignes.first()
-                
-                # Fusionner les quantités
-                quantite_totale = sum(l.quantite for l in lignes)
-                premiere.quantite = quantite_totale
-                premiere.save()
-                
-                # Supprimer les doublons
-                supprimés = lignes.exclude(id=premiere.id).delete()[0]
-                total_supprimés += supprimés
-        
-        if total_supprimés == 0:
-            self.stdout.write('  ℹ️  Aucun doublon de ligne trouvé')
-        else:
-            self.stdout.write(self.style.WARNING(f'  → Total: {total_supprimés} lignes supprimées'))
+        doublons = _doublons(LigneVente.objects.all(), ['vente', 'produit'], 'quantite')
+
+        def fusionner(lot):
+            quantites = defaultdict(int)
+            for _, survivante, quantite in lot:
+                quantites[survivante] += quantite
+            LigneVente.objects.filter(pk__in=quantites).update(quantite=F('quantite') + Case(
+                *[When(pk=survivante, then=Value(quantite)) for survivante, quantite in quantites.items()],
+                default=Value(0),
+                output_field=PositiveIntegerField(),
+            ))
+            LigneVente.objects.filter(pk__in=[ligne[0] for ligne in lot]).delete()
+
+        return self._traiter(doublons, fusionner, 'lignes')
+
+    def _traiter(self, doublons, fusionner, libelle):
+        """Applique `fusionner` par lots de --batch-size, chacun dans sa transaction"""
+        if not doublons:
+            self.stdout.write(f'  ℹ️  Aucun doublon de {libelle} trouvé')
+            return 0
+
+        groupes = len({ligne[1] for ligne in doublons})
+        if self.dry_run:
+            self.stdout.write(self.style.WARNING(
+                f'  → {len(doublons)} {libelle} en doublon dans {groupes} groupe(s) seraient fusionnés'
+            ))
+            return len(doublons)
+
+        debut = time.monotonic()
+        traites = 0
+        for i in range(0, len(doublons), self.batch_size):
+            lot = doublons[i:i + self.batch_size]
+            with transaction.atomic():
+                fusionner(lot)
+                # Les UPDATE groupés n'envoient pas de signal
+                transaction.on_commit(marquer_modification)
+            traites += len(lot)
+            self.stdout.write(f'  … {traites}/{len(doublons)} ({time.monotonic() - debut:.1f}s)')
+        self.stdout.write(self.style.WARNING(
+            f'  → Total: {traites} {libelle} supprimés ({groupes} groupe(s), {time.monotonic() - debut:.1f}s)'
+        ))
+        return traites
+
+
+def _doublons(queryset, partition, *champs):
+    """
+    Lignes en doublon sous forme de tuples (id, id du survivant, *champs), en une
+    requête : le survivant de chaque groupe est la ligne de plus petit id.
+    """
+    return list(
+        queryset.annotate(survivant=Window(Min('id'), partition_by=[F(champ) for champ in partition]))
+        .exclude(id=F('survivant'))
+        .order_by('survivant', 'id')
+        .values_list('id', 'survivant', *champs)
+    )
+
+
+def _remplacer(champ, correspondance):
+    """Expression SQL qui remplace chaque ancien id par celui de son survivant"""
+    return Case(
+        *[When(**{champ: ancien}, then=Value(nouveau)) for ancien, nouveau in correspondance.items()],
+        default=F(champ),
+        output_field=IntegerField(),
+    )
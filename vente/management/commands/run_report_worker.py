@@ -0,0 +1,72 @@
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+import time
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from vente.jobs import executer_job, nettoyer_rapports, reserver_jobs
+from vente.models import RapportJob
+
+# Intervalle entre deux suppressions des PDF expirés (secondes)
+INTERVALLE_NETTOYAGE = 3600
+
+
+def _initialiser_processus():
+    # Nécessaire si le pool démarre ses processus en mode "spawn"
+    django.setup()
+
+
+def _executer(job_id):
+    try:
+        return executer_job(job_id)
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = 'Génère en arrière-plan les rapports PDF en attente'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=2, help='Nombre de processus de génération')
+        parser.add_argument('--interval', type=float, default=2.0, help='Délai entre deux scrutations (secondes)')
+        parser.add_argument('--once', action='store_true', help='Traiter les jobs en attente puis s\'arrêter')
+
+    def handle(self, *args, **options):
+        nb_workers = options['workers']
+        intervalle = options['interval']
+        self.stdout.write(self.style.SUCCESS(f'📄 Worker de rapports démarré ({nb_workers} processus)'))
+
+        # Les connexions ne doivent pas être partagées avec les processus fils
+        connections.close_all()
+        en_cours = set()
+        prochain_nettoyage = 0
+        with ProcessPoolExecutor(max_workers=nb_workers, initializer=_initialiser_processus) as pool:
+            try:
+                while True:
+                    if time.monotonic() >= prochain_nettoyage:
+                        supprimes = nettoyer_rapports()
+                        if supprimes:
+                            self.stdout.write(f'  🧹 {supprimes} rapport(s) expiré(s) supprimé(s)')
+                        prochain_nettoyage = time.monotonic() + INTERVALLE_NETTOYAGE
+
+                    libres = nb_workers - len(en_cours)
+                    if libres > 0:
+                        for job_id in reserver_jobs(libres):
+                            self.stdout.write(f'  → Job #{job_id} lancé')
+                            en_cours.add(pool.submit(_executer, job_id))
+
+                    if not en_cours:
+                        if options['once']:
+                            break
+                        time.sleep(intervalle)
+                        continue
+
+                    termines, en_cours = wait(en_cours, timeout=intervalle, return_when=FIRST_COMPLETED)
+                    for future in termines:
+                        job_id, statut = future.result()
+                        style = self.style.SUCCESS if statut == RapportJob.TERMINE else self.style.ERROR
+                        self.stdout.write(style(f'  ✓ Job #{job_id}: {statut}'))
+            except KeyboardInterrupt:
+                self.stdout.write(self.style.WARNING('Arrêt demandé, fin des jobs en cours...'))
+        self.stdout.write(self.style.SUCCESS('✅ Worker arrêté'))
@@ -0,0 +1,73 @@
+from datetime import datetime
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from vente.generation import JeuDeDonnees, vider_ventes
+
+
+class Command(BaseCommand):
+    help = (
+        'Génère un jeu de données de ventes réaliste et reproductible (clients, produits, '
+        'ventes, lignes, journal de stock, statistiques) pour les mesures de performance'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=1000, help='Nombre de clients (défaut: 1000)')
+        parser.add_argument('--produits', type=int, default=500, help='Nombre de produits (défaut: 500)')
+        parser.add_argument('--ventes', type=int, default=100_000, help='Nombre de ventes (défaut: 100000)')
+        parser.add_argument('--lignes', type=int, default=3, help='Lignes par vente en moyenne (défaut: 3)')
+        parser.add_argument('--jours', type=int, default=365, help='Période couverte, en jours (défaut: 365)')
+        parser.add_argument(
+            '--fin',
+            help='Dernier jour de la période (AAAA-MM-JJ, aujourd\'hui par défaut) ; à fixer pour un jeu identique d\'un jour à l\'autre',
+        )
+        parser.add_argument('--seed', type=int, default=42, help='Graine du tirage (défaut: 42)')
+        parser.add_argument(
+            '--zipf', type=float, default=1.1,
+            help='Exposant de la loi de Zipf des ventes par produit (défaut: 1.1)',
+        )
+        parser.add_argument('--batch-size', type=int, default=5000, help='Ventes par transaction (défaut: 5000)')
+        parser.add_argument(
+            '--vider', action='store_true',
+            help='Supprime d\'abord toutes les ventes, produits, clients, mouvements et statistiques',
+        )
+
+    def handle(self, *args, **options):
+        if options['produits'] < 1 and options['ventes'] > 0:
+            raise CommandError('Il faut au moins un produit pour générer des ventes')
+        fin = None
+        if options['fin']:
+            try:
+                fin = datetime.strptime(options['fin'], '%Y-%m-%d').date()
+            except ValueError:
+                raise CommandError('Format de date invalide, attendu AAAA-MM-JJ')
+
+        debut = time.monotonic()
+        if options['vider']:
+            self.stdout.write(self.style.WARNING('🗑️  Suppression des données existantes...'))
+            vider_ventes()
+
+        self.ventes = self.lignes = 0
+        self.stdout.write(self.style.SUCCESS(
+            f"🌱 Génération de {options['ventes']:,} ventes (graine {options['seed']})..."
+        ))
+        jeu = JeuDeDonnees(
+            clients=options['clients'], produits=options['produits'], ventes=options['ventes'],
+            lignes=options['lignes'], jours=options['jours'], fin=fin, graine=options['seed'],
+            zipf=options['zipf'], taille_lot=options['batch_size'], rappel=self.progression,
+        )
+        self.debut_ventes = time.monotonic()
+        crees = jeu.generer()
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ {crees['clients']:,} clients, {crees['produits']:,} produits, {crees['ventes']:,} ventes, "
+            f"{crees['lignes']:,} lignes en {time.monotonic() - debut:.1f}s"
+        ))
+
+    def progression(self, ventes, lignes):
+        self.ventes += ventes
+        self.lignes += lignes
+        duree = time.monotonic() - self.debut_ventes
+        self.stdout.write(
+            f'  → {self.ventes:,} ventes, {self.lignes:,} lignes ({self.lignes / duree:,.0f} lignes/s)'
+        )
@@ -0,0 +1,34 @@
+from datetime import datetime, time as heure
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from vente.stock import creer_instantanes
+
+
+class Command(BaseCommand):
+    help = 'Enregistre un instantané du stock de chaque produit (à lancer chaque nuit)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--date',
+            help='Date de l\'instantané (AAAA-MM-JJ, début de journée ; aujourd\'hui par défaut)',
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        instant = None
+        if options['date']:
+            try:
+                jour = datetime.strptime(options['date'], '%Y-%m-%d').date()
+            except ValueError:
+                raise CommandError('Format de date invalide, attendu AAAA-MM-JJ')
+            instant = timezone.make_aware(datetime.combine(jour, heure.min))
+
+        self.stdout.write(self.style.SUCCESS('📸 Instantané du stock...'))
+        debut = time.monotonic()
+        crees = creer_instantanes(instant=instant, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ {crees} instantané(s) enregistré(s) en {time.monotonic() - debut:.1f}s'
+        ))
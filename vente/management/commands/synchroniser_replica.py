@@ -0,0 +1,48 @@
+import os
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+
+class Command(BaseCommand):
+    help = (
+        'Copie la base SQLite principale dans la réplique locale (SQLITE_REPLICA_PATH), '
+        'une fois ou toutes les N secondes pour simuler une réplication en retard'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--intervalle', type=float, default=0,
+            help='Recopie toutes les N secondes jusqu\'à interruption (défaut: une seule copie)',
+        )
+
+    def handle(self, *args, **options):
+        alias = settings.VENTE_REPLICA_ALIAS
+        if alias not in settings.DATABASES:
+            raise CommandError('Aucune réplique configurée (variable SQLITE_REPLICA_PATH)')
+        if connections['default'].vendor != 'sqlite' or connections[alias].vendor != 'sqlite':
+            raise CommandError('Réservé à la réplique SQLite locale ; PostgreSQL se réplique lui-même')
+        principale = str(connections['default'].settings_dict['NAME'])
+        copie = str(connections[alias].settings_dict['NAME'])
+
+        while True:
+            debut = time.time()
+            source = sqlite3.connect(principale)
+            cible = sqlite3.connect(copie)
+            try:
+                # Copie cohérente, même pendant les écritures des caisses
+                source.backup(cible)
+            finally:
+                cible.close()
+                source.close()
+            # La copie reflète la base à l'instant où elle a commencé (voir retard_copie_sqlite)
+            os.utime(copie, (debut, debut))
+            self.stdout.write(self.style.SUCCESS(
+                f'🔁 Réplique {copie} synchronisée en {time.time() - debut:.2f}s'
+            ))
+            if options['intervalle'] <= 0:
+                break
+            time.sleep(options['intervalle'])
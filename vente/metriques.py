@@ -0,0 +1,265 @@
+"""
+Mesures de performance par vue, exposées au format texte de Prometheus (/metrics).
+
+MetriquesMiddleware mesure chaque requête : durée totale, temps et nombre de
+requêtes SQL (execute_wrapper posé sur chaque connexion à son ouverture, voir
+brancher()), requêtes SQL répétées à
+l'identique, rendu des gabarits (moteur GabaritsMesures) et taille de la
+réponse. Les valeurs sont cumulées par nom de vue ('vente:liste_ventes') dans
+des histogrammes en mémoire : quelques additions par requête SQL, sans
+conserver les requêtes elles-mêmes. Une requête plus lente que
+VENTE_REQUETE_LENTE_MS est journalisée (logger 'vente.performances') avec ses
+instructions SQL les plus coûteuses.
+
+La mesure en cours est portée par une ContextVar : les requêtes SQL faites
+dans d'autres threads pour la même requête HTTP (vues async, sync_to_async,
+requêtes en parallèle du tableau de bord) lui sont aussi comptées.
+
+Les histogrammes sont propres à chaque processus : avec plusieurs workers,
+Prometheus agrège les séries de chaque instance scrutée.
+"""
+import bisect
+import logging
+import threading
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.template.backends.django import DjangoTemplates
+
+logger = logging.getLogger('vente.performances')
+
+DUREES = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+NOMBRES = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+DOUBLONS = (0, 1, 2, 5, 10, 50, 100)
+TAILLES = (1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+
+METRIQUES = {
+    'vente_requete_duree_secondes': ('Durée totale de la requête HTTP', DUREES),
+    'vente_requete_sql_duree_secondes': ('Temps passé dans les requêtes SQL', DUREES),
+    'vente_requete_sql_nombre': ('Requêtes SQL par requête HTTP', NOMBRES),
+    'vente_requete_sql_doublons': ('Requêtes SQL répétées à l\'identique (mêmes paramètres)', DOUBLONS),
+    'vente_requete_gabarits_duree_secondes': ('Temps de rendu des gabarits', DUREES),
+    'vente_reponse_taille_octets': ('Taille du corps de la réponse', TAILLES),
+}
+# Instructions SQL citées dans le journal des requêtes lentes
+NB_INSTRUCTIONS_JOURNAL = 5
+
+_mesure_en_cours = ContextVar('vente_mesure_en_cours', default=None)
+_verrou = threading.Lock()
+_histogrammes = {}
+
+
+class Histogramme:
+    def __init__(self, bornes):
+        self.bornes = bornes
+        # Une case par borne, plus la dernière pour +Inf
+        self.comptes = [0] * (len(bornes) + 1)
+        self.somme = 0
+
+    def observer(self, valeur):
+        self.comptes[bisect.bisect_left(self.bornes, valeur)] += 1
+        self.somme += valeur
+
+
+def observer(metrique, vue, valeur):
+    with _verrou:
+        histogramme = _histogrammes.get((metrique, vue))
+        if histogramme is None:
+            histogramme = _histogrammes[(metrique, vue)] = Histogramme(METRIQUES[metrique][1])
+        histogramme.observer(valeur)
+
+
+def reinitialiser():
+    with _verrou:
+        _histogrammes.clear()
+
+
+def exposition():
+    """Histogrammes au format texte de Prometheus (version 0.0.4)"""
+    with _verrou:
+        releve = {
+            cle: (list(histogramme.comptes), histogramme.somme)
+            for cle, histogramme in _histogrammes.items()
+        }
+    lignes = []
+    for metrique, (aide, bornes) in METRIQUES.items():
+        lignes.append(f'# HELP {metrique} {aide}')
+        lignes.append(f'# TYPE {metrique} histogram')
+        for (nom, vue), (comptes, somme) in sorted(releve.items()):
+            if nom != metrique:
+                continue
+            etiquette = vue.replace('\\', '\\\\').replace('"', '\\"')
+            cumul = 0
+            for borne, compte in zip([*bornes, '+Inf'], comptes):
+                cumul += compte
+                lignes.append(f'{metrique}_bucket{{vue="{etiquette}",le="{borne}"}} {cumul}')
+            lignes.append(f'{metrique}_sum{{vue="{etiquette}"}} {somme}')
+            lignes.append(f'{metrique}_count{{vue="{etiquette}"}} {cumul}')
+    return '\n'.join(lignes) + '\n'
+
+
+class MesureRequete:
+    """Compteurs d'une requête HTTP ; sert aussi d'execute_wrapper aux connexions"""
+
+    def __init__(self):
+        self.debut = time.perf_counter()
+        # Plusieurs threads peuvent exécuter des requêtes SQL pour la même mesure
+        self._verrou = threading.Lock()
+        self.sql_duree = 0.0
+        self.sql_nombre = 0
+        self.doublons = 0
+        self.gabarits = 0.0
+        # Instruction SQL -> [nombre, durée]
+        self.instructions = {}
+        self._vues = set()
+
+    def __call__(self, execute, sql, params, many, context):
+        debut = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duree = time.perf_counter() - debut
+            cle = None if many else (sql, repr(params))
+            with self._verrou:
+                self.sql_duree += duree
+                self.sql_nombre += 1
+                cumul = self.instructions.get(sql)
+                if cumul is None:
+                    self.instructions[sql] = [1, duree]
+                else:
+                    cumul[0] += 1
+                    cumul[1] += duree
+                if cle is not None:
+                    if cle in self._vues:
+                        self.doublons += 1
+                    else:
+                        self._vues.add(cle)
+
+
+def _mesurer_sql(execute, sql, params, many, context):
+    """execute_wrapper permanent : compte la requête dans la mesure du contexte courant, s'il y en a une"""
+    mesure = _mesure_en_cours.get()
+    if mesure is None:
+        return execute(sql, params, many, context)
+    return mesure(execute, sql, params, many, context)
+
+
+def brancher(connexion):
+    """
+    Pose _mesurer_sql sur une connexion (receveur de connection_created).
+
+    En tête de liste : connection.execute_wrapper() retire le dernier wrapper
+    ajouté, qui doit rester le sien même si la connexion s'ouvre dans le bloc.
+    """
+    if _mesurer_sql not in connexion.execute_wrappers:
+        connexion.execute_wrappers.insert(0, _mesurer_sql)
+
+
+class MetriquesMiddleware:
+    """À placer en tête de MIDDLEWARE pour inclure le temps des autres middlewares"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        # Sous ASGI, pas de passage par un thread pour chaque requête
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        mesure = MesureRequete()
+        jeton = _mesure_en_cours.set(mesure)
+        try:
+            response = self.get_response(request)
+        finally:
+            _mesure_en_cours.reset(jeton)
+        return self.enregistrer(request, response, mesure)
+
+    async def __acall__(self, request):
+        mesure = MesureRequete()
+        jeton = _mesure_en_cours.set(mesure)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _mesure_en_cours.reset(jeton)
+        return self.enregistrer(request, response, mesure)
+
+    def enregistrer(self, request, response, mesure):
+        duree = time.perf_counter() - mesure.debut
+
+        # Nom de la vue plutôt que le chemin : nombre de séries borné
+        vue = request.resolver_match.view_name if request.resolver_match else 'inconnue'
+        observer('vente_requete_duree_secondes', vue, duree)
+        observer('vente_requete_sql_duree_secondes', vue, mesure.sql_duree)
+        observer('vente_requete_sql_nombre', vue, mesure.sql_nombre)
+        observer('vente_requete_sql_doublons', vue, mesure.doublons)
+        observer('vente_requete_gabarits_duree_secondes', vue, mesure.gabarits)
+        if not response.streaming:
+            observer('vente_reponse_taille_octets', vue, len(response.content))
+        elif response.has_header('Content-Length'):
+            # FileResponse : le fichier reste envoyé tel quel (wsgi.file_wrapper)
+            observer('vente_reponse_taille_octets', vue, int(response['Content-Length']))
+        elif not response.is_async:
+            # Taille connue une fois le flux envoyé (les requêtes SQL faites
+            # pendant l'envoi ne sont pas comptées)
+            response.streaming_content = _compter_octets(response.streaming_content, vue)
+
+        if duree * 1000 >= getattr(settings, 'VENTE_REQUETE_LENTE_MS', 500):
+            self.journaliser(request, vue, duree, mesure)
+        return response
+
+    def journaliser(self, request, vue, duree, mesure):
+        plus_couteuses = sorted(mesure.instructions.items(), key=lambda item: item[1][1], reverse=True)
+        logger.warning(
+            'Requête lente %s %s (%s) : %.0f ms, %d requête(s) SQL en %.0f ms dont %d doublon(s), '
+            'gabarits %.0f ms\n%s',
+            request.method, request.path, vue, duree * 1000, mesure.sql_nombre, mesure.sql_duree * 1000,
+            mesure.doublons, mesure.gabarits * 1000,
+            '\n'.join(
+                f'  {nombre} x {cumul * 1000:.1f} ms : {sql[:300]}'
+                for sql, (nombre, cumul) in plus_couteuses[:NB_INSTRUCTIONS_JOURNAL]
+            ),
+        )
+
+
+def _compter_octets(contenu, vue):
+    taille = 0
+    try:
+        for morceau in contenu:
+            taille += len(morceau)
+            yield morceau
+    finally:
+        observer('vente_reponse_taille_octets', vue, taille)
+
+
+class GabaritsMesures(DjangoTemplates):
+    """Moteur de gabarits Django qui ajoute le temps de rendu à la requête en cours"""
+
+    def get_template(self, template_name):
+        return _GabaritMesure(super().get_template(template_name))
+
+    def from_string(self, template_code):
+        return _GabaritMesure(super().from_string(template_code))
+
+
+class _GabaritMesure:
+    def __init__(self, gabarit):
+        self.gabarit = gabarit
+
+    def __getattr__(self, nom):
+        return getattr(self.gabarit, nom)
+
+    def render(self, context=None, request=None):
+        mesure = _mesure_en_cours.get()
+        if mesure is None:
+            return self.gabarit.render(context, request)
+        debut = time.perf_counter()
+        try:
+            return self.gabarit.render(context, request)
+        finally:
+            mesure.gabarits += time.perf_counter() - debut
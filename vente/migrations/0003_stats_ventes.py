@@ -0,0 +1,127 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:18
+
+from decimal import Decimal
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, DecimalField, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+
+def remplir_statistiques(apps, schema_editor):
+    """Agrégats des ventes existantes, comme la commande rebuild_sales_stats"""
+    Vente = apps.get_model('vente', 'Vente')
+    LigneVente = apps.get_model('vente', 'LigneVente')
+    StatJour = apps.get_model('vente', 'StatJour')
+    StatMois = apps.get_model('vente', 'StatMois')
+    StatClientJour = apps.get_model('vente', 'StatClientJour')
+    StatProduitJour = apps.get_model('vente', 'StatProduitJour')
+
+    quantites = dict(LigneVente.objects.values_list('vente_id').annotate(q=Sum('quantite')).order_by())
+    jours, mois, clients = {}, {}, {}
+    for vente_id, client_id, date_vente, total in Vente.objects.values_list(
+        'id', 'client_id', 'date_vente', 'total'
+    ).iterator(chunk_size=2000):
+        jour = timezone.localdate(date_vente)
+        cles = [(jours, jour), (mois, (jour.year, jour.month))]
+        if client_id:
+            cles.append((clients, (jour, client_id)))
+        for cumul, cle in cles:
+            valeurs = cumul.setdefault(cle, [0, Decimal('0.00'), 0])
+            valeurs[0] += 1
+            valeurs[1] += total
+            valeurs[2] += quantites.get(vente_id) or 0
+
+    StatJour.objects.bulk_create(
+        [StatJour(date=d, nb_ventes=n, chiffre_affaires=ca, quantite=q) for d, (n, ca, q) in jours.items()],
+        batch_size=1000,
+    )
+    StatMois.objects.bulk_create(
+        [StatMois(annee=a, mois=m, nb_ventes=n, chiffre_affaires=ca, quantite=q)
+         for (a, m), (n, ca, q) in mois.items()],
+        batch_size=1000,
+    )
+    StatClientJour.objects.bulk_create(
+        [StatClientJour(date=d, client_id=c, nb_ventes=n, chiffre_affaires=ca, quantite=q)
+         for (d, c), (n, ca, q) in clients.items()],
+        batch_size=1000,
+    )
+    StatProduitJour.objects.bulk_create(
+        [
+            StatProduitJour(date=p['jour'], produit_id=p['produit_id'], nb_ventes=p['nb'],
+                            chiffre_affaires=p['ca'] or 0, quantite=p['q'] or 0)
+            for p in LigneVente.objects.annotate(jour=TruncDate('vente__date_vente'))
+            .values('jour', 'produit_id')
+            .annotate(
+                nb=Count('vente_id', distinct=True),
+                ca=Sum(F('quantite') * F('prix_unitaire'), output_field=DecimalField()),
+                q=Sum('quantite'),
+            )
+            .order_by()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vente', '0002_lignevente_stock_deduit'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StatJour',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True)),
+                ('nb_ventes', models.PositiveIntegerField(default=0)),
+                ('chiffre_affaires', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('quantite', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='StatMois',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('annee', models.PositiveSmallIntegerField()),
+                ('mois', models.PositiveSmallIntegerField()),
+                ('nb_ventes', models.PositiveIntegerField(default=0)),
+                ('chiffre_affaires', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('quantite', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'unique_together': {('annee', 'mois')},
+            },
+        ),
+        migrations.CreateModel(
+            name='StatClientJour',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('nb_ventes', models.PositiveIntegerField(default=0)),
+                ('chiffre_affaires', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('quantite', models.PositiveIntegerField(default=0)),
+                ('client', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stats_jour', to='vente.client')),
+            ],
+            options={
+                'unique_together': {('date', 'client')},
+            },
+        ),
+        migrations.CreateModel(
+            name='StatProduitJour',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('nb_ventes', models.PositiveIntegerField(default=0)),
+                ('chiffre_affaires', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('quantite', models.PositiveIntegerField(default=0)),
+                ('produit', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stats_jour', to='vente.produit')),
+            ],
+            options={
+                'unique_together': {('date', 'produit')},
+            },
+        ),
+        migrations.RunPython(remplir_statistiques, migrations.RunPython.noop),
+    ]
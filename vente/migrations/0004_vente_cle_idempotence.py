@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vente', '0003_stats_ventes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='vente',
+            name='cle_idempotence',
+            field=models.CharField(blank=True, max_length=64, null=True, unique=True),
+        ),
+    ]
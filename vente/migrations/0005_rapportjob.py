@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:24
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vente', '0004_vente_cle_idempotence'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RapportJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('type_rapport', models.CharField(choices=[('clients', 'Clients ayant acheté'), ('ventes', 'Ventes')], max_length=20)),
+                ('filtres', models.JSONField(blank=True, default=dict)),
+                ('version_donnees', models.CharField(max_length=64)),
+                ('cle_cache', models.CharField(db_index=True, max_length=64)),
+                ('statut', models.CharField(choices=[('en_attente', 'En attente'), ('en_cours', 'En cours'), ('termine', 'Terminé'), ('erreur', 'Erreur')], db_index=True, default='en_attente', max_length=20)),
+                ('erreur', models.TextField(blank=True)),
+                ('cree_le', models.DateTimeField(default=django.utils.timezone.now)),
+                ('termine_le', models.DateTimeField(blank=True, null=True)),
+                ('demandeur', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='rapports', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
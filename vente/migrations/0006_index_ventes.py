@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:27
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vente', '0005_rapportjob'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='lignevente',
+            name='produit',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.PROTECT, to='vente.produit'),
+        ),
+        migrations.AlterField(
+            model_name='vente',
+            name='client',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, to='vente.client'),
+        ),
+        migrations.AddIndex(
+            model_name='lignevente',
+            index=models.Index(fields=['produit', 'vente'], name='lignevente_produit_vente_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='produit',
+            index=models.Index(condition=models.Q(('stock__lte', models.F('seuil_alerte'))), fields=['stock'], name='produit_stock_faible_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='vente',
+            index=models.Index(fields=['date_vente', 'id'], name='vente_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='vente',
+            index=models.Index(fields=['client', 'date_vente'], name='vente_client_date_idx'),
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:34
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def journaliser_stock_initial(apps, schema_editor):
+    """Le stock existant devient le premier mouvement (inventaire) de chaque produit"""
+    Produit = apps.get_model('vente', 'Produit')
+    MouvementStock = apps.get_model('vente', 'MouvementStock')
+    MouvementStock.objects.bulk_create(
+        (
+            MouvementStock(produit_id=pid, quantite=stock, type_mouvement='inventaire')
+            for pid, stock in Produit.objects.filter(stock__gt=0).values_list('pk', 'stock').iterator()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vente', '0006_index_ventes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InstantaneStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateTimeField()),
+                ('stock', models.IntegerField()),
+                ('produit', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='instantanes_stock', to='vente.produit')),
+            ],
+            options={
+                'unique_together': {('produit', 'date')},
+            },
+        ),
+        migrations.CreateModel(
+            name='MouvementStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('type_mouvement', models.CharField(choices=[('vente', 'Vente'), ('annulation', 'Annulation'), ('reappro', 'Réapprovisionnement'), ('ajustement', 'Ajustement'), ('inventaire', 'Inventaire initial')], max_length=20)),
+                ('quantite', models.IntegerField()),
+                ('date', models.DateTimeField(default=django.utils.timezone.now)),
+                ('produit', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='mouvements', to='vente.produit')),
+                ('vente', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='mouvements_stock', to='vente.vente')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['produit', 'date'], name='mouvement_produit_date_idx')],
+            },
+        ),
+        migrations.RunPython(journaliser_stock_initial, migrations.RunPython.noop),
+    ]
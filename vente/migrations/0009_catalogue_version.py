@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:40
+
+import vente.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vente', '0008_index_recherche_nom'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EtatCatalogue',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('derniere_suppression', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='produit',
+            name='version',
+            field=models.BigIntegerField(db_index=True, default=vente.models.nouvelle_version_catalogue, editable=False),
+        ),
+    ]
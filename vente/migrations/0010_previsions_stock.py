@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:01
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vente', '0009_catalogue_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PrevisionStock',
+            fields=[
+                ('produit', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='prevision', serialize=False, to='vente.produit')),
+                ('stock', models.PositiveIntegerField()),
+                ('demande_jour', models.FloatField()),
+                ('jours_avant_rupture', models.FloatField(blank=True, db_index=True, null=True)),
+                ('date_rupture', models.DateField(blank=True, null=True)),
+                ('quantite_a_commander', models.PositiveIntegerField(default=0)),
+                ('calcule_le', models.DateTimeField()),
+            ],
+        ),
+    ]
@@ -0,0 +1,91 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:11
+
+from bisect import bisect_left, bisect_right
+import math
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Max, Min, Sum
+
+
+def _noter(valeurs, classes=5):
+    """Même notation par rang que vente.analyse_clients.noter, sans numpy"""
+    triees = sorted(valeurs)
+    return [
+        min(max(1 + math.floor(classes * ((bisect_left(triees, v) + bisect_right(triees, v) - 1) / 2 + 0.5)
+                               / len(valeurs)), 1), classes)
+        for v in valeurs
+    ]
+
+
+def _segment(recence, frequence, montant, nb_achats):
+    """Mêmes règles que vente.analyse_clients.segmenter"""
+    if recence >= 4 and frequence >= 4 and montant >= 4:
+        return 'champion'
+    if recence >= 3 and frequence >= 4:
+        return 'fidele'
+    if recence <= 2 and frequence >= 3 and nb_achats > 1:
+        return 'a_risque'
+    if recence >= 4 and nb_achats == 1:
+        return 'nouveau'
+    if recence >= 3:
+        return 'prometteur'
+    return 'perdu'
+
+
+def remplir_profils(apps, schema_editor):
+    """Profils des clients des ventes existantes, comme refresh_customer_analytics --complet"""
+    Vente = apps.get_model('vente', 'Vente')
+    ProfilClient = apps.get_model('vente', 'ProfilClient')
+    achats = list(
+        Vente.objects.filter(client__isnull=False)
+        .values_list('client_id')
+        .annotate(Count('id'), Sum('total'), Min('date_vente'), Max('date_vente'), Max('id'))
+        .order_by()
+    )
+    if not achats:
+        return
+    recences = _noter([dernier.timestamp() for _, _, _, _, dernier, _ in achats])
+    frequences = _noter([nb for _, nb, _, _, _, _ in achats])
+    montants = _noter([float(montant) for _, _, montant, _, _, _ in achats])
+    ProfilClient.objects.bulk_create(
+        [
+            ProfilClient(
+                client_id=client_id, nb_achats=nb, montant_total=montant, premier_achat=premier,
+                dernier_achat=dernier, derniere_vente=derniere, score_recence=r, score_frequence=f,
+                score_montant=m, segment=_segment(r, f, m, nb),
+            )
+            for (client_id, nb, montant, premier, dernier, derniere), r, f, m
+            in zip(achats, recences, frequences, montants)
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vente', '0010_previsions_stock'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProfilClient',
+            fields=[
+                ('client', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='profil', serialize=False, to='vente.client')),
+                ('nb_achats', models.PositiveIntegerField()),
+                ('montant_total', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('premier_achat', models.DateTimeField()),
+                ('dernier_achat', models.DateTimeField()),
+                ('derniere_vente', models.PositiveBigIntegerField(db_index=True)),
+                ('score_recence', models.PositiveSmallIntegerField()),
+                ('score_frequence', models.PositiveSmallIntegerField()),
+                ('score_montant', models.PositiveSmallIntegerField()),
+                ('segment', models.CharField(choices=[('champion', 'Champion'), ('fidele', 'Fidèle'), ('nouveau', 'Nouveau'), ('prometteur', 'Prometteur'), ('a_risque', 'À risque'), ('perdu', 'Perdu')], db_index=True, max_length=20)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['-montant_total'], name='profil_montant_idx'), models.Index(fields=['-dernier_achat'], name='profil_dernier_achat_idx')],
+            },
+        ),
+        migrations.RunPython(remplir_profils, migrations.RunPython.noop),
+    ]
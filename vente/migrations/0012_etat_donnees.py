@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vente', '0011_profils_clients'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EtatDonnees',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='rapportjob',
+            name='demarre_le',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
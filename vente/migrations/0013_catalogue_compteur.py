@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vente', '0012_etat_donnees'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='etatcatalogue',
+            name='compteur',
+            field=models.BigIntegerField(default=0),
+        ),
+    ]
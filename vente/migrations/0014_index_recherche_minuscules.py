@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:01
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vente', '0013_catalogue_compteur'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='client',
+            index=models.Index(django.db.models.functions.text.Lower('nom'), name='client_nom_lower_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='produit',
+            index=models.Index(django.db.models.functions.text.Lower('nom'), name='produit_nom_lower_idx'),
+        ),
+    ]
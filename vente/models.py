@@ -1,7 +1,28 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models.functions import Lower
 from django.urls import reverse
 from django.utils import timezone
 from decimal import Decimal
+import time
+
+# Plus grand identifiant possible (clés BigAutoField) ; au-delà, un paramètre
+# de requête ne peut même pas être transmis à la base (OverflowError)
+ID_MAX = 2**63 - 1
+
+
+def nouvelle_version_catalogue():
+    """Version attribuée à un produit à chaque écriture (horodatage en millisecondes)"""
+    return time.time_ns() // 1_000_000
+
+
+def marquer_catalogue():
+    """
+    Appelé dans la transaction qui écrit des produits : le compteur
+    d'EtatCatalogue (ETag du catalogue) change exactement à sa validation
+    """
+    if not EtatCatalogue.objects.filter(pk=1).update(compteur=models.F('compteur') + 1):
+        EtatCatalogue.objects.get_or_create(pk=1, defaults={'compteur': 1})
+
 
 class Client(models.Model):
     nom = models.CharField(max_length=150)
@@ -9,6 +30,13 @@ class Client(models.Model):
     telephone = models.CharField(max_length=30, blank=True)
     adresse = models.TextField(blank=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['nom'], name='client_nom_idx'),
+            # Recherche par début de nom sans distinction de casse (vente/recherche.py)
+            models.Index(Lower('nom'), name='client_nom_lower_idx'),
+        ]
+
     def __str__(self):
         return self.nom
 
@@ -18,35 +46,78 @@ class Produit(models.Model):
     prix = models.DecimalField(max_digits=10, decimal_places=2)
     stock = models.PositiveIntegerField(default=0)
     seuil_alerte = models.PositiveIntegerField(default=5)  # alerte stock faible
+    # Changée à chaque écriture (voir catalogue.py) ; les UPDATE en masse la renseignent aussi
+    version = models.BigIntegerField(default=nouvelle_version_catalogue, db_index=True, editable=False)
+
+    class Meta:
+        indexes = [
+            # Index partiel : seuls les produits en stock faible y figurent
+            # (ignoré par les bases qui ne gèrent pas les index partiels)
+            models.Index(
+                fields=['stock'],
+                condition=models.Q(stock__lte=models.F('seuil_alerte')),
+                name='produit_stock_faible_idx',
+            ),
+            # Recherche par début de nom quand FTS5 / pg_trgm ne sont pas disponibles
+            models.Index(fields=['nom'], name='produit_nom_idx'),
+            models.Index(Lower('nom'), name='produit_nom_lower_idx'),
+        ]
 
     def __str__(self):
         return self.nom
 
+    def save(self, *args, **kwargs):
+        self.version = nouvelle_version_catalogue()
+        if kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = {*kwargs['update_fields'], 'version'}
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            marquer_catalogue()
+
     def en_stock(self, quantite=1):
         return self.stock >= quantite
 
-    def decrementer_stock(self, quantite=1):
+    def decrementer_stock(self, quantite=1, type_mouvement='vente'):
         """Diminue le stock du produit"""
         if quantite <= 0:
             return False
-        if not self.en_stock(quantite):
-            return False
+        with transaction.atomic():
+            # UPDATE conditionnel : pas de vente à découvert en cas d'accès concurrent
+            if not Produit.objects.filter(pk=self.pk, stock__gte=quantite).update(
+                stock=models.F('stock') - quantite, version=nouvelle_version_catalogue()
+            ):
+                return False
+            marquer_catalogue()
+            MouvementStock.objects.create(produit=self, quantite=-quantite, type_mouvement=type_mouvement)
         self.stock = max(0, self.stock - quantite)
-        self.save()
         return True
 
-    def restaurer_stock(self, quantite=1):
-        """Restaure le stock du produit (en cas d'annulation)"""
+    def restaurer_stock(self, quantite=1, type_mouvement='annulation'):
+        """Restaure le stock du produit (en cas d'annulation ou de réapprovisionnement)"""
         if quantite <= 0:
             return
+        with transaction.atomic():
+            Produit.objects.filter(pk=self.pk).update(
+                stock=models.F('stock') + quantite, version=nouvelle_version_catalogue()
+            )
+            marquer_catalogue()
+            MouvementStock.objects.create(produit=self, quantite=quantite, type_mouvement=type_mouvement)
         self.stock += quantite
-        self.save()
 
 class Vente(models.Model):
-    client = models.ForeignKey(Client, on_delete=models.SET_NULL, null=True, blank=True)
+    # Index remplacé par l'index composite (client, date_vente) ci-dessous
+    client = models.ForeignKey(Client, on_delete=models.SET_NULL, null=True, blank=True, db_index=False)
     date_vente = models.DateTimeField(default=timezone.now)
     total = models.DecimalField(max_digits=12, decimal_places=2, default=0)
     paiement_effectue = models.BooleanField(default=False)
+    # Clé fournie par la caisse / le site pour rendre l'API d'import idempotente
+    cle_idempotence = models.CharField(max_length=64, unique=True, null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['date_vente', 'id'], name='vente_date_idx'),
+            models.Index(fields=['client', 'date_vente'], name='vente_client_date_idx'),
+        ]
 
     def __str__(self):
         return f"Vente #{self.id} - {self.client.nom if self.client else 'Client inconnu'}"
@@ -61,11 +132,17 @@ class Vente(models.Model):
 
 class LigneVente(models.Model):
     vente = models.ForeignKey(Vente, on_delete=models.CASCADE, related_name='lignes')
-    produit = models.ForeignKey(Produit, on_delete=models.PROTECT)
+    # Index remplacé par l'index composite (produit, vente) ci-dessous
+    produit = models.ForeignKey(Produit, on_delete=models.PROTECT, db_index=False)
     quantite = models.PositiveIntegerField(default=1)
     prix_unitaire = models.DecimalField(max_digits=10, decimal_places=2)
     stock_deduit = models.BooleanField(default=False)  # Tracker si stock a déjà été déduit
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['produit', 'vente'], name='lignevente_produit_vente_idx'),
+        ]
+
     def __str__(self):
         return f"{self.produit.nom} x {self.quantite}"
 
@@ -77,3 +154,218 @@ class LigneVente(models.Model):
         if not self.prix_unitaire:
             self.prix_unitaire = self.produit.prix
         super().save(*args, **kwargs)
+
+
+# -----------------------
+# Agrégats de ventes (tableau de bord)
+# -----------------------
+class StatJour(models.Model):
+    """Cumul des ventes d'une journée (mis à jour à chaque vente)"""
+    date = models.DateField(unique=True)
+    nb_ventes = models.PositiveIntegerField(default=0)
+    chiffre_affaires = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    quantite = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.date}: {self.nb_ventes} vente(s)"
+
+class StatMois(models.Model):
+    """Cumul des ventes d'un mois"""
+    annee = models.PositiveSmallIntegerField()
+    mois = models.PositiveSmallIntegerField()
+    nb_ventes = models.PositiveIntegerField(default=0)
+    chiffre_affaires = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    quantite = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = [('annee', 'mois')]
+
+    def __str__(self):
+        return f"{self.mois:02d}/{self.annee}: {self.nb_ventes} vente(s)"
+
+class StatProduitJour(models.Model):
+    """Ventes d'un produit sur une journée"""
+    date = models.DateField()
+    produit = models.ForeignKey(Produit, on_delete=models.CASCADE, related_name='stats_jour')
+    nb_ventes = models.PositiveIntegerField(default=0)
+    chiffre_affaires = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    quantite = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = [('date', 'produit')]
+
+class StatClientJour(models.Model):
+    """Achats d'un client sur une journée"""
+    date = models.DateField()
+    client = models.ForeignKey(Client, on_delete=models.CASCADE, related_name='stats_jour')
+    nb_ventes = models.PositiveIntegerField(default=0)
+    chiffre_affaires = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    quantite = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = [('date', 'client')]
+
+
+# -----------------------
+# Rapports générés en arrière-plan
+# -----------------------
+class RapportJob(models.Model):
+    TYPE_CLIENTS = 'clients'
+    TYPE_VENTES = 'ventes'
+    TYPES = [
+        (TYPE_CLIENTS, 'Clients ayant acheté'),
+        (TYPE_VENTES, 'Ventes'),
+    ]
+
+    EN_ATTENTE = 'en_attente'
+    EN_COURS = 'en_cours'
+    TERMINE = 'termine'
+    ERREUR = 'erreur'
+    STATUTS = [
+        (EN_ATTENTE, 'En attente'),
+        (EN_COURS, 'En cours'),
+        (TERMINE, 'Terminé'),
+        (ERREUR, 'Erreur'),
+    ]
+
+    type_rapport = models.CharField(max_length=20, choices=TYPES)
+    filtres = models.JSONField(default=dict, blank=True)
+    version_donnees = models.CharField(max_length=64)
+    cle_cache = models.CharField(max_length=64, db_index=True)
+    statut = models.CharField(max_length=20, choices=STATUTS, default=EN_ATTENTE, db_index=True)
+    erreur = models.TextField(blank=True)
+    demandeur = models.ForeignKey(
+        'auth.User', on_delete=models.SET_NULL, null=True, blank=True, related_name='rapports'
+    )
+    cree_le = models.DateTimeField(default=timezone.now)
+    demarre_le = models.DateTimeField(null=True, blank=True)
+    termine_le = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Rapport {self.type_rapport} #{self.id} ({self.statut})"
+
+
+# -----------------------
+# Historique du stock
+# -----------------------
+class MouvementStock(models.Model):
+    """Variation du stock d'un produit ; journal en ajout seul, jamais modifié"""
+    VENTE = 'vente'
+    ANNULATION = 'annulation'
+    REAPPROVISIONNEMENT = 'reappro'
+    AJUSTEMENT = 'ajustement'
+    INVENTAIRE = 'inventaire'
+    TYPES = [
+        (VENTE, 'Vente'),
+        (ANNULATION, 'Annulation'),
+        (REAPPROVISIONNEMENT, 'Réapprovisionnement'),
+        (AJUSTEMENT, 'Ajustement'),
+        (INVENTAIRE, 'Inventaire initial'),
+    ]
+
+    # Index remplacé par l'index composite (produit, date) ci-dessous
+    produit = models.ForeignKey(Produit, on_delete=models.CASCADE, related_name='mouvements', db_index=False)
+    type_mouvement = models.CharField(max_length=20, choices=TYPES)
+    quantite = models.IntegerField()  # positive en entrée, négative en sortie
+    vente = models.ForeignKey(
+        Vente, on_delete=models.SET_NULL, null=True, blank=True, related_name='mouvements_stock'
+    )
+    date = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['produit', 'date'], name='mouvement_produit_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_type_mouvement_display()} {self.quantite:+d} (produit #{self.produit_id})"
+
+class InstantaneStock(models.Model):
+    """Stock d'un produit à une date : point de départ pour relire le journal"""
+    # La contrainte (produit, date) sert aussi d'index pour trouver le dernier instantané
+    produit = models.ForeignKey(
+        Produit, on_delete=models.CASCADE, related_name='instantanes_stock', db_index=False
+    )
+    date = models.DateTimeField()
+    stock = models.IntegerField()
+
+    class Meta:
+        unique_together = [('produit', 'date')]
+
+    def __str__(self):
+        return f"Produit #{self.produit_id} au {self.date:%d/%m/%Y %H:%M}: {self.stock}"
+
+
+# -----------------------
+# Prévisions de demande (commande refresh_forecasts)
+# -----------------------
+class PrevisionStock(models.Model):
+    """Demande prévue d'un produit, rupture estimée et quantité à commander"""
+    produit = models.OneToOneField(Produit, on_delete=models.CASCADE, primary_key=True, related_name='prevision')
+    stock = models.PositiveIntegerField()  # stock au moment du calcul
+    demande_jour = models.FloatField()  # unités par jour
+    # Vide si le produit ne se vend pas ; 0 s'il est déjà en rupture
+    jours_avant_rupture = models.FloatField(null=True, blank=True, db_index=True)
+    date_rupture = models.DateField(null=True, blank=True)
+    quantite_a_commander = models.PositiveIntegerField(default=0)
+    calcule_le = models.DateTimeField()
+
+    def __str__(self):
+        return f"Produit #{self.produit_id}: {self.demande_jour:.1f}/jour"
+
+
+# -----------------------
+# Analyse clients RFM (commande refresh_customer_analytics)
+# -----------------------
+class ProfilClient(models.Model):
+    """Récence, fréquence et montant des achats d'un client, avec son segment"""
+    CHAMPION = 'champion'
+    FIDELE = 'fidele'
+    NOUVEAU = 'nouveau'
+    PROMETTEUR = 'prometteur'
+    A_RISQUE = 'a_risque'
+    PERDU = 'perdu'
+    SEGMENTS = [
+        (CHAMPION, 'Champion'),
+        (FIDELE, 'Fidèle'),
+        (NOUVEAU, 'Nouveau'),
+        (PROMETTEUR, 'Prometteur'),
+        (A_RISQUE, 'À risque'),
+        (PERDU, 'Perdu'),
+    ]
+
+    client = models.OneToOneField(Client, on_delete=models.CASCADE, primary_key=True, related_name='profil')
+    nb_achats = models.PositiveIntegerField()
+    montant_total = models.DecimalField(max_digits=14, decimal_places=2)
+    premier_achat = models.DateTimeField()
+    dernier_achat = models.DateTimeField()
+    # Plus grand id de vente du client pris en compte (reprise incrémentale)
+    derniere_vente = models.PositiveBigIntegerField(db_index=True)
+    # Quintiles 1 (plus faible) à 5 parmi tous les clients
+    score_recence = models.PositiveSmallIntegerField()
+    score_frequence = models.PositiveSmallIntegerField()
+    score_montant = models.PositiveSmallIntegerField()
+    segment = models.CharField(max_length=20, choices=SEGMENTS, db_index=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-montant_total'], name='profil_montant_idx'),
+            models.Index(fields=['-dernier_achat'], name='profil_dernier_achat_idx'),
+        ]
+
+    def __str__(self):
+        return f"Client #{self.client_id}: {self.get_segment_display()}"
+
+
+class EtatCatalogue(models.Model):
+    """
+    Ligne unique : version de la dernière suppression de produit, et compteur
+    incrémenté par chaque transaction qui écrit des produits
+    """
+    derniere_suppression = models.BigIntegerField(default=0)
+    compteur = models.BigIntegerField(default=0)
+
+
+class EtatDonnees(models.Model):
+    """Ligne unique : version des données des rapports, incrémentée à chaque modification"""
+    version = models.BigIntegerField(default=0)
@@ -0,0 +1,128 @@
+"""
+Pagination par curseur (keyset) pour les listes.
+
+Au lieu de LIMIT/OFFSET et d'un COUNT(*) à chaque page, chaque page est lue
+à partir de la dernière ligne affichée : WHERE (date_vente, id) < (d, i)
+ORDER BY date_vente DESC, id DESC LIMIT n+1. Le coût d'une page reste le même
+quelle que soit sa position dans l'historique. Les liens transportent des
+jetons opaques `apres` / `avant` ; `dernier=1` affiche la dernière page.
+"""
+import base64
+import binascii
+import json
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+from .models import ID_MAX
+
+TAILLE_MAX = 100
+
+
+class PageCurseur:
+    def __init__(self, object_list, suivant=None, precedent=None, taille=None, total=None):
+        self.object_list = object_list
+        self.suivant = suivant
+        self.precedent = precedent
+        self.taille = taille
+        # Nombre total approximatif, fourni par la vue si elle l'a à moindre coût
+        self.total = total
+
+    @property
+    def has_next(self):
+        return self.suivant is not None
+
+    @property
+    def has_previous(self):
+        return self.precedent is not None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+def paginer_par_curseur(queryset, params, champs, taille=None, total=None):
+    """
+    Retourne la page demandée par `params` (request.GET) sous forme de PageCurseur.
+
+    `champs` donne l'ordre de tri, du plus récent au plus ancien, et doit se
+    terminer par une clé unique (ex. ('date_vente', 'id')).
+    """
+    modele = queryset.model
+    taille = _lire_taille(params.get('taille'), taille or settings.VENTE_PAGE_TAILLE)
+    ordre_desc = [f'-{champ}' for champ in champs]
+    ordre_asc = list(champs)
+
+    avant = _decoder(params.get('avant'), modele, champs)
+    apres = _decoder(params.get('apres'), modele, champs)
+
+    if avant is not None or params.get('dernier'):
+        # On remonte vers les plus récents : tri inverse puis retournement
+        if avant is not None:
+            queryset = queryset.filter(_apres_dans_l_ordre(champs, avant, '__gt'))
+        lignes = list(queryset.order_by(*ordre_asc)[:taille + 1])
+        a_precedent = len(lignes) > taille
+        lignes = lignes[:taille][::-1]
+        a_suivant = avant is not None
+    else:
+        if apres is not None:
+            queryset = queryset.filter(_apres_dans_l_ordre(champs, apres, '__lt'))
+        lignes = list(queryset.order_by(*ordre_desc)[:taille + 1])
+        a_suivant = len(lignes) > taille
+        lignes = lignes[:taille]
+        a_precedent = apres is not None
+
+    return PageCurseur(
+        lignes,
+        suivant=_encoder(lignes[-1], champs) if a_suivant and lignes else None,
+        precedent=_encoder(lignes[0], champs) if a_precedent and lignes else None,
+        taille=taille,
+        total=total,
+    )
+
+
+def _apres_dans_l_ordre(champs, valeurs, comparaison):
+    """(a, b) < (va, vb) écrit a < va OR (a = va AND b < vb), compris par tous les SGBD"""
+    condition = Q()
+    for i, champ in enumerate(champs):
+        egalites = {champs[j]: valeurs[j] for j in range(i)}
+        condition |= Q(**egalites, **{f'{champ}{comparaison}': valeurs[i]})
+    return condition
+
+
+def _encoder(objet, champs):
+    valeurs = []
+    for champ in champs:
+        valeur = getattr(objet, champ)
+        valeurs.append(valeur.isoformat() if hasattr(valeur, 'isoformat') else valeur)
+    return base64.urlsafe_b64encode(json.dumps(valeurs).encode()).decode().rstrip('=')
+
+
+def _decoder(jeton, modele, champs):
+    """Retourne les valeurs du curseur, ou None si le jeton est absent ou invalide"""
+    if not jeton:
+        return None
+    try:
+        brut = base64.urlsafe_b64decode(jeton + '=' * (-len(jeton) % 4))
+        valeurs = json.loads(brut)
+        if not isinstance(valeurs, list) or len(valeurs) != len(champs):
+            return None
+        valeurs = [modele._meta.get_field(champ).to_python(valeur) for champ, valeur in zip(champs, valeurs)]
+    except (binascii.Error, TypeError, ValueError, ValidationError):
+        # TypeError : valeur d'un autre type JSON que prévu (nombre à la place d'une date...)
+        return None
+    # Entier hors des colonnes de la base : ne pourrait même pas être transmis en paramètre
+    if any(isinstance(valeur, int) and not -ID_MAX <= valeur <= ID_MAX for valeur in valeurs):
+        return None
+    return valeurs
+
+
+def _lire_taille(valeur, defaut):
+    try:
+        taille = int(valeur)
+    except (TypeError, ValueError):
+        return defaut
+    return min(max(taille, 1), TAILLE_MAX)
@@ -0,0 +1,204 @@
+"""
+Prévision de la demande par produit et date de rupture de stock estimée.
+
+L'historique est lu en une seule requête dans StatProduitJour (quantités de
+LigneVente déjà cumulées par produit et par jour), en colonnes NumPy. Tous
+les produits sont calculés ensemble, sans boucle ni requête par produit :
+chaque vente d'un jour pèse dans la demande du produit selon son ancienneté
+(np.bincount pondéré), sans matrice produits × jours.
+
+Méthodes :
+- 'lissage' : lissage exponentiel des ventes journalières (jours sans vente
+  compris), corrigé pour les produits dont l'historique est court ;
+- 'moyenne' : moyenne mobile sur les FENETRE derniers jours.
+
+Quantité à commander : de quoi couvrir le délai de réapprovisionnement et la
+période de couverture, plus un stock de sécurité (Z_SECURITE écarts-types de
+la demande journalière sur le délai), moins le stock actuel.
+
+Les résultats sont écrits dans PrevisionStock par la commande
+refresh_forecasts (à lancer chaque nuit) ; le tableau de bord ne lit que
+cette table.
+"""
+import math
+from datetime import timedelta
+
+import numpy as np
+from django.db import connection, connections, transaction
+from django.db.models import Func, IntegerField, Value
+from django.utils import timezone
+
+from .dashboard import DashboardStats
+from .models import Produit, PrevisionStock, StatProduitJour
+
+METHODES = ('lissage', 'moyenne')
+# Historique lu (jours)
+HISTORIQUE = 730
+# Poids du dernier jour dans le lissage exponentiel
+ALPHA = 0.1
+# Moyenne mobile et écart-type de la demande (jours)
+FENETRE = 28
+# Délai de réapprovisionnement et période couverte par une commande (jours)
+DELAI = 7
+COUVERTURE = 14
+# Stock de sécurité : ~95 % des délais sans rupture pour une demande normale
+Z_SECURITE = 1.65
+# Lignes d'historique converties à la fois
+TAILLE_LOT = 100_000
+
+
+class JoursDepuis(Func):
+    """Nombre de jours entre `debut` et la date de la colonne, calculé par la base"""
+    output_field = IntegerField()
+
+    def __init__(self, colonne, debut):
+        super().__init__(colonne, Value(debut.isoformat()))
+
+    def as_sqlite(self, compiler, connection, **extra):
+        return self.as_sql(
+            compiler, connection, template='CAST(julianday(%(expressions)s) AS INTEGER)',
+            arg_joiner=') - julianday(', **extra
+        )
+
+    def as_postgresql(self, compiler, connection, **extra):
+        return self.as_sql(compiler, connection, template='(%(expressions)s::date)', arg_joiner=' - ', **extra)
+
+
+def charger_historique(debut, fin):
+    """
+    Ventes par produit et par jour entre `debut` et `fin` inclus, en trois
+    colonnes : (produit_ids, jours depuis `debut`, quantités)
+
+    Les lignes sont lues par le curseur, sans les convertisseurs de l'ORM (le
+    jour est déjà un entier), et passent en tableaux NumPy par lots.
+    """
+    lignes = (
+        StatProduitJour.objects.filter(date__gte=debut, date__lte=fin, quantite__gt=0)
+        .annotate(jour=JoursDepuis('date', debut))
+        .values_list('produit_id', 'jour', 'quantite')
+    )
+    sql, params = lignes.query.sql_with_params()
+    lots = [np.empty((0, 3), np.int64)]
+    with connections[lignes.db].cursor() as curseur:
+        curseur.execute(sql, params)
+        while lot := curseur.fetchmany(TAILLE_LOT):
+            lots.append(np.array(lot, np.int64))
+    colonnes = np.concatenate(lots)
+    return colonnes[:, 0], colonnes[:, 1], colonnes[:, 2].astype(np.float64)
+
+
+def indexer_historique(ids, produits, jours, quantites):
+    """
+    Position de chaque ligne d'historique dans `ids` (triés), sans les lignes
+    des produits absents du catalogue lu. Retourne (index, jours, quantités).
+    """
+    index = np.searchsorted(ids, produits)
+    connus = index < len(ids)
+    connus[connus] = ids[index[connus]] == produits[connus]
+    return index[connus], jours[connus], quantites[connus]
+
+
+def calculer_previsions(index, jours, quantites, nb_produits, nb_jours, stocks,
+                        methode='lissage', alpha=ALPHA, fenetre=FENETRE, delai=DELAI,
+                        couverture=COUVERTURE, z=Z_SECURITE):
+    """
+    Prévisions de `nb_produits` produits à partir des ventes (`index` du
+    produit, jour dans [0, nb_jours), quantité) et des stocks actuels.
+    Retourne (demande par jour, jours avant rupture — NaN sans demande —,
+    quantité à commander), un tableau par colonne.
+    """
+    if methode not in METHODES:
+        raise ValueError(f'Méthode inconnue : {methode}')
+    stocks = np.asarray(stocks, np.float64)
+
+    # Jours observés depuis la première vente de chaque produit dans l'historique
+    premiere_vente = np.full(nb_produits, nb_jours, np.int64)
+    np.minimum.at(premiere_vente, index, jours)
+    observes = nb_jours - premiere_vente
+
+    # Demande récente (moyenne et écart-type) sur la fenêtre, ou depuis la première vente
+    recents = jours >= nb_jours - fenetre
+    jours_fenetre = np.minimum(observes, fenetre)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        somme = np.bincount(index[recents], quantites[recents], nb_produits)
+        carres = np.bincount(index[recents], quantites[recents] ** 2, nb_produits)
+        moyenne = np.where(jours_fenetre > 0, somme / jours_fenetre, 0.0)
+        variance = np.where(jours_fenetre > 0, carres / jours_fenetre - moyenne ** 2, 0.0)
+    ecart_type = np.sqrt(np.clip(variance, 0, None))
+
+    if methode == 'moyenne':
+        demande = moyenne
+    else:
+        # s = somme des alpha (1 - alpha)^age x ; les jours sans vente valent 0.
+        # Divisé par la somme des poids des jours observés (1 - (1 - alpha)^n).
+        poids = alpha * (1 - alpha) ** (nb_jours - 1 - jours)
+        lisse = np.bincount(index, quantites * poids, nb_produits)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            demande = np.where(observes > 0, lisse / (1 - (1 - alpha) ** observes), 0.0)
+
+    with np.errstate(divide='ignore'):
+        jours_restants = np.where(demande > 0, stocks / demande, np.nan)
+    securite = z * ecart_type * math.sqrt(delai)
+    besoin = np.round(demande * (delai + couverture) + securite - stocks, 6)
+    a_commander = np.ceil(np.clip(besoin, 0, None))
+    return demande, jours_restants, a_commander.astype(np.int64)
+
+
+def rafraichir_previsions(methode='lissage', historique=HISTORIQUE, maintenant=None, **reglages):
+    """
+    Recalcule PrevisionStock pour tous les produits. `reglages` : alpha,
+    fenetre, delai, couverture, z. Retourne les nombres de produits, de
+    produits à commander et de ruptures prévues dans le délai.
+    """
+    maintenant = maintenant or timezone.now()
+    # Historique jusqu'à la veille : la journée en cours est incomplète
+    fin = timezone.localdate(maintenant) - timedelta(days=1)
+    debut = fin - timedelta(days=historique - 1)
+
+    # Catalogue et historique lus dans une même transaction (instantané unique
+    # sous SQLite) ; ailleurs, un produit créé et vendu entre les deux lectures
+    # est écarté par indexer_historique
+    with transaction.atomic():
+        catalogue = np.array(Produit.objects.order_by('id').values_list('id', 'stock'), np.int64).reshape(-1, 2)
+        ids, stocks = catalogue[:, 0], catalogue[:, 1]
+        index, jours, quantites = indexer_historique(ids, *charger_historique(debut, fin))
+    demande, jours_restants, a_commander = calculer_previsions(
+        index, jours, quantites, len(ids), historique, stocks, methode, **reglages
+    )
+
+    # Une ligne par produit par executemany : instancier et compiler 50 000
+    # PrevisionStock coûtait plus que le calcul lui-même
+    jours_restants = np.round(jours_restants, 2)
+    prevue = ~np.isnan(jours_restants)
+    dates = np.datetime64(fin + timedelta(days=1), 'D') + np.floor(
+        np.minimum(np.where(prevue, jours_restants, 0), 36500)
+    ).astype('timedelta64[D]')
+    champ_date = PrevisionStock._meta.get_field('date_rupture')
+    calcule_le = PrevisionStock._meta.get_field('calcule_le').get_db_prep_save(maintenant, connection)
+    lignes = [
+        (pid, stock, round(d, 4), j if p else None,
+         champ_date.get_db_prep_save(date, connection) if p else None, q, calcule_le)
+        for pid, stock, d, j, p, date, q in zip(
+            ids.tolist(), stocks.tolist(), demande.tolist(), jours_restants.tolist(), prevue.tolist(),
+            dates.tolist(), a_commander.tolist(),
+        )
+    ]
+    colonnes = [
+        PrevisionStock._meta.get_field(champ).column
+        for champ in ('produit', 'stock', 'demande_jour', 'jours_avant_rupture', 'date_rupture',
+                      'quantite_a_commander', 'calcule_le')
+    ]
+    with transaction.atomic(), connection.cursor() as cursor:
+        PrevisionStock.objects.all().delete()
+        cursor.executemany(
+            f"INSERT INTO {PrevisionStock._meta.db_table} ({', '.join(colonnes)}) "
+            f"VALUES ({', '.join(['%s'] * len(colonnes))})",
+            lignes,
+        )
+    transaction.on_commit(DashboardStats.invalider)
+    delai = reglages.get('delai', DELAI)
+    return {
+        'produits': len(lignes),
+        'a_commander': int(np.count_nonzero(a_commander)),
+        'ruptures': int(np.count_nonzero(jours_restants < delai)),
+    }
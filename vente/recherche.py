@@ -0,0 +1,172 @@
+"""
+Recherche de produits et de clients par nom (autocomplétion du formulaire de vente).
+
+Selon la base :
+- SQLite : table FTS5 externe sur le nom, tenue à jour par des triggers,
+  interrogée en préfixe ("sac cuir" -> "sac"* "cuir"*) et triée par pertinence ;
+- PostgreSQL : index GIN trigramme (pg_trgm) sur UPPER(nom), utilisé par icontains ;
+- sinon (SQLite sans FTS5...) : recherche par début de nom, en plage sur
+  LOWER(nom) pour être servie par l'index d'expression (un LIKE ne l'est pas).
+
+Les tables FTS et l'index trigramme sont (re)créés à chaque `migrate` par
+installer_recherche() : sous SQLite, modifier une table recrée celle-ci et
+supprime ses triggers, une migration unique ne suffirait donc pas.
+"""
+from contextlib import contextmanager
+import re
+
+from django.db import DatabaseError, connection, transaction
+from django.db.models.functions import Lower
+
+from .models import Produit, Client
+
+LIMITE_MAX = 50
+
+# Table indexée -> colonnes renvoyées par la recherche
+TABLES = {
+    Produit: ('id', 'nom', 'prix', 'stock'),
+    Client: ('id', 'nom', 'telephone'),
+}
+
+_fts_disponible = {}
+
+
+def rechercher_produits(terme, limite=20):
+    return _rechercher(Produit, terme, limite)
+
+
+def rechercher_clients(terme, limite=20):
+    return _rechercher(Client, terme, limite)
+
+
+def _rechercher(modele, terme, limite):
+    """Au plus `limite` résultats (dicts) dont le nom correspond à `terme`"""
+    mots = re.findall(r'\w+', terme or '')
+    limite = min(max(int(limite), 1), LIMITE_MAX)
+    if not mots:
+        return []
+    champs = TABLES[modele]
+
+    if _utilise_fts(modele):
+        requete = ' '.join(f'"{mot}"*' for mot in mots)
+        table = f'{modele._meta.db_table}_fts'
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid FROM {table} WHERE {table} MATCH %s ORDER BY rank LIMIT %s',
+                [requete, limite],
+            )
+            ids = [ligne[0] for ligne in cursor.fetchall()]
+        trouves = {ligne['id']: ligne for ligne in modele.objects.filter(pk__in=ids).values(*champs)}
+        return [trouves[pk] for pk in ids if pk in trouves]
+
+    if connection.vendor == 'postgresql':
+        qs = modele.objects.all()
+        for mot in mots:
+            qs = qs.filter(nom__icontains=mot)
+        qs = qs.order_by('nom')
+    else:
+        qs = _par_prefixe(modele, mots)
+    return list(qs.values(*champs)[:limite])
+
+
+def _par_prefixe(modele, mots):
+    """
+    Noms commençant par les mots (sans distinction de casse), triés : la plage
+    [prefixe, prefixe suivant[ sur LOWER(nom) parcourt l'index *_nom_lower_idx
+    dans l'ordre, et LIMIT arrête la lecture au dernier résultat.
+    """
+    prefixe = ' '.join(mots).lower()
+    suivant = prefixe[:-1] + chr(ord(prefixe[-1]) + 1)
+    return modele.objects.annotate(nom_minuscule=Lower('nom')).filter(
+        nom_minuscule__gte=prefixe, nom_minuscule__lt=suivant,
+    ).order_by('nom_minuscule')
+
+
+@contextmanager
+def indexation_par_lot(modele):
+    """
+    Pour les insertions en masse : le trigger d'insertion FTS, coûteux ligne à
+    ligne, est suspendu le temps du bloc, puis les lignes ajoutées sont indexées
+    en une seule requête. Le tout dans une transaction : en cas d'erreur, le
+    trigger est restauré par le rollback.
+    """
+    if not _utilise_fts(modele):
+        yield
+        return
+    table = modele._meta.db_table
+    fts = f'{table}_fts'
+    with transaction.atomic(), connection.cursor() as cursor:
+        dernier_id = modele.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+        cursor.execute(f'DROP TRIGGER IF EXISTS {fts}_ai')
+        yield
+        cursor.execute(f'INSERT INTO {fts}(rowid, nom) SELECT id, nom FROM {table} WHERE id > %s', [dernier_id])
+        cursor.execute(_trigger_insertion(table))
+
+
+def _utilise_fts(modele):
+    if connection.vendor != 'sqlite':
+        return False
+    table = f'{modele._meta.db_table}_fts'
+    if table not in _fts_disponible:
+        _fts_disponible[table] = table in connection.introspection.table_names()
+    return _fts_disponible[table]
+
+
+def installer_recherche(using='default', **kwargs):
+    """Crée les index de recherche absents (appelé après chaque migrate)"""
+    from django.db import connections
+
+    connexion = connections[using]
+    for modele in TABLES:
+        fts = f'{modele._meta.db_table}_fts'
+        try:
+            with transaction.atomic(using=using), connexion.cursor() as cursor:
+                if connexion.vendor == 'sqlite':
+                    _installer_fts(cursor, modele._meta.db_table)
+                    _fts_disponible[fts] = True
+                elif connexion.vendor == 'postgresql':
+                    _installer_trigrammes(cursor, modele._meta.db_table)
+        except DatabaseError:
+            # FTS5 ou pg_trgm indisponible : recherche par préfixe
+            _fts_disponible[fts] = False
+
+
+def _installer_fts(cursor, table):
+    fts = f'{table}_fts'
+    cursor.execute(
+        "SELECT count(*) FROM sqlite_master WHERE type = 'trigger' AND name LIKE %s", [f'{fts}_%']
+    )
+    if cursor.fetchone()[0] == 3:
+        return
+    cursor.execute(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+        f"nom, content='{table}', content_rowid='id', tokenize='unicode61 remove_diacritics 2')"
+    )
+    cursor.execute(_trigger_insertion(table))
+    cursor.execute(
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, nom) VALUES ('delete', old.id, old.nom); END"
+    )
+    cursor.execute(
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF nom ON {table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, nom) VALUES ('delete', old.id, old.nom); "
+        f"INSERT INTO {fts}(rowid, nom) VALUES (new.id, new.nom); END"
+    )
+    # Triggers absents jusqu'ici : l'index peut avoir manqué des modifications
+    cursor.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+
+
+def _trigger_insertion(table):
+    fts = f'{table}_fts'
+    return (
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN "
+        f"INSERT INTO {fts}(rowid, nom) VALUES (new.id, new.nom); END"
+    )
+
+
+def _installer_trigrammes(cursor, table):
+    cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    cursor.execute(
+        f'CREATE INDEX IF NOT EXISTS {table}_nom_trgm_idx ON {table} '
+        f'USING gin ((UPPER(nom::text)) gin_trgm_ops)'
+    )
@@ -0,0 +1,197 @@
+"""
+Lectures lourdes sur une réplique de la base (VENTE_REPLICA_ALIAS).
+
+Les vues marquées @lecture_replica (tableau de bord, clients ayant acheté,
+rapports PDF) et les totaux des listes (bloc `with lecture_sur_replica(request)`,
+ou `async with alecture_sur_replica(request)` dans les vues async) lisent sur
+la réplique quand elle est configurée. Tout le reste — passage en caisse,
+formulaires CRUD, API — lit et écrit sur 'default' : RouteurReplica
+n'envoie une lecture vers la réplique que pendant ces blocs, et toutes les
+écritures vers la base principale.
+
+La réplique n'est retenue que si son retard ne dépasse pas
+VENTE_REPLICA_RETARD_MAX secondes, ni le temps écoulé depuis la dernière
+écriture du navigateur : chaque requête POST dépose un cookie avec l'heure de
+l'écriture, si bien que la page affichée après la redirection relit la base
+principale tant que la réplique n'a pas rattrapé cette écriture.
+"""
+import math
+import os
+import time
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, connections
+
+COOKIE_ECRITURE = 'vente_ecriture'
+# Mesure du retard partagée (via le cache) pendant une seconde
+DUREE_MESURE = 1
+
+_alias_lecture = ContextVar('vente_alias_lecture', default=None)
+
+
+class RouteurReplica:
+    """Routeur de DATABASE_ROUTERS : lectures sur l'alias choisi pour la requête, écritures sur 'default'"""
+
+    def db_for_read(self, model, **hints):
+        return _alias_lecture.get()
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Mêmes données des deux côtés
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        # La réplique reçoit le schéma par la réplication (ou synchroniser_replica)
+        return db == 'default'
+
+
+def base_lecture():
+    """Alias de la réplique si les lectures en cours y sont envoyées, sinon None"""
+    return _alias_lecture.get()
+
+
+def alias_replica():
+    alias = getattr(settings, 'VENTE_REPLICA_ALIAS', 'replica')
+    return alias if alias in settings.DATABASES else None
+
+
+def choisir_base(request):
+    """Alias de la réplique si elle est assez à jour pour cette requête, sinon None (base principale)"""
+    alias = alias_replica()
+    if alias is None or request.method not in ('GET', 'HEAD'):
+        return None
+    limite = getattr(settings, 'VENTE_REPLICA_RETARD_MAX', 5)
+    try:
+        ecriture = float(request.COOKIES[COOKIE_ECRITURE])
+    except (KeyError, ValueError):
+        pass
+    else:
+        # Lecture de ses propres écritures
+        limite = min(limite, time.time() - ecriture)
+    retard = retard_replica(alias)
+    return alias if retard is not None and retard <= limite else None
+
+
+def retard_replica(alias):
+    """Retard de la réplique en secondes, None si elle est injoignable"""
+    cle = f'vente:retard_replica:{alias}'
+    mesure = cache.get(cle)
+    if mesure is None:
+        try:
+            retard = _mesurer_retard(connections[alias])
+        except DatabaseError:
+            retard = None
+        mesure = {'retard': retard}
+        cache.set(cle, mesure, DUREE_MESURE)
+    return mesure['retard']
+
+
+def _mesurer_retard(base):
+    if base.vendor == 'postgresql':
+        with base.cursor() as cursor:
+            # Nul quand tout le WAL reçu est rejoué (ou si l'alias désigne un primaire)
+            cursor.execute(
+                "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+                "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+            )
+            return float(cursor.fetchone()[0])
+    if base.vendor == 'sqlite':
+        return retard_copie_sqlite(connections['default'].settings_dict['NAME'], base.settings_dict['NAME'])
+    return 0.0
+
+
+def retard_copie_sqlite(principale, copie):
+    """
+    Retard d'une copie de la base SQLite faite par synchroniser_replica : la
+    copie reflète la base principale à sa date de modification, et n'est en
+    retard que si la base principale (ou son WAL) a changé depuis.
+    """
+    principale, copie = str(principale), str(copie)
+    if copie == principale:
+        return 0.0
+    try:
+        synchro = os.stat(copie).st_mtime
+    except OSError:
+        return None
+    modification = max(
+        (os.stat(chemin).st_mtime for chemin in (principale, f'{principale}-wal') if os.path.exists(chemin)),
+        default=0,
+    )
+    return 0.0 if modification <= synchro else time.time() - synchro
+
+
+@contextmanager
+def lecture_sur_replica(request):
+    """Envoie les lectures du bloc sur la réplique si choisir_base(request) la retient"""
+    alias = choisir_base(request)
+    request.base_lecture = alias
+    jeton = _alias_lecture.set(alias)
+    try:
+        yield alias
+    finally:
+        _alias_lecture.reset(jeton)
+
+
+@asynccontextmanager
+async def alecture_sur_replica(request):
+    """lecture_sur_replica() pour les vues async (la mesure du retard peut interroger la base)"""
+    alias = await sync_to_async(choisir_base)(request) if alias_replica() else None
+    request.base_lecture = alias
+    jeton = _alias_lecture.set(alias)
+    try:
+        yield alias
+    finally:
+        _alias_lecture.reset(jeton)
+
+
+def lecture_replica(vue):
+    """Décorateur des vues en lecture seule servies par la réplique (sync ou async)"""
+    if iscoroutinefunction(vue):
+        @wraps(vue)
+        async def envelopper_async(request, *args, **kwargs):
+            async with alecture_sur_replica(request):
+                return await vue(request, *args, **kwargs)
+        return envelopper_async
+
+    @wraps(vue)
+    def envelopper(request, *args, **kwargs):
+        with lecture_sur_replica(request):
+            return vue(request, *args, **kwargs)
+    return envelopper
+
+
+class EpinglagePrimaireMiddleware:
+    """Note l'heure de chaque écriture (requête POST...) dans un cookie, lu par choisir_base()"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        return self.epingler(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self.epingler(request, await self.get_response(request))
+
+    def epingler(self, request, response):
+        if request.method not in ('GET', 'HEAD', 'OPTIONS') and alias_replica():
+            # Au-delà de VENTE_REPLICA_RETARD_MAX, la tolérance seule suffit
+            response.set_cookie(
+                COOKIE_ECRITURE, f'{time.time():.3f}',
+                max_age=math.ceil(getattr(settings, 'VENTE_REPLICA_RETARD_MAX', 5)) + 1,
+                httponly=True, samesite='Lax',
+            )
+        return response
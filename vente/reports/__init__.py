@@ -0,0 +1,63 @@
+"""
+Rapports PDF (clients ayant acheté, ventes).
+
+reportlab coûte plus de 100 ms et quelques Mo à l'import : les vues, les
+tâches et les commandes n'importent que ce module léger. Le rendu
+(vente.reports.pdf) et les styles partagés (vente.reports.styles) ne sont
+chargés qu'au premier rapport généré par le processus.
+
+Les fonctions écrivent le PDF dans un objet fichier quelconque : la réponse
+HTTP pour les exports directs, ou un fichier sur disque pour les rapports
+générés en arrière-plan (voir vente/jobs.py).
+"""
+from django.db.models import Case, CharField, Count, F, Max, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+
+from ..models import Client, ProfilClient, Vente
+
+
+def clients_avec_achats(filtre=None):
+    """
+    Clients ayant au moins une vente (parmi celles retenues par `filtre`),
+    avec leur nombre d'achats et montant total
+
+    Sans filtre, les cumuls viennent de l'analyse RFM (ProfilClient, à jour
+    du dernier refresh_customer_analytics) plutôt que de tout l'historique
+    des ventes, avec le segment et la date du dernier achat. Annotés plutôt
+    que select_related('profil') : un seul objet instancié par client.
+    Les clients dont le premier achat est postérieur au dernier
+    rafraîchissement n'ont pas encore de profil : leurs cumuls sont calculés
+    sur leurs ventes (COALESCE n'évalue la sous-requête que pour eux), sans
+    segment.
+    """
+    if not (filtre and filtre.est_actif):
+        depuis = Coalesce(Subquery(ProfilClient.objects.order_by('-derniere_vente').values('derniere_vente')[:1]), 0)
+        nouveaux = Vente.objects.filter(id__gt=depuis, client__isnull=False).values('client_id')
+        achats = Vente.objects.filter(client=OuterRef('pk')).order_by().values('client')
+        return Client.objects.filter(Q(profil__isnull=False) | Q(pk__in=nouveaux)).annotate(
+            nombre_achats=Coalesce('profil__nb_achats', Subquery(achats.annotate(n=Count('id')).values('n'))),
+            montant_total=Coalesce('profil__montant_total', Subquery(achats.annotate(s=Sum('total')).values('s'))),
+            dernier_achat=Coalesce('profil__dernier_achat', Subquery(achats.annotate(d=Max('date_vente')).values('d'))),
+            segment=F('profil__segment'),
+            libelle_segment=Case(
+                *[When(profil__segment=code, then=Value(libelle)) for code, libelle in ProfilClient.SEGMENTS],
+                output_field=CharField(),
+            ),
+        ).order_by('-montant_total')
+    condition = filtre.q('vente__')
+    return Client.objects.annotate(
+        nombre_achats=Count('vente', filter=condition),
+        montant_total=Sum('vente__total', filter=condition)
+    ).filter(nombre_achats__gt=0).order_by('-montant_total')
+
+
+def generer_rapport_clients(fichier, filtre=None):
+    """Écrit le rapport des clients qui ont acheté dans `fichier`"""
+    from . import pdf
+    pdf.generer_rapport_clients(fichier, filtre)
+
+
+def generer_rapport_ventes(fichier, filtre=None):
+    """Écrit le rapport de ventes dans `fichier` (généré par lots, mémoire constante)"""
+    from . import pdf
+    pdf.generer_rapport_ventes(fichier, filtre)
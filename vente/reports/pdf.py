@@ -0,0 +1,172 @@
+"""
+Rendu des rapports PDF avec reportlab.
+
+Importé à la demande par vente.reports au premier rapport du processus ;
+les styles viennent de vente.reports.styles, construits une seule fois.
+"""
+import itertools
+from datetime import datetime
+
+from django.db.models import Count, Q, Sum
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.units import inch
+from reportlab.platypus import SimpleDocTemplate, Table, Paragraph, Spacer
+
+from ..models import Vente, LigneVente
+from . import clients_avec_achats, styles
+
+
+def _entete(titre, filtre, statistiques):
+    """Titre, date, filtre appliqué et tableau de statistiques"""
+    story = [
+        Paragraph(titre, styles.TITRE),
+        Spacer(1, 0.3*inch),
+        Paragraph(f"Généré le: {datetime.now().strftime('%d/%m/%Y %H:%M')}", styles.DATE),
+    ]
+    if filtre is not None and filtre.est_actif:
+        story.append(Paragraph(f"Filtre: {filtre.description()}", styles.DATE))
+    story.append(Spacer(1, 0.2*inch))
+    tableau = Table(statistiques, colWidths=styles.LARGEURS_STATISTIQUES)
+    tableau.setStyle(styles.TABLEAU_STATISTIQUES)
+    story.append(tableau)
+    story.append(Spacer(1, 0.3*inch))
+    return story
+
+
+def _pied():
+    return [Paragraph(styles.MENTION_PIED, styles.PIED)]
+
+
+def generer_rapport_clients(fichier, filtre=None):
+    """Écrit le rapport des clients qui ont acheté dans `fichier`"""
+    clients = clients_avec_achats(filtre)
+    
+    # Créer le document PDF
+    doc = SimpleDocTemplate(fichier, pagesize=A4)
+    story = _entete("RAPPORT DES CLIENTS", filtre, [
+        ['Total de clients ayant acheté:', str(clients.count())],
+        ['Nombre total d\'achats:', str(sum(c.nombre_achats for c in clients))],
+        ['Montant total généré:', f"{sum(c.montant_total for c in clients if c.montant_total)}"]
+    ])
+    
+    # Tableau des clients
+    data = [list(styles.ENTETE_CLIENTS)]
+    
+    for client in clients:
+        data.append([
+            client.nom,
+            client.telephone or '-',
+            client.email or '-',
+            str(client.nombre_achats),
+            f"{client.montant_total:.2f} DZD" if client.montant_total else "0.00 DZD"
+        ])
+    
+    table = Table(data, colWidths=styles.LARGEURS_CLIENTS)
+    table.setStyle(styles.TABLEAU_CLIENTS)
+    story.append(table)
+    story.append(Spacer(1, 0.3*inch))
+    story.extend(_pied())
+    
+    # Générer le PDF
+    doc.build(story)
+
+
+# Taille des lots lus en base et nombre de ventes par tableau dans le PDF
+TAILLE_LOT_EXPORT = 500
+LIGNES_PAR_TABLEAU = 40
+
+
+class FluxFlowables(list):
+    """
+    Liste de flowables alimentée à la demande par un générateur.
+
+    reportlab consomme la story par le début (len / [0] / del [0]) : on ne
+    garde ainsi en mémoire que les quelques tableaux en cours de mise en page.
+    """
+
+    def __init__(self, generateur, avance=2):
+        super().__init__()
+        self._generateur = iter(generateur)
+        self._avance = avance
+
+    def _remplir(self):
+        while self._generateur is not None and super().__len__() < self._avance:
+            try:
+                self.append(next(self._generateur))
+            except StopIteration:
+                self._generateur = None
+
+    def __len__(self):
+        self._remplir()
+        return super().__len__()
+
+    def __getitem__(self, index):
+        self._remplir()
+        return super().__getitem__(index)
+
+
+def _ventes_par_lots(ventes, taille=TAILLE_LOT_EXPORT):
+    """Parcourt les ventes par lots (pagination par clé sur date_vente, id)"""
+    ventes = ventes.order_by('-date_vente', '-id')
+    dernier = None
+    while True:
+        lot = ventes
+        if dernier is not None:
+            date_vente, vente_id = dernier
+            lot = lot.filter(Q(date_vente__lt=date_vente) | Q(date_vente=date_vente, id__lt=vente_id))
+        lot = list(lot[:taille])
+        if not lot:
+            return
+        yield lot
+        dernier = (lot[-1].date_vente, lot[-1].id)
+
+
+def _tableaux_ventes(ventes):
+    """Génère les tableaux de ventes, LIGNES_PAR_TABLEAU lignes à la fois"""
+    for lot in _ventes_par_lots(ventes, TAILLE_LOT_EXPORT):
+        produits_par_vente = {}
+        for vente_id, nom, quantite in LigneVente.objects.filter(
+            vente_id__in=[v.id for v in lot]
+        ).order_by('vente_id', 'id').values_list('vente_id', 'produit__nom', 'quantite'):
+            produits_par_vente.setdefault(vente_id, []).append(f"{nom} (×{quantite})")
+
+        for debut in range(0, len(lot), LIGNES_PAR_TABLEAU):
+            data = [list(styles.ENTETE_VENTES)]
+            for vente in lot[debut:debut + LIGNES_PAR_TABLEAU]:
+                produits = ', '.join(produits_par_vente.get(vente.id, []))
+                data.append([
+                    f"#{vente.id}",
+                    vente.client.nom if vente.client else 'N/A',
+                    vente.date_vente.strftime('%d/%m/%Y'),
+                    f"{vente.total:.2f} Fc",
+                    produits[:50] + '...' if len(produits) > 50 else produits
+                ])
+            table = Table(data, colWidths=styles.LARGEURS_VENTES, repeatRows=1)
+            table.setStyle(styles.TABLEAU_VENTES)
+            yield table
+
+
+def generer_rapport_ventes(fichier, filtre=None):
+    """Écrit le rapport de ventes dans `fichier` (généré par lots, mémoire constante)"""
+    condition = filtre.q() if filtre else Q()
+    ventes = Vente.objects.filter(condition).select_related('client').only(
+        'id', 'date_vente', 'total', 'client__nom'
+    )
+    
+    # Créer le document PDF
+    doc = SimpleDocTemplate(fichier, pagesize=A4)
+    
+    # Statistiques (calculées par la base)
+    stats = ventes.aggregate(nb=Count('id'), total=Sum('total'))
+    total_montant = stats['total'] or 0
+    story = _entete("RAPPORT DE VENTES", filtre, [
+        ['Total de ventes:', str(stats['nb'])],
+        ['Montant total généré:', f"{total_montant:.2f} FC"],
+        ['Nombre de lignes vendues:', str(LigneVente.objects.filter(filtre.q('vente__') if filtre else Q()).count())]
+    ])
+    
+    # Tableaux des ventes, un par groupe de LIGNES_PAR_TABLEAU ventes, puis le pied de page
+    fin = [Spacer(1, 0.3*inch), *_pied()]
+    
+    # Générer le PDF : les tableaux sont produits au fil de la mise en page
+    doc.build(FluxFlowables(itertools.chain(story, _tableaux_ventes(ventes), fin)))
@@ -0,0 +1,79 @@
+"""
+Styles et gabarits de tableaux des rapports PDF, construits une fois par
+processus (à l'import de ce module, c.-à-d. au premier rapport).
+
+reportlab ne fait que lire les ParagraphStyle et TableStyle pendant la mise
+en page : les mêmes objets servent à tous les rapports.
+"""
+from reportlab.lib import colors
+from reportlab.lib.enums import TA_CENTER, TA_RIGHT
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.units import inch
+from reportlab.platypus import TableStyle
+
+_feuille = getSampleStyleSheet()
+
+TITRE = ParagraphStyle(
+    'Title',
+    parent=_feuille['Heading1'],
+    fontSize=18,
+    textColor=colors.HexColor('#2c3e50'),
+    spaceAfter=30,
+    alignment=TA_CENTER
+)
+
+DATE = ParagraphStyle(
+    'Date',
+    parent=_feuille['Normal'],
+    fontSize=10,
+    textColor=colors.grey,
+    alignment=TA_RIGHT
+)
+
+PIED = ParagraphStyle(
+    'Footer',
+    parent=_feuille['Normal'],
+    fontSize=8,
+    textColor=colors.grey,
+    alignment=TA_CENTER
+)
+
+
+def _tableau_donnees(couleur_entete, taille_entete, taille_lignes):
+    """Tableau de données : en-tête coloré, lignes alternées"""
+    return TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor(couleur_entete)),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('ALIGN', (0, 0), (0, -1), 'LEFT'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), taille_entete),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black),
+        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#ecf0f1')]),
+        ('FONTSIZE', (0, 1), (-1, -1), taille_lignes),
+    ])
+
+
+# Statistiques en tête de rapport
+TABLEAU_STATISTIQUES = TableStyle([
+    ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#ecf0f1')),
+    ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
+    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+    ('FONTNAME', (0, 0), (-1, -1), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, -1), 11),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 12),
+    ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+])
+LARGEURS_STATISTIQUES = [3*inch, 2*inch]
+
+TABLEAU_CLIENTS = _tableau_donnees('#3498db', 11, 9)
+ENTETE_CLIENTS = ['Nom', 'Téléphone', 'Email', 'Nombre d\'achats', 'Montant Total']
+LARGEURS_CLIENTS = [1.8*inch, 1.3*inch, 1.5*inch, 1.2*inch, 1.2*inch]
+
+TABLEAU_VENTES = _tableau_donnees('#27ae60', 10, 8)
+ENTETE_VENTES = ['N° Vente', 'Client', 'Date', 'Montant', 'Produits']
+LARGEURS_VENTES = [0.8*inch, 1.5*inch, 1.2*inch, 1*inch, 2.5*inch]
+
+MENTION_PIED = "Rapport généré automatiquement par le système de gestion des ventes"
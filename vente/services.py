@@ -0,0 +1,100 @@
+"""
+Enregistrement transactionnel d'une vente (passage en caisse).
+
+Toute la vente est écrite dans une seule transaction avec un nombre constant
+de requêtes, quel que soit le nombre de lignes du panier :
+verrouillage des produits, décrément conditionnel du stock, insertion de la
+vente puis de toutes ses lignes et des mouvements de stock en une fois.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, F, PositiveIntegerField, Q, When
+
+from .models import Produit, LigneVente, MouvementStock, marquer_catalogue, nouvelle_version_catalogue
+from .statistiques import enregistrer_vente
+from .stock import mouvements_vente
+
+
+class StockInsuffisant(Exception):
+    """Levée quand au moins un produit du panier n'a pas assez de stock"""
+
+    def __init__(self, erreurs):
+        self.erreurs = erreurs
+        super().__init__('; '.join(erreurs))
+
+
+def passer_vente(vente, lignes):
+    """
+    Enregistre `vente` (non sauvegardée) et ses lignes.
+
+    `lignes` est une liste de dicts {'produit', 'quantite', 'prix_unitaire'}.
+    Retourne la liste des LigneVente créées ; `ligne.produit.stock` reflète le
+    stock après la vente. Lève StockInsuffisant sans rien écrire si un
+    produit ne peut pas être servi.
+    """
+    quantites = defaultdict(int)
+    for ligne in lignes:
+        quantites[ligne['produit'].pk] += ligne['quantite']
+
+    with transaction.atomic():
+        # Un seul SELECT ... FOR UPDATE pour tous les produits du panier
+        produits = Produit.objects.select_for_update().in_bulk(list(quantites))
+        erreurs = _verifier_stock(produits, quantites)
+        if erreurs:
+            raise StockInsuffisant(erreurs)
+
+        if quantites:
+            # Décrément conditionnel en un seul UPDATE : une ligne n'est
+            # modifiée que si son stock couvre encore la quantité demandée
+            condition = Q()
+            for produit_id, quantite in quantites.items():
+                condition |= Q(pk=produit_id, stock__gte=quantite)
+            mis_a_jour = Produit.objects.filter(condition).update(stock=Case(
+                *[When(pk=produit_id, then=F('stock') - quantite)
+                  for produit_id, quantite in quantites.items()],
+                default=F('stock'),
+                output_field=PositiveIntegerField(),
+            ), version=nouvelle_version_catalogue())
+            if mis_a_jour != len(quantites):
+                raise StockInsuffisant(_verifier_stock(
+                    Produit.objects.in_bulk(list(quantites)), quantites
+                ))
+            marquer_catalogue()
+            for produit_id, quantite in quantites.items():
+                produits[produit_id].stock -= quantite
+
+        objets = []
+        total = Decimal('0.00')
+        for ligne in lignes:
+            produit = produits[ligne['produit'].pk]
+            objet = LigneVente(
+                vente=vente,
+                produit=produit,
+                quantite=ligne['quantite'],
+                prix_unitaire=ligne.get('prix_unitaire') or produit.prix,
+                stock_deduit=True,
+            )
+            total += objet.total_ligne()
+            objets.append(objet)
+
+        vente.total = total
+        vente.save()
+        LigneVente.objects.bulk_create(objets)
+        MouvementStock.objects.bulk_create(mouvements_vente(vente, objets))
+        transaction.on_commit(lambda: enregistrer_vente(vente, objets))
+    return objets
+
+
+def _verifier_stock(produits, quantites):
+    erreurs = []
+    for produit_id, quantite in quantites.items():
+        produit = produits.get(produit_id)
+        if produit is None:
+            erreurs.append(f"Produit #{produit_id} introuvable")
+        elif not produit.en_stock(quantite):
+            erreurs.append(
+                f"{produit.nom}: {quantite} demandé(s) mais seulement {produit.stock} en stock"
+            )
+    return erreurs
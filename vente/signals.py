@@ -0,0 +1,115 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .catalogue import marquer_suppression
+from .dashboard import DashboardStats
+from .jobs import marquer_modification
+from .metriques import brancher
+from .models import Produit, Client, Vente, LigneVente
+from .statistiques import recalculer_jours
+
+
+@receiver(post_save, sender=Vente)
+@receiver(post_delete, sender=Vente)
+@receiver(post_save, sender=LigneVente)
+@receiver(post_delete, sender=LigneVente)
+@receiver(post_save, sender=Produit)
+@receiver(post_delete, sender=Produit)
+@receiver(post_save, sender=Client)
+@receiver(post_delete, sender=Client)
+def invalider_statistiques(sender, **kwargs):
+    """
+    Une fois la transaction validée, invalide le cache du tableau de bord et
+    change la version des données utilisée pour le cache des rapports PDF
+    (une seule fois par transaction, voir _Validation).
+    """
+    validation, nouvelle = _validation_en_cours()
+    if nouvelle:
+        transaction.on_commit(validation)
+
+
+class _Validation:
+    """
+    Travail différé jusqu'à la validation d'une transaction, programmé une
+    seule fois quel que soit le nombre de lignes modifiées
+    """
+
+    def __init__(self):
+        self.jours_supprimes = set()
+        self.termine = False
+
+    def __call__(self):
+        self.termine = True
+        recalculer_jours(self.jours_supprimes)
+        DashboardStats.invalider()
+        marquer_modification()
+
+
+def _validation_en_cours():
+    """
+    (travail différé de la transaction en cours, True s'il vient d'être créé
+    et reste à programmer avec on_commit)
+    """
+    connexion = transaction.get_connection()
+    validation = getattr(connexion, 'vente_validation', None)
+    # Annulé avec sa transaction (ou son savepoint), il disparaît de run_on_commit
+    if validation and not validation.termine and any(
+        callback is validation for _, callback, _ in connexion.run_on_commit
+    ):
+        return validation, False
+    connexion.vente_validation = _Validation()
+    return connexion.vente_validation, True
+
+
+@receiver(post_delete, sender=Vente)
+@receiver(post_delete, sender=LigneVente)
+def vente_supprimee(sender, instance, **kwargs):
+    """
+    Les agrégats ne font que s'incrémenter : les journées des ventes et lignes
+    supprimées sont recalculées une fois la transaction validée
+    """
+    if sender is Vente:
+        date_vente = instance.date_vente
+    else:
+        # Lignes supprimées avant leur vente lors d'une suppression en cascade
+        date_vente = Vente.objects.filter(pk=instance.vente_id).values_list('date_vente', flat=True).first()
+        if date_vente is None:
+            return
+    validation, nouvelle = _validation_en_cours()
+    validation.jours_supprimes.add(timezone.localdate(date_vente))
+    if nouvelle:
+        transaction.on_commit(validation)
+
+
+@receiver(post_delete, sender=Produit)
+def produit_supprime(sender, **kwargs):
+    """Les clients du catalogue (?depuis=) ne voient pas les suppressions dans un delta"""
+    marquer_suppression()
+
+
+@receiver(connection_created)
+def configurer_sqlite(sender, connection, **kwargs):
+    """
+    Applique VENTE_SQLITE_PRAGMAS (busy_timeout, mmap) à l'ouverture de chaque
+    connexion SQLite, et VENTE_SQLITE_PRAGMAS_WAL si la base est déjà en WAL.
+    Le mode de journal du fichier n'est jamais changé ici (voir activer_wal).
+    """
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        pragmas = dict(getattr(settings, 'VENTE_SQLITE_PRAGMAS', {}))
+        cursor.execute('PRAGMA journal_mode')
+        if cursor.fetchone()[0] == 'wal':
+            pragmas.update(getattr(settings, 'VENTE_SQLITE_PRAGMAS_WAL', {}))
+        for nom, valeur in pragmas.items():
+            cursor.execute(f'PRAGMA {nom} = {valeur}')
+
+
+@receiver(connection_created)
+def mesurer_requetes(sender, connection, **kwargs):
+    """Compte les requêtes SQL de chaque connexion dans les métriques de la requête HTTP en cours"""
+    brancher(connection)
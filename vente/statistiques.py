@@ -0,0 +1,265 @@
+"""
+Tables d'agrégats des ventes (par jour, mois, produit et client).
+
+Les compteurs sont incrémentés à chaque vente enregistrée, ce qui permet au
+tableau de bord de lire quelques lignes au lieu de parcourir tout l'historique.
+La commande `rebuild_sales_stats` les recalcule à partir de Vente/LigneVente.
+
+La suppression d'une vente ou d'une ligne (admin, nettoyage) fait recalculer
+les journées concernées et leurs mois (voir vente/signals.py). La
+modification d'une vente déjà enregistrée (date, total, lignes) n'est pas
+suivie : relancer `rebuild_sales_stats --since` sur la période.
+"""
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import (
+    Case, Count, DecimalField, F, PositiveIntegerField, Q, Sum, Value, When,
+)
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .dashboard import DashboardStats
+from .models import (
+    Vente, LigneVente, StatJour, StatMois, StatProduitJour, StatClientJour,
+)
+
+
+def _incrementer(modele, cles, **valeurs):
+    """UPDATE ... SET champ = champ + valeur, ou création de la ligne si absente"""
+    increments = {champ: F(champ) + valeur for champ, valeur in valeurs.items()}
+    if modele.objects.filter(**cles).update(**increments):
+        return
+    try:
+        with transaction.atomic():
+            modele.objects.create(**cles, **valeurs)
+    except IntegrityError:
+        # Ligne créée entre-temps par une vente concurrente
+        modele.objects.filter(**cles).update(**increments)
+
+
+def _incrementer_par_jour(modele, champ, jour, valeurs):
+    """
+    Incrémente les stats journalières de plusieurs produits (ou clients) en un
+    UPDATE et un INSERT groupés. `champ` vaut 'produit_id' ou 'client_id' et
+    `valeurs` associe chaque id à [nb_ventes, quantite, chiffre_affaires].
+    """
+    if not valeurs:
+        return
+    existants = modele.objects.filter(date=jour, **{f'{champ}__in': list(valeurs)})
+    ids_existants = set(existants.values_list(champ, flat=True))
+    if ids_existants:
+        def increments(index, output_field):
+            return Case(
+                *[When(**{champ: pk}, then=Value(valeurs[pk][index])) for pk in ids_existants],
+                output_field=output_field,
+            )
+        existants.update(
+            nb_ventes=F('nb_ventes') + increments(0, PositiveIntegerField()),
+            quantite=F('quantite') + increments(1, PositiveIntegerField()),
+            chiffre_affaires=F('chiffre_affaires') + increments(
+                2, DecimalField(max_digits=14, decimal_places=2)
+            ),
+        )
+    nouveaux = [pk for pk in valeurs if pk not in ids_existants]
+    if not nouveaux:
+        return
+    try:
+        with transaction.atomic():
+            modele.objects.bulk_create([
+                modele(date=jour, **{champ: pk}, nb_ventes=valeurs[pk][0],
+                       quantite=valeurs[pk][1], chiffre_affaires=valeurs[pk][2])
+                for pk in nouveaux
+            ])
+    except IntegrityError:
+        # Lignes créées entre-temps par une vente concurrente
+        for pk in nouveaux:
+            nb_ventes, quantite, montant = valeurs[pk]
+            _incrementer(modele, {'date': jour, champ: pk},
+                         nb_ventes=nb_ventes, quantite=quantite, chiffre_affaires=montant)
+
+
+def enregistrer_vente(vente, lignes=None):
+    """Ajoute une vente (et ses lignes) aux tables d'agrégats"""
+    if lignes is None:
+        lignes = list(vente.lignes.all())
+    enregistrer_ventes([(vente, lignes)])
+
+
+def enregistrer_ventes(ventes_lignes):
+    """
+    Ajoute un lot de ventes aux tables d'agrégats.
+
+    `ventes_lignes` est une liste de couples (vente, lignes). Les compteurs
+    sont d'abord cumulés en mémoire, puis écrits une fois par clé.
+    """
+    jours = defaultdict(lambda: [0, Decimal('0.00'), 0])
+    mois = defaultdict(lambda: [0, Decimal('0.00'), 0])
+    clients = defaultdict(lambda: defaultdict(lambda: [0, 0, Decimal('0.00')]))
+    produits = defaultdict(lambda: defaultdict(lambda: [0, 0, Decimal('0.00')]))
+
+    for vente, lignes in ventes_lignes:
+        jour = timezone.localdate(vente.date_vente)
+        quantite = sum(ligne.quantite for ligne in lignes)
+        for cumul in (jours[jour], mois[(jour.year, jour.month)]):
+            cumul[0] += 1
+            cumul[1] += vente.total
+            cumul[2] += quantite
+        if vente.client_id:
+            cumul = clients[jour][vente.client_id]
+            cumul[0] += 1
+            cumul[1] += quantite
+            cumul[2] += vente.total
+
+        par_produit = produits[jour]
+        for produit_id in {ligne.produit_id for ligne in lignes}:
+            par_produit[produit_id][0] += 1
+        for ligne in lignes:
+            par_produit[ligne.produit_id][1] += ligne.quantite
+            par_produit[ligne.produit_id][2] += ligne.total_ligne()
+
+    with transaction.atomic():
+        for jour, (nb, ca, qte) in jours.items():
+            _incrementer(StatJour, {'date': jour},
+                         nb_ventes=nb, chiffre_affaires=ca, quantite=qte)
+        for (annee, m), (nb, ca, qte) in mois.items():
+            _incrementer(StatMois, {'annee': annee, 'mois': m},
+                         nb_ventes=nb, chiffre_affaires=ca, quantite=qte)
+        for jour, par_client in clients.items():
+            _incrementer_par_jour(StatClientJour, 'client_id', jour, par_client)
+        for jour, par_produit in produits.items():
+            _incrementer_par_jour(StatProduitJour, 'produit_id', jour, par_produit)
+    DashboardStats.invalider()
+
+
+def _debut_du_jour(jour):
+    return timezone.make_aware(datetime.combine(jour, time.min))
+
+
+def reconstruire_statistiques(depuis=None, batch_size=1000):
+    """
+    Recalcule les agrégats à partir des ventes.
+
+    Si `depuis` (date) est fourni, seuls les mois à partir de cette date sont
+    recalculés ; sinon toutes les tables sont vidées et reconstruites.
+    Retourne le nombre de journées recalculées.
+    """
+    ventes = Vente.objects.all()
+    lignes = LigneVente.objects.all()
+    jours_qs = StatJour.objects.all()
+    mois_qs = StatMois.objects.all()
+    produits_qs = StatProduitJour.objects.all()
+    clients_qs = StatClientJour.objects.all()
+
+    if depuis is not None:
+        depuis = depuis.replace(day=1)
+        debut = _debut_du_jour(depuis)
+        ventes = ventes.filter(date_vente__gte=debut)
+        lignes = lignes.filter(vente__date_vente__gte=debut)
+        jours_qs = jours_qs.filter(date__gte=depuis)
+        mois_qs = mois_qs.filter(Q(annee__gt=depuis.year) | Q(annee=depuis.year, mois__gte=depuis.month))
+        produits_qs = produits_qs.filter(date__gte=depuis)
+        clients_qs = clients_qs.filter(date__gte=depuis)
+
+    with transaction.atomic():
+        nb_jours = _reconstruire(ventes, lignes, jours_qs, produits_qs, clients_qs, mois_qs, batch_size)
+    DashboardStats.invalider()
+    return nb_jours
+
+
+def recalculer_jours(jours, batch_size=1000):
+    """
+    Recalcule les agrégats des journées `jours` puis de leurs mois (à partir
+    de StatJour). Les compteurs ne font que s'incrémenter : une vente ou une
+    ligne supprimée doit être recomptée.
+    """
+    jours = sorted(set(jours))
+    if not jours:
+        return
+    periodes = Q()
+    for jour in jours:
+        periodes |= Q(date_vente__gte=_debut_du_jour(jour), date_vente__lt=_debut_du_jour(jour + timedelta(days=1)))
+    ventes = Vente.objects.filter(periodes)
+    with transaction.atomic():
+        _reconstruire(
+            ventes, LigneVente.objects.filter(vente__in=ventes.values('id')),
+            StatJour.objects.filter(date__in=jours),
+            StatProduitJour.objects.filter(date__in=jours),
+            StatClientJour.objects.filter(date__in=jours),
+            None, batch_size,
+        )
+        for annee, mois in sorted({(jour.year, jour.month) for jour in jours}):
+            cumul = StatJour.objects.filter(date__year=annee, date__month=mois).aggregate(
+                nb_ventes=Sum('nb_ventes'), chiffre_affaires=Sum('chiffre_affaires'), quantite=Sum('quantite'),
+            )
+            if cumul['nb_ventes']:
+                StatMois.objects.update_or_create(annee=annee, mois=mois, defaults=cumul)
+            else:
+                StatMois.objects.filter(annee=annee, mois=mois).delete()
+    DashboardStats.invalider()
+
+
+def _reconstruire(ventes, lignes, jours_qs, produits_qs, clients_qs, mois_qs, batch_size):
+    """
+    Remplace les agrégats sélectionnés par les querysets `*_qs` par ceux
+    calculés sur `ventes` et `lignes` (StatMois ignoré si `mois_qs` est None).
+    Retourne le nombre de journées écrites.
+    """
+    # Quantités vendues par vente, pour les agrégats jour/mois/client
+    quantites = dict(
+        lignes.values_list('vente_id').annotate(q=Sum('quantite')).order_by()
+    )
+
+    jours = {}
+    mois = {}
+    clients = {}
+    for vente_id, client_id, date_vente, total in ventes.values_list(
+        'id', 'client_id', 'date_vente', 'total'
+    ).iterator(chunk_size=batch_size):
+        jour = timezone.localdate(date_vente)
+        qte = quantites.get(vente_id) or 0
+        cles = [(jours, jour), (mois, (jour.year, jour.month))]
+        if client_id:
+            cles.append((clients, (jour, client_id)))
+        for cumul, cle in cles:
+            valeurs = cumul.setdefault(cle, [0, Decimal('0.00'), 0])
+            valeurs[0] += 1
+            valeurs[1] += total
+            valeurs[2] += qte
+
+    produits = [
+        StatProduitJour(date=p['jour'], produit_id=p['produit_id'], nb_ventes=p['nb'],
+                        chiffre_affaires=p['ca'] or 0, quantite=p['q'] or 0)
+        for p in lignes.annotate(jour=TruncDate('vente__date_vente'))
+        .values('jour', 'produit_id')
+        .annotate(
+            nb=Count('vente_id', distinct=True),
+            ca=Sum(F('quantite') * F('prix_unitaire'), output_field=DecimalField()),
+            q=Sum('quantite'),
+        )
+        .order_by()
+    ]
+
+    for qs in (jours_qs, mois_qs, produits_qs, clients_qs):
+        if qs is not None:
+            qs.delete()
+    StatJour.objects.bulk_create(
+        [StatJour(date=d, nb_ventes=n, chiffre_affaires=ca, quantite=q)
+         for d, (n, ca, q) in jours.items()],
+        batch_size=batch_size,
+    )
+    if mois_qs is not None:
+        StatMois.objects.bulk_create(
+            [StatMois(annee=a, mois=m, nb_ventes=n, chiffre_affaires=ca, quantite=q)
+             for (a, m), (n, ca, q) in mois.items()],
+            batch_size=batch_size,
+        )
+    StatClientJour.objects.bulk_create(
+        [StatClientJour(date=d, client_id=c, nb_ventes=n, chiffre_affaires=ca, quantite=q)
+         for (d, c), (n, ca, q) in clients.items()],
+        batch_size=batch_size,
+    )
+    StatProduitJour.objects.bulk_create(produits, batch_size=batch_size)
+    return len(jours)
@@ -0,0 +1,127 @@
+"""
+Journal des mouvements de stock.
+
+Chaque variation de Produit.stock est aussi écrite dans MouvementStock, dans
+la même transaction. Le stock d'un produit à une date se calcule à partir du
+dernier InstantaneStock antérieur, plus les mouvements qui le suivent : la
+lecture du journal reste bornée à l'intervalle depuis le dernier instantané
+(commande `snapshot_stock`, à lancer chaque nuit) au lieu de tout rejouer.
+"""
+from collections import defaultdict
+from datetime import datetime, time
+
+from django.db import transaction
+from django.db.models import OuterRef, Subquery, Sum
+from django.utils import timezone
+
+from .models import Produit, MouvementStock, InstantaneStock
+
+
+def mouvements_vente(vente, lignes, type_mouvement=MouvementStock.VENTE):
+    """Mouvements (non enregistrés) d'une vente : une sortie par produit"""
+    quantites = defaultdict(int)
+    for ligne in lignes:
+        quantites[ligne.produit_id] += ligne.quantite
+    signe = 1 if type_mouvement == MouvementStock.ANNULATION else -1
+    return [
+        MouvementStock(produit_id=pid, quantite=signe * quantite, type_mouvement=type_mouvement, vente=vente)
+        for pid, quantite in quantites.items()
+    ]
+
+
+def enregistrer_mouvement(produit, quantite, type_mouvement=MouvementStock.AJUSTEMENT):
+    """Journalise une variation de stock déjà appliquée à `produit` (ignorée si nulle)"""
+    if quantite:
+        MouvementStock.objects.create(produit=produit, quantite=quantite, type_mouvement=type_mouvement)
+
+
+def stock_a(produit_id, instant=None):
+    return stocks_a([produit_id], instant).get(produit_id)
+
+
+def stocks_a(produit_ids, instant=None):
+    """
+    Stock de chaque produit à `instant` (maintenant par défaut) d'après le journal.
+    Deux requêtes quel que soit le nombre de produits.
+    """
+    instant = instant or timezone.now()
+    derniers = InstantaneStock.objects.filter(
+        produit=OuterRef('pk'), date__lte=instant
+    ).order_by('-date')
+    instantanes = Produit.objects.filter(pk__in=produit_ids).annotate(
+        date_instantane=Subquery(derniers.values('date')[:1]),
+        stock_instantane=Subquery(derniers.values('stock')[:1]),
+    ).values_list('pk', 'date_instantane', 'stock_instantane')
+
+    stocks = {}
+    par_date = defaultdict(list)
+    for pid, date, stock in instantanes:
+        stocks[pid] = stock or 0
+        par_date[date].append(pid)
+
+    # Les produits partagent en général la date du dernier instantané :
+    # une plage (date, instant] par groupe, servie par l'index (produit, date)
+    for date, pids in par_date.items():
+        mouvements = MouvementStock.objects.filter(produit_id__in=pids, date__lte=instant)
+        if date is not None:
+            mouvements = mouvements.filter(date__gt=date)
+        for pid, somme in mouvements.values('produit_id').annotate(
+            somme=Sum('quantite')
+        ).values_list('produit_id', 'somme'):
+            stocks[pid] += somme
+    return stocks
+
+
+def creer_instantanes(instant=None, batch_size=1000):
+    """
+    Enregistre le stock de tous les produits à `instant` (début du jour par
+    défaut), calculé depuis l'instantané précédent. Retourne le nombre créé.
+    """
+    if instant is None:
+        instant = timezone.make_aware(datetime.combine(timezone.localdate(), time.min))
+    crees = 0
+    dernier_id = 0
+    while True:
+        ids = list(
+            Produit.objects.filter(pk__gt=dernier_id).order_by('pk').values_list('pk', flat=True)[:batch_size]
+        )
+        if not ids:
+            return crees
+        stocks = stocks_a(ids, instant)
+        crees += len(InstantaneStock.objects.bulk_create(
+            [InstantaneStock(produit_id=pid, date=instant, stock=stock) for pid, stock in stocks.items()],
+            ignore_conflicts=True,
+        ))
+        dernier_id = ids[-1]
+
+
+def verifier_stock(batch_size=1000, corriger=False):
+    """
+    Compare Produit.stock au journal, par lots de produits. Génère un tuple
+    (produit, stock_journal) par écart. Avec `corriger`, un mouvement
+    d'ajustement aligne le journal sur le stock courant.
+    """
+    dernier_id = 0
+    while True:
+        with transaction.atomic():
+            # Verrou du lot : aucune vente ne peut modifier le stock entre les deux lectures
+            produits = list(
+                Produit.objects.select_for_update().filter(pk__gt=dernier_id).order_by('pk')[:batch_size]
+            )
+            if not produits:
+                return
+            attendus = stocks_a([produit.pk for produit in produits])
+            ecarts = [
+                (produit, attendus[produit.pk]) for produit in produits
+                if produit.stock != attendus[produit.pk]
+            ]
+            if corriger and ecarts:
+                MouvementStock.objects.bulk_create([
+                    MouvementStock(
+                        produit=produit, quantite=produit.stock - attendu,
+                        type_mouvement=MouvementStock.AJUSTEMENT,
+                    )
+                    for produit, attendu in ecarts
+                ])
+        yield from ecarts
+        dernier_id = produits[-1].pk
@@ -1,3 +1,1378 @@
-from django.test import TestCase
+import base64
+import csv
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import zipfile
+from datetime import timedelta
+from decimal import Decimal
+from importlib import import_module
+from importlib.util import find_spec
+from unittest import skipUnless
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection, connections, transaction
+from django.db.models import F, Sum
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+from django.utils import timezone
+
+from .benchmarks import vues_async
+from .catalogue import FENETRE_MS
+from .dashboard import DashboardStats, en_parallele
+from .filtres import FiltreVentes
+from .import_csv import importer_fichier_csv
+from .ingestion import importer_ventes
+from .jobs import (
+    chemin_rapport, demander_rapport, executer_job, marquer_modification, nettoyer_rapports, reserver_jobs,
+    version_donnees,
+)
+from .metriques import MesureRequete, exposition, reinitialiser as reinitialiser_metriques
+from .models import (
+    Produit, Client, Vente, LigneVente, RapportJob, MouvementStock, InstantaneStock, StatJour, StatProduitJour,
+    PrevisionStock, ProfilClient, StatClientJour, StatMois, marquer_catalogue,
+)
+from . import recherche
+from .recherche import _par_prefixe, rechercher_produits, rechercher_clients
+from .reports import clients_avec_achats
+from .replica import COOKIE_ECRITURE, RouteurReplica, lecture_sur_replica, retard_copie_sqlite
+from .services import StockInsuffisant, passer_vente
+from .statistiques import reconstruire_statistiques
+from .stock import creer_instantanes, stock_a, verifier_stock
+from .pagination import paginer_par_curseur
+
+# Analyse RFM et prévisions : numpy reste optionnel (les commandes le signalent sans lui)
+NUMPY = find_spec('numpy') is not None
+
+
+class IndexPlanTests(TestCase):
+    """Vérifie avec EXPLAIN que les requêtes fréquentes utilisent les index"""
+
+    @classmethod
+    def setUpTestData(cls):
+        client = Client.objects.create(nom='Client')
+        produits = Produit.objects.bulk_create([
+            Produit(nom=f'Produit {i}', prix=10, stock=i, seuil_alerte=5) for i in range(50)
+        ])
+        maintenant = timezone.now()
+        ventes = Vente.objects.bulk_create([
+            Vente(client=client, total=10, date_vente=maintenant - timedelta(hours=i)) for i in range(200)
+        ])
+        LigneVente.objects.bulk_create([
+            LigneVente(vente=vente, produit=produits[i % 50], quantite=1, prix_unitaire=10)
+            for i, vente in enumerate(ventes)
+        ])
+        cls.client_id = client.pk
+        cls.produit_id = produits[0].pk
+
+    def setUp(self):
+        if connection.vendor not in ('sqlite', 'postgresql'):
+            self.skipTest('Plan EXPLAIN vérifié uniquement pour SQLite et PostgreSQL')
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                # Sur de petites tables PostgreSQL préfère un parcours séquentiel
+                cursor.execute('SET enable_seqscan = off')
+            else:
+                cursor.execute('ANALYZE')
+
+    def assertUtiliseIndex(self, queryset, index):
+        plan = queryset.explain()
+        self.assertIn(index, plan, f"Index {index} non utilisé:\n{plan}")
+
+    def test_plage_de_dates(self):
+        filtre = FiltreVentes(date_from=timezone.localdate() - timedelta(days=2))
+        self.assertUtiliseIndex(filtre.filtrer(Vente.objects.all()), 'vente_date_idx')
+
+    def test_ventes_recentes_triees(self):
+        depuis = timezone.now() - timedelta(hours=24)
+        self.assertUtiliseIndex(
+            Vente.objects.filter(date_vente__gte=depuis).order_by('-date_vente', '-id'), 'vente_date_idx'
+        )
+
+    def test_ventes_d_un_client_sur_une_periode(self):
+        filtre = FiltreVentes(client=self.client_id, date_from=timezone.localdate())
+        self.assertUtiliseIndex(filtre.filtrer(Vente.objects.all()), 'vente_client_date_idx')
+
+    def test_lignes_par_produit(self):
+        self.assertUtiliseIndex(
+            LigneVente.objects.filter(produit_id=self.produit_id).values('vente_id'),
+            'lignevente_produit_vente_idx',
+        )
+        self.assertUtiliseIndex(
+            LigneVente.objects.values('produit').annotate(total=Sum('quantite')).order_by('produit'),
+            'lignevente_produit_vente_idx',
+        )
+
+    def test_produits_en_stock_faible(self):
+        self.assertUtiliseIndex(
+            Produit.objects.filter(stock__lte=F('seuil_alerte')).order_by('stock'),
+            'produit_stock_faible_idx',
+        )
+
+    def test_recherche_par_prefixe_sans_fts(self):
+        qs = _par_prefixe(Produit, ['produit', '1'])
+        self.assertUtiliseIndex(qs[:20], 'produit_nom_lower_idx')
+        if connection.vendor == 'sqlite':
+            # Plage sur l'index, déjà dans l'ordre : ni parcours de table ni tri
+            plan = qs[:20].explain()
+            self.assertNotIn('SCAN', plan)
+            self.assertNotIn('TEMP B-TREE', plan)
+        noms = [p.nom for p in _par_prefixe(Produit, ['PRODUIT', '1'])]
+        self.assertEqual(noms, sorted(f'Produit {i}' for i in range(50) if str(i).startswith('1')))
+        self.assertUtiliseIndex(_par_prefixe(Client, ['cli']), 'client_nom_lower_idx')
+
+
+@override_settings(VENTE_API_TOKENS=['jeton-test'])
+class ImportVentesApiTests(TestCase):
+    def setUp(self):
+        self.produit = Produit.objects.create(nom='Savon', prix=10, stock=3)
+
+    def envoyer(self, corps):
+        if not isinstance(corps, str):
+            corps = json.dumps(corps)
+        return self.client.post(
+            reverse('vente:api_importer_ventes'), corps, content_type='application/json',
+            HTTP_AUTHORIZATION='Bearer jeton-test',
+        )
+
+    def resultats(self, ventes):
+        reponse = self.envoyer({'ventes': ventes})
+        self.assertEqual(reponse.status_code, 200)
+        return reponse.json()['resultats']
+
+    def test_vente_rejouee_enregistree_une_fois(self):
+        vente = {'cle': 'caisse1-0001', 'lignes': [{'produit': self.produit.pk, 'quantite': 2}]}
+        premier, = self.resultats([vente])
+        self.assertEqual(premier['statut'], 'creee')
+        # Réessai, et doublon dans un même envoi
+        for resultat in self.resultats([vente, vente]):
+            self.assertEqual(resultat['statut'], 'deja_enregistree')
+        self.assertEqual(self.resultats([vente])[0]['vente_id'], premier['vente_id'])
+        self.assertEqual(Vente.objects.count(), 1)
+        self.produit.refresh_from_db()
+        self.assertEqual(self.produit.stock, 1)
+
+    def test_stock_insuffisant_rejette_la_vente_seule(self):
+        ligne = {'produit': self.produit.pk, 'quantite': 2}
+        resultats = self.resultats([{'lignes': [ligne]}, {'lignes': [ligne]}, {'lignes': [dict(ligne, quantite=1)]}])
+        self.assertEqual([r['statut'] for r in resultats], ['creee', 'rejetee', 'creee'])
+        self.assertIn('seulement 1 en stock', resultats[1]['erreurs'][0])
+        self.produit.refresh_from_db()
+        self.assertEqual(self.produit.stock, 0)
+        self.assertEqual(Vente.objects.count(), 2)
+        self.assertEqual(MouvementStock.objects.filter(produit=self.produit).count(), 2)
+
+    def test_donnees_malformees(self):
+        ligne = {'produit': self.produit.pk, 'quantite': 1}
+        ventes = [
+            'vente',
+            {'lignes': []},
+            {'lignes': [dict(ligne, quantite=0)]},
+            {'lignes': [dict(ligne, produit=2**70)]},
+            {'lignes': [ligne], 'client': 'Awa'},
+            {'lignes': [ligne], 'date_vente': 'hier'},
+            {'lignes': [dict(ligne, prix_unitaire='abc')]},
+            {'lignes': [dict(ligne, prix_unitaire='-1')]},
+            # bool() les prendrait pour des paiements effectués
+            {'lignes': [ligne], 'paiement_effectue': 'false'},
+            {'lignes': [ligne], 'paiement_effectue': '0'},
+            {'lignes': [ligne], 'paiement_effectue': 0},
+            {'lignes': [ligne], 'paiement_effectue': None},
+        ]
+        self.assertEqual({r['statut'] for r in self.resultats(ventes)}, {'rejetee'})
+        # NaN et Infinity sont acceptés par json.loads
+        for prix in ('NaN', 'Infinity', '-Infinity'):
+            corps = f'{{"ventes": [{{"lignes": [{{"produit": {self.produit.pk}, "quantite": 1, "prix_unitaire": {prix}}}]}}]}}'
+            reponse = self.envoyer(corps)
+            self.assertEqual(reponse.status_code, 200, prix)
+            self.assertEqual(reponse.json()['resultats'][0]['statut'], 'rejetee')
+        self.assertEqual(self.envoyer('{"ventes": ').status_code, 400)
+        self.assertEqual(self.envoyer({'ventes': {}}).status_code, 400)
+        self.assertFalse(Vente.objects.exists())
+
+    def test_paiement_effectue_booleen(self):
+        ligne = {'produit': self.produit.pk, 'quantite': 1}
+        resultats = self.resultats([
+            {'lignes': [ligne], 'paiement_effectue': True},
+            {'lignes': [ligne], 'paiement_effectue': False},
+            {'lignes': [ligne]},
+        ])
+        paiements = dict(Vente.objects.values_list('pk', 'paiement_effectue'))
+        self.assertEqual([paiements[r['vente_id']] for r in resultats], [True, False, False])
+
+
+class FiltreVentesTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_user('caissier', password='x'))
+        self.awa = Client.objects.create(nom='Awa')
+        self.vente = Vente.objects.create(client=self.awa, total=10)
+        produit = Produit.objects.create(nom='Savon', prix=10, stock=5)
+        LigneVente.objects.create(vente=self.vente, produit=produit, quantite=1, prix_unitaire=10)
+
+    def test_valeurs_invalides_ignorees(self):
+        filtre = FiltreVentes.depuis_requete({
+            'date_from': '2026-13-01', 'date_to': 'demain', 'client': '-3', 'produit': str(2**63),
+        })
+        self.assertFalse(filtre.est_actif)
+        self.assertEqual(FiltreVentes.depuis_requete({'client': str(2**63 - 1)}).client, 2**63 - 1)
+
+    def test_dates_extremes_sans_borne(self):
+        filtre = FiltreVentes.depuis_requete({'date_from': '0001-01-01', 'date_to': '9999-12-31'})
+        self.assertTrue(filtre.est_actif)
+        self.assertEqual(list(filtre.filtrer(Vente.objects.all())), [self.vente])
+
+    def test_pages_filtrees_avec_valeurs_hors_limites(self):
+        for params in (
+            {'date_to': '9999-12-31'},
+            {'date_from': '0001-01-01'},
+            {'client': '99999999999999999999'},
+            {'produit': '99999999999999999999'},
+        ):
+            with self.subTest(**params):
+                for nom in ('liste_ventes', 'clients_achetes', 'exporter_lignes_ventes'):
+                    reponse = self.client.get(reverse(f'vente:{nom}'), params)
+                    self.assertEqual(reponse.status_code, 200, nom)
+                    if hasattr(reponse, 'streaming_content'):
+                        self.assertIn(b'Awa', b''.join(reponse.streaming_content))
+
+
+class CreerVenteFormTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_user('caissier', password='x'))
+
+    def test_identifiants_hors_limites_erreur_de_formulaire(self):
+        reponse = self.client.post(reverse('vente:creer_vente'), {
+            'client': '99999999999999999999',
+            'lignes-TOTAL_FORMS': 1, 'lignes-INITIAL_FORMS': 0,
+            'lignes-0-produit': '99999999999999999999', 'lignes-0-quantite': 1, 'lignes-0-prix_unitaire': '10.00',
+        })
+        self.assertEqual(reponse.status_code, 200)
+        self.assertIn('client', reponse.context['form'].errors)
+        self.assertIn('produit', reponse.context['formset'].forms[0].errors)
+        self.assertFalse(Vente.objects.exists())
+
+
+class PasserVenteTests(TestCase):
+    def setUp(self):
+        self.sac = Produit.objects.create(nom='Sac', prix=Decimal('25.00'), stock=5)
+        self.pagne = Produit.objects.create(nom='Pagne', prix=Decimal('12.50'), stock=2)
+
+    def assertRienEcrit(self):
+        self.assertFalse(Vente.objects.exists())
+        self.assertFalse(LigneVente.objects.exists())
+        self.assertFalse(MouvementStock.objects.exists())
+        self.assertEqual(dict(Produit.objects.values_list('nom', 'stock')), {'Sac': 5, 'Pagne': 2})
+
+    def test_stock_decremente(self):
+        lignes = passer_vente(Vente(), [
+            {'produit': self.sac, 'quantite': 3},
+            {'produit': self.pagne, 'quantite': 2, 'prix_unitaire': Decimal('10.00')},
+        ])
+        vente = Vente.objects.get()
+        self.assertEqual(vente.total, Decimal('95.00'))
+        self.assertEqual([ligne.produit.stock for ligne in lignes], [2, 0])
+        self.assertEqual(dict(Produit.objects.values_list('nom', 'stock')), {'Sac': 2, 'Pagne': 0})
+        self.assertEqual(
+            sorted(MouvementStock.objects.values_list('produit__nom', 'quantite')), [('Pagne', -2), ('Sac', -3)]
+        )
+
+    def test_survente_refusee_sans_ecriture(self):
+        with self.assertRaises(StockInsuffisant) as contexte:
+            passer_vente(Vente(), [
+                {'produit': self.sac, 'quantite': 3},
+                {'produit': self.pagne, 'quantite': 5},
+            ])
+        self.assertEqual(len(contexte.exception.erreurs), 1)
+        self.assertIn('Pagne', contexte.exception.erreurs[0])
+        self.assertRienEcrit()
+
+    def test_meme_produit_sur_deux_lignes(self):
+        # Chaque ligne tient dans le stock, mais pas leur somme
+        with self.assertRaises(StockInsuffisant):
+            passer_vente(Vente(), [{'produit': self.sac, 'quantite': 3}, {'produit': self.sac, 'quantite': 3}])
+        self.assertRienEcrit()
+
+        lignes = passer_vente(Vente(), [{'produit': self.sac, 'quantite': 3}, {'produit': self.sac, 'quantite': 2}])
+        self.assertEqual(len(lignes), 2)
+        self.sac.refresh_from_db()
+        self.assertEqual(self.sac.stock, 0)
+        self.assertEqual(Vente.objects.get().total, Decimal('125.00'))
+        self.assertEqual(MouvementStock.objects.filter(produit=self.sac).aggregate(total=Sum('quantite'))['total'], -5)
+
+
+class PaginationCurseurTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        # Dates en double pour vérifier le départage par id
+        maintenant = timezone.now()
+        Vente.objects.bulk_create([
+            Vente(total=10, date_vente=maintenant - timedelta(hours=i // 2)) for i in range(11)
+        ])
+        cls.attendu = list(Vente.objects.order_by('-date_vente', '-id').values_list('id', flat=True))
+
+    def test_parcours_avant_puis_arriere(self):
+        pages, params = [], {'taille': '4'}
+        while True:
+            page = paginer_par_curseur(Vente.objects.all(), params, ('date_vente', 'id'))
+            pages.append([v.pk for v in page])
+            if not page.has_next:
+                break
+            params = {'taille': '4', 'apres': page.suivant}
+        self.assertEqual([pk for ids in pages for pk in ids], self.attendu)
+        self.assertEqual([len(ids) for ids in pages], [4, 4, 3])
+
+        precedente = paginer_par_curseur(
+            Vente.objects.all(), {'taille': '4', 'avant': page.precedent}, ('date_vente', 'id')
+        )
+        self.assertEqual([v.pk for v in precedente], pages[1])
+        self.assertTrue(precedente.has_next and precedente.has_previous)
+
+    def test_derniere_page_et_jeton_invalide(self):
+        derniere = paginer_par_curseur(Vente.objects.all(), {'taille': '4', 'dernier': '1'}, ('date_vente', 'id'))
+        self.assertEqual([v.pk for v in derniere], self.attendu[-4:])
+        self.assertFalse(derniere.has_next)
+
+        premiere = paginer_par_curseur(Vente.objects.all(), {'apres': 'pas-un-jeton'}, ('date_vente', 'id'))
+        self.assertEqual([v.pk for v in premiere], self.attendu[:5])
+        self.assertFalse(premiere.has_previous)
+
+    def test_jeton_altere_ignore(self):
+        self.client.force_login(User.objects.create_user('caissier', password='x'))
+        for valeurs in ([5, 1], ['2024-01-01T00:00:00+00:00', 10 ** 20], [None, {}], {'id': 1}):
+            with self.subTest(valeurs=valeurs):
+                jeton = base64.urlsafe_b64encode(json.dumps(valeurs).encode()).decode()
+                page = paginer_par_curseur(Vente.objects.all(), {'apres': jeton}, ('date_vente', 'id'))
+                self.assertEqual([v.pk for v in page], self.attendu[:5])
+                self.assertEqual(self.client.get(reverse('vente:liste_ventes'), {'apres': jeton}).status_code, 200)
+
+
+@override_settings(VENTE_API_TOKENS=['jeton-test'])
+class NombreRequetesTests(TestCase):
+    """
+    Chaque URL de vente/urls.py doit faire un nombre fixe de requêtes SQL,
+    quel que soit le volume de données (pas de requête par ligne affichée).
+    """
+
+    # Requêtes attendues par page, session et utilisateur compris ; les listes
+    # et le tableau de bord recalculent ici les statistiques (cache vidé)
+    REQUETES = {
+        'tableau_bord': 12,
+        'liste_produits': 13,
+        'ajouter_produit': 2,
+        'modifier_produit': 3,
+        'supprimer_produit': 3,
+        'produits_autocomplete': 4,
+        'catalogue_produits': 5,
+        'liste_clients': 13,
+        'ajouter_client': 2,
+        'modifier_client': 3,
+        'supprimer_client': 3,
+        'clients_autocomplete': 4,
+        'liste_ventes': 13,
+        'creer_vente': 3,
+        'creer_vente (POST)': 13,
+        'api_importer_ventes': 9,
+        'importer_csv': 2,
+        'importer_csv (POST)': 17,
+        'clients_achetes': 3,
+        'exporter_clients_pdf': 4,
+        'exporter_ventes_pdf': 7,
+        'exporter_lignes_ventes': 3,
+        'exporter_lignes_ventes (xlsx)': 3,
+        'demander_rapport': 5,
+        'statut_rapport': 3,
+        'telecharger_rapport': 3,
+        'metriques': 0,
+    }
+
+    def setUp(self):
+        self.dossier = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dossier.cleanup)
+        reglages = override_settings(RAPPORTS_DIR=self.dossier.name)
+        reglages.enable()
+        self.addCleanup(reglages.disable)
+        self.client.force_login(User.objects.create_user('caissier', password='x'))
+        self.numero = 0
+
+    def _peupler(self, nombre):
+        """Ajoute `nombre` clients, produits et ventes de 3 lignes"""
+        debut = self.numero
+        self.numero += nombre
+        clients = Client.objects.bulk_create([
+            Client(nom=f'Client {i}', telephone=f'0800{i:04d}') for i in range(debut, self.numero)
+        ])
+        produits = Produit.objects.bulk_create([
+            Produit(nom=f'Produit {i}', prix=10, stock=1000, seuil_alerte=5 + i % 3 * 500)
+            for i in range(debut, self.numero)
+        ])
+        maintenant = timezone.now()
+        ventes = Vente.objects.bulk_create([
+            Vente(client=clients[i], total=30, date_vente=maintenant - timedelta(hours=i)) for i in range(nombre)
+        ])
+        LigneVente.objects.bulk_create([
+            LigneVente(vente=vente, produit=produits[(i + j) % nombre], quantite=1, prix_unitaire=10)
+            for i, vente in enumerate(ventes) for j in range(3)
+        ])
+        # bulk_create n'envoie pas de signal : nouvelles versions des données et du catalogue comme l'application
+        marquer_modification()
+        marquer_catalogue()
+        return clients, produits
+
+    def _requetes(self, nombre):
+        clients, produits = self._peupler(nombre)
+        job = RapportJob.objects.create(
+            type_rapport=RapportJob.TYPE_VENTES, cle_cache=f'cle{nombre}', statut=RapportJob.TERMINE
+        )
+        chemin_rapport(job.cle_cache).write_bytes(b'%PDF')
+        lignes = [(produits[i % nombre].pk, 1) for i in range(nombre // 5)]
+        panier = {
+            'client': clients[0].pk, 'lignes-TOTAL_FORMS': len(lignes), 'lignes-INITIAL_FORMS': 0,
+            **{f'lignes-{i}-produit': pid for i, (pid, _) in enumerate(lignes)},
+            **{f'lignes-{i}-quantite': q for i, (_, q) in enumerate(lignes)},
+            **{f'lignes-{i}-prix_unitaire': '10.00' for i in range(len(lignes))},
+        }
+        import_api = json.dumps({'ventes': [
+            {'client': clients[i].pk, 'lignes': [{'produit': pid, 'quantite': q}]} for i, (pid, q) in enumerate(lignes)
+        ]})
+        # Moitié de produits existants (mis à jour), moitié de nouveaux
+        fichier_csv = 'nom;prix;stock\n' + ''.join(
+            f'Produit {i};12.50;{i % 7}\n' for i in range(self.numero - nombre, self.numero + nombre)
+        )
+        requetes = {
+            'tableau_bord': ('get', reverse('vente:tableau_bord'), {}),
+            'liste_produits': ('get', reverse('vente:liste_produits'), {'data': {'taille': nombre}}),
+            'ajouter_produit': ('get', reverse('vente:ajouter_produit'), {}),
+            'modifier_produit': ('get', reverse('vente:modifier_produit', args=[produits[0].pk]), {}),
+            'supprimer_produit': ('get', reverse('vente:supprimer_produit', args=[produits[0].pk]), {}),
+            'produits_autocomplete': ('get', reverse('vente:produits_autocomplete'), {'data': {'q': 'produit'}}),
+            'catalogue_produits': ('get', reverse('vente:catalogue_produits'), {}),
+            'liste_clients': ('get', reverse('vente:liste_clients'), {'data': {'taille': nombre}}),
+            'ajouter_client': ('get', reverse('vente:ajouter_client'), {}),
+            'modifier_client': ('get', reverse('vente:modifier_client', args=[clients[0].pk]), {}),
+            'supprimer_client': ('get', reverse('vente:supprimer_client', args=[clients[0].pk]), {}),
+            'clients_autocomplete': ('get', reverse('vente:clients_autocomplete'), {'data': {'q': 'client'}}),
+            'liste_ventes': ('get', reverse('vente:liste_ventes'), {'data': {'taille': nombre}}),
+            'creer_vente': ('get', reverse('vente:creer_vente'), {}),
+            'creer_vente (POST)': ('post', reverse('vente:creer_vente'), {'data': panier}),
+            'api_importer_ventes': ('post', reverse('vente:api_importer_ventes'), {
+                'data': import_api, 'content_type': 'application/json',
+                'HTTP_AUTHORIZATION': 'Bearer jeton-test',
+            }),
+            'importer_csv': ('get', reverse('vente:importer_csv', args=['produits']), {}),
+            'importer_csv (POST)': ('post', reverse('vente:importer_csv', args=['produits']), {
+                'data': {'fichier': SimpleUploadedFile('produits.csv', fichier_csv.encode())},
+            }),
+            'clients_achetes': ('get', reverse('vente:clients_achetes'), {}),
+            'exporter_clients_pdf': ('get', reverse('vente:exporter_clients_pdf'), {}),
+            'exporter_ventes_pdf': ('get', reverse('vente:exporter_ventes_pdf'), {}),
+            'exporter_lignes_ventes': ('get', reverse('vente:exporter_lignes_ventes'), {}),
+            'exporter_lignes_ventes (xlsx)': ('get', reverse('vente:exporter_lignes_ventes'), {'data': {'format': 'xlsx'}}),
+            'demander_rapport': ('post', reverse('vente:demander_rapport', args=[RapportJob.TYPE_CLIENTS]), {}),
+            'statut_rapport': ('get', reverse('vente:statut_rapport', args=[job.pk]), {}),
+            'telecharger_rapport': ('get', reverse('vente:telecharger_rapport', args=[job.pk]), {}),
+            'metriques': ('get', reverse('vente:metriques'), {}),
+        }
+        self.assertEqual(set(requetes), set(self.REQUETES))
+        mesures = {}
+        for nom, (methode, url, options) in requetes.items():
+            cache.clear()
+            with CaptureQueriesContext(connection) as requetes_sql:
+                reponse = getattr(self.client, methode)(url, **options)
+                if hasattr(reponse, 'streaming_content'):
+                    b''.join(reponse.streaming_content)
+            self.assertLess(reponse.status_code, 400, nom)
+            mesures[nom] = len(requetes_sql)
+        return mesures
+
+    def test_toutes_les_urls_sont_couvertes(self):
+        from . import urls
+        noms = {nom.split(' ')[0] for nom in self.REQUETES}
+        self.assertEqual(noms, {motif.name for motif in urls.urlpatterns})
+
+    def test_nombre_de_requetes_independant_du_volume(self):
+        petit = self._requetes(10)
+        grand = self._requetes(60)
+        for nom, attendu in self.REQUETES.items():
+            with self.subTest(page=nom):
+                self.assertEqual(petit[nom], attendu)
+                self.assertEqual(grand[nom], attendu)
+
+
+class RemoveDuplicatesTests(TestCase):
+    def setUp(self):
+        self.produit = Produit.objects.create(nom='Sac', prix=10, stock=3)
+        doublon_produit = Produit.objects.create(nom='Sac', prix=12, stock=4)
+        self.client_a = Client.objects.create(nom='Awa')
+        doublon_client = Client.objects.create(nom='Awa')
+        self.vente = Vente.objects.create(client=doublon_client, total=30)
+        LigneVente.objects.create(vente=self.vente, produit=self.produit, quantite=1, prix_unitaire=10)
+        LigneVente.objects.create(vente=self.vente, produit=doublon_produit, quantite=2, prix_unitaire=10)
+
+    def test_dry_run_ne_modifie_rien(self):
+        sortie = io.StringIO()
+        call_command('remove_duplicates', '--dry-run', stdout=sortie)
+        self.assertIn('1 produits en doublon', sortie.getvalue())
+        self.assertEqual(Produit.objects.count(), 2)
+        self.assertEqual(Client.objects.count(), 2)
+        self.assertEqual(LigneVente.objects.count(), 2)
+
+    def test_fusion(self):
+        call_command('remove_duplicates', '--batch-size', '1', stdout=io.StringIO())
+        self.assertEqual(list(Produit.objects.values_list('pk', 'stock')), [(self.produit.pk, 7)])
+        self.assertEqual(list(Client.objects.values_list('pk', flat=True)), [self.client_a.pk])
+        self.vente.refresh_from_db()
+        self.assertEqual(self.vente.client_id, self.client_a.pk)
+        self.assertEqual(
+            list(self.vente.lignes.values_list('produit_id', 'quantite')), [(self.produit.pk, 3)]
+        )
+
+
+class JournalStockTests(TestCase):
+    def setUp(self):
+        self.produit = Produit.objects.create(nom='Pagne', prix=10, stock=0)
+        self.produit.restaurer_stock(20, MouvementStock.REAPPROVISIONNEMENT)
+
+    def test_stock_a_une_date(self):
+        avant_vente = timezone.now()
+        passer_vente(Vente(), [{'produit': self.produit, 'quantite': 3}])
+        self.produit.decrementer_stock(2)
+        self.assertEqual(stock_a(self.produit.pk, avant_vente), 20)
+        self.assertEqual(stock_a(self.produit.pk), 15)
+        self.assertEqual(list(verifier_stock()), [])
+
+    def test_lecture_depuis_le_dernier_instantane(self):
+        instant = timezone.now()
+        self.assertEqual(creer_instantanes(instant), 1)
+        # Un mouvement antérieur à l'instantané n'est plus relu
+        MouvementStock.objects.filter(produit=self.produit).update(quantite=999)
+        self.produit.decrementer_stock(5)
+        self.assertEqual(InstantaneStock.objects.get(produit=self.produit).stock, 20)
+        self.assertEqual(stock_a(self.produit.pk), 15)
+
+    def test_rapprochement(self):
+        Produit.objects.filter(pk=self.produit.pk).update(stock=18)
+        ecarts = list(verifier_stock(corriger=True))
+        self.assertEqual([(produit.pk, attendu) for produit, attendu in ecarts], [(self.produit.pk, 20)])
+        self.assertEqual(list(verifier_stock()), [])
+
+
+class RechercheTests(TestCase):
+    def setUp(self):
+        Produit.objects.bulk_create([
+            Produit(nom='Sac en cuir', prix=25, stock=4),
+            Produit(nom='Sandales été', prix=12, stock=9),
+            Produit(nom='Chemise', prix=15, stock=2),
+        ])
+        Client.objects.create(nom='Awa Diallo', telephone='0812')
+
+    def test_recherche_produits(self):
+        self.assertEqual(sorted(p['nom'] for p in rechercher_produits('sa')), ['Sac en cuir', 'Sandales été'])
+        resultat = rechercher_produits('sac')[0]
+        self.assertEqual((resultat['prix'], resultat['stock']), (25, 4))
+        self.assertEqual(rechercher_produits('sac', limite=1)[0]['nom'], 'Sac en cuir')
+        self.assertEqual(rechercher_produits(''), [])
+
+    def test_index_tenu_a_jour(self):
+        produit = Produit.objects.get(nom='Chemise')
+        produit.nom = 'Chemisier'
+        produit.save()
+        self.assertEqual([p['nom'] for p in rechercher_produits('chemisi')], ['Chemisier'])
+        produit.delete()
+        self.assertEqual(rechercher_produits('chemisi'), [])
+
+    def test_sans_fts(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('SQLite uniquement')
+        disponibles = dict(recherche._fts_disponible)
+        self.addCleanup(recherche._fts_disponible.update, disponibles)
+        recherche._fts_disponible.update(dict.fromkeys(disponibles, False))
+        self.assertEqual([p['nom'] for p in rechercher_produits('SA')], ['Sac en cuir', 'Sandales été'])
+        self.assertEqual([p['nom'] for p in rechercher_produits('sac en')], ['Sac en cuir'])
+        self.assertEqual([c['nom'] for c in rechercher_clients('awa d')], ['Awa Diallo'])
+
+    def test_recherche_clients(self):
+        self.assertEqual([c['nom'] for c in rechercher_clients('awa')], ['Awa Diallo'])
+
+
+class CatalogueTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_user('caissier', password='x'))
+        self.produit = Produit.objects.create(nom='Sac', prix=25, stock=4)
+        self.autre = Produit.objects.create(nom='Pagne', prix=10, stock=8)
+        self.url = reverse('vente:catalogue_produits')
+
+    def test_etag_et_delta(self):
+        reponse = self.client.get(self.url)
+        donnees = reponse.json()
+        self.assertTrue(donnees['complet'])
+        self.assertEqual(donnees['produits'][0], [self.produit.pk, 'Sac', '25.00', 4])
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=reponse['ETag']).status_code, 304)
+
+        # Seuls les produits modifiés (hors fenêtre de recouvrement) sont renvoyés
+        Produit.objects.filter(pk=self.autre.pk).update(version=F('version') - 2 * FENETRE_MS)
+        version = self.client.get(self.url).json()['version']
+        self.produit.decrementer_stock(1)
+        reponse = self.client.get(self.url, {'depuis': version}, HTTP_IF_NONE_MATCH=reponse['ETag'])
+        self.assertEqual(reponse.status_code, 200)
+        delta = reponse.json()
+        self.assertFalse(delta['complet'])
+        self.assertGreater(delta['version'], version)
+        self.assertEqual([p[0] for p in delta['produits']], [self.produit.pk])
+
+    def test_validation_dans_le_desordre(self):
+        reponse = self.client.get(self.url)
+        # Transaction horodatée avant la dernière version mais validée après :
+        # le maximum des versions ne bouge pas, l'ETag si
+        self.autre.prix = 12
+        self.autre.save()
+        version = reponse.json()['version']
+        Produit.objects.filter(pk=self.autre.pk).update(version=version)
+        self.assertEqual(self.client.get(self.url).json()['version'], version)
+        reponse = self.client.get(self.url, HTTP_IF_NONE_MATCH=reponse['ETag'])
+        self.assertEqual(reponse.status_code, 200)
+        self.assertIn([self.autre.pk, 'Pagne', '12.00', 8], reponse.json()['produits'])
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=reponse['ETag']).status_code, 304)
+
+    def test_suppression_renvoie_le_catalogue_complet(self):
+        version = self.client.get(self.url).json()['version']
+        self.autre.delete()
+        donnees = self.client.get(self.url, {'depuis': version}).json()
+        self.assertTrue(donnees['complet'])
+        self.assertEqual([p[0] for p in donnees['produits']], [self.produit.pk])
+
+    def test_authentification(self):
+        self.client.logout()
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+
+
+class ImportCsvTests(TestCase):
+    def _importer(self, contenu, type_import='produits', **options):
+        return importer_fichier_csv(io.StringIO(contenu), type_import, **options)
+
+    def test_creation_mise_a_jour_et_erreurs(self):
+        existant = Produit.objects.create(nom='Sac', prix=25, stock=4)
+        MouvementStock.objects.create(produit=existant, quantite=4, type_mouvement=MouvementStock.INVENTAIRE)
+        resultat = self._importer(
+            'nom;prix;stock\n'
+            'Sac;30.00;10\n'
+            'Pagne;12.50;3\n'
+            'Panier;abc;2\n'
+            ';5;1\n'
+            'Natte;8;0\n',
+            taille_lot=2,
+        )
+        self.assertEqual((resultat.lignes, resultat.crees, resultat.mis_a_jour, resultat.rejetees), (5, 2, 1, 2))
+        self.assertEqual([erreur['ligne'] for erreur in resultat.erreurs], [4, 5])
+        existant.refresh_from_db()
+        self.assertEqual((existant.prix, existant.stock), (30, 10))
+        # Colonne absente : valeur par défaut du modèle
+        self.assertEqual(Produit.objects.get(nom='Natte').seuil_alerte, 5)
+        self.assertIn('Pagne', [p['nom'] for p in rechercher_produits('pag')])
+        # Le trigger d'indexation suspendu pendant l'import est rétabli
+        Produit.objects.create(nom='Pantalon', prix=20)
+        self.assertIn('Pantalon', [p['nom'] for p in rechercher_produits('pant')])
+
+        # Le journal suit les stocks importés : inventaire à la création, ajustement à la mise à jour
+        ecarts = list(verifier_stock())
+        self.assertEqual(ecarts, [])
+        self.assertTrue(MouvementStock.objects.filter(
+            produit=existant, type_mouvement=MouvementStock.AJUSTEMENT, quantite=6
+        ).exists())
+
+    def test_creation_impossible_sans_colonne_requise(self):
+        Client.objects.create(nom='Awa')
+        Produit.objects.create(nom='Sac', prix=25, stock=4)
+        resultat = self._importer('nom,stock\nSac,7\nPagne,3\n')
+        self.assertEqual((resultat.crees, resultat.mis_a_jour, resultat.rejetees), (0, 1, 1))
+        self.assertIn('prix', resultat.erreurs[0]['erreurs'][0])
+
+        resultat = self._importer('nom,telephone\nAwa,0700\nMoussa,0800\n', 'clients')
+        self.assertEqual((resultat.crees, resultat.mis_a_jour), (1, 1))
+        self.assertEqual(Client.objects.get(nom='Awa').telephone, '0700')
+
+    def test_valeur_hors_bornes_rejetee_par_ligne(self):
+        resultat = self._importer('nom,prix,stock\nSac,10,99999999999999999999\nPagne,12,3\nNatte,8,-1\n')
+        self.assertEqual((resultat.crees, resultat.rejetees), (1, 2))
+        self.assertEqual([erreur['ligne'] for erreur in resultat.erreurs], [2, 4])
+        self.assertTrue(resultat.erreurs[0]['erreurs'][0].startswith('stock'))
+        self.assertEqual(list(Produit.objects.values_list('nom', flat=True)), ['Pagne'])
+
+    def test_commande(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as fichier:
+            fichier.write('nom,prix\nSac,10\nSac,12\n')
+        self.addCleanup(os.remove, fichier.name)
+        sortie = io.StringIO()
+        call_command('import_csv', 'produits', fichier.name, stdout=sortie)
+        self.assertIn('1 créé(s)', sortie.getvalue())
+        self.assertEqual(Produit.objects.get().prix, 12)
+
+
+class ExportLignesTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_user('comptable', password='x'))
+        awa = Client.objects.create(nom='Awa & fils')
+        sac = Produit.objects.create(nom='Sac', prix=25, stock=10)
+        hier = timezone.now() - timedelta(days=1)
+        self.vente = Vente.objects.create(client=awa, date_vente=hier)
+        LigneVente.objects.create(vente=self.vente, produit=sac, quantite=2, prix_unitaire='25.00')
+        autre = Vente.objects.create(date_vente=hier - timedelta(days=5))
+        LigneVente.objects.create(vente=autre, produit=sac, quantite=1, prix_unitaire='20.00')
+        self.url = reverse('vente:exporter_lignes_ventes')
+        self.depuis = {'date_from': f'{timezone.localdate(hier):%Y-%m-%d}'}
+
+    def test_csv_filtre(self):
+        reponse = self.client.get(self.url, self.depuis)
+        contenu = b''.join(reponse.streaming_content).decode('utf-8-sig')
+        lignes = list(csv.reader(io.StringIO(contenu)))
+        self.assertEqual(lignes[0], ['vente', 'date', 'client', 'produit', 'quantite', 'prix_unitaire', 'total_ligne'])
+        self.assertEqual(len(lignes), 2)
+        self.assertEqual(lignes[1][0], str(self.vente.pk))
+        self.assertEqual(lignes[1][2:], ['Awa & fils', 'Sac', '2', '25.00', '50.00'])
+
+    def test_xlsx(self):
+        reponse = self.client.get(self.url, {'format': 'xlsx'})
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(reponse.streaming_content)))
+        self.assertIsNone(archive.testzip())
+        feuille = archive.read('xl/worksheets/sheet1.xml').decode()
+        self.assertEqual(feuille.count('<row>'), 3)
+        self.assertIn('Awa &amp; fils', feuille)
+        self.assertIn('<c><v>50.00</v></c>', feuille)
+
+
+class ProfilBaseTests(TestCase):
+    def test_pragmas_sqlite_appliques_a_la_connexion(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('SQLite uniquement')
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], settings.VENTE_SQLITE_PRAGMAS['busy_timeout'])
+
+    def test_journal_wal_par_etape_explicite(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('SQLite uniquement')
+        with tempfile.TemporaryDirectory() as dossier:
+            chemin = os.path.join(dossier, 'base.sqlite3')
+
+            def ouvrir():
+                base = connections['default'].__class__({**connection.settings_dict, 'NAME': chemin}, alias='fichier')
+                connections['fichier'] = base
+                return base
+
+            def lire(base, pragma):
+                with base.cursor() as cursor:
+                    cursor.execute(f'PRAGMA {pragma}')
+                    return cursor.fetchone()[0]
+
+            try:
+                # Ouvrir une connexion ne change pas le mode de journal du fichier
+                base = ouvrir()
+                self.assertEqual(lire(base, 'journal_mode'), 'delete')
+                self.assertEqual(lire(base, 'synchronous'), 2)  # FULL
+                self.assertFalse(os.path.exists(chemin + '-wal'))
+                base.close()
+
+                call_command('activer_wal', database='fichier', stdout=io.StringIO())
+                base = ouvrir()
+                self.assertEqual(lire(base, 'journal_mode'), 'wal')
+                self.assertEqual(lire(base, 'synchronous'), 1)  # NORMAL
+                base.close()
+
+                call_command('activer_wal', '--desactiver', database='fichier', stdout=io.StringIO())
+                base = ouvrir()
+                self.assertEqual(lire(base, 'journal_mode'), 'delete')
+                base.close()
+            finally:
+                del connections['fichier']
+
+
+# La base principale tient lieu de réplique : on vérifie le choix de la base
+@override_settings(VENTE_REPLICA_ALIAS='default', VENTE_REPLICA_RETARD_MAX=5)
+class ReplicaTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(User.objects.create_user('caissier', password='x'))
+
+    def retard(self, secondes):
+        cache.set('vente:retard_replica:default', {'retard': secondes})
+
+    def test_vues_de_lecture_sur_replica_si_assez_a_jour(self):
+        self.retard(2)
+        self.assertEqual(self.client.get(reverse('vente:tableau_bord')).wsgi_request.base_lecture, 'default')
+        self.retard(10)
+        self.assertIsNone(self.client.get(reverse('vente:clients_achetes')).wsgi_request.base_lecture)
+
+    def test_lecture_de_ses_ecritures_apres_redirection(self):
+        self.retard(1)
+        reponse = self.client.post(reverse('vente:ajouter_client'), {'nom': 'Awa', 'telephone': '770000000'}, follow=True)
+        self.assertIn(COOKIE_ECRITURE, reponse.client.cookies)
+        # La réplique n'a pas rattrapé l'écriture : la liste relit la base principale
+        self.assertIsNone(reponse.wsgi_request.base_lecture)
+        self.retard(0)
+        self.assertEqual(self.client.get(reverse('vente:liste_clients')).wsgi_request.base_lecture, 'default')
+
+    def test_routeur(self):
+        routeur = RouteurReplica()
+        self.retard(0)
+        requete = RequestFactory().get('/')
+        with lecture_sur_replica(requete):
+            self.assertEqual(routeur.db_for_read(Produit), 'default')
+        self.assertIsNone(routeur.db_for_read(Produit))
+        self.assertEqual(routeur.db_for_write(Produit), 'default')
+
+    def test_retard_copie_sqlite(self):
+        with tempfile.TemporaryDirectory() as dossier:
+            principale, copie = os.path.join(dossier, 'a.sqlite3'), os.path.join(dossier, 'b.sqlite3')
+            for chemin in (principale, copie):
+                open(chemin, 'w').close()
+            maintenant = time.time()
+            os.utime(principale, (maintenant - 60, maintenant - 60))
+            os.utime(copie, (maintenant - 30, maintenant - 30))
+            self.assertEqual(retard_copie_sqlite(principale, copie), 0)
+            os.utime(principale, (maintenant, maintenant))
+            self.assertGreaterEqual(retard_copie_sqlite(principale, copie), 30)
+            self.assertIsNone(retard_copie_sqlite(principale, os.path.join(dossier, 'absente.sqlite3')))
+
+
+class MetriquesTests(TestCase):
+    def setUp(self):
+        reinitialiser_metriques()
+        self.addCleanup(reinitialiser_metriques)
+        self.client.force_login(User.objects.create_user('caissier', password='x'))
+
+    def test_histogrammes_par_vue(self):
+        self.client.get(reverse('vente:liste_ventes'))
+        texte = self.client.get(reverse('vente:metriques')).content.decode()
+        self.assertIn('# TYPE vente_requete_sql_nombre histogram', texte)
+        self.assertIn('vente_requete_duree_secondes_count{vue="vente:liste_ventes"} 1', texte)
+        self.assertIn('vente_requete_sql_nombre_bucket{vue="vente:liste_ventes",le="+Inf"} 1', texte)
+        gabarits = next(
+            ligne for ligne in texte.splitlines()
+            if ligne.startswith('vente_requete_gabarits_duree_secondes_sum{vue="vente:liste_ventes"}')
+        )
+        self.assertGreater(float(gabarits.split()[-1]), 0)
+
+    def test_requetes_sql_repetees(self):
+        mesure = MesureRequete()
+        with connection.execute_wrapper(mesure):
+            for pk in (1, 1, 2):
+                list(Produit.objects.filter(pk=pk))
+        self.assertEqual((mesure.sql_nombre, mesure.doublons, len(mesure.instructions)), (3, 1, 1))
+
+    @override_settings(VENTE_REQUETE_LENTE_MS=0)
+    def test_requete_lente_journalisee(self):
+        with self.assertLogs('vente.performances', 'WARNING') as journal:
+            self.client.get(reverse('vente:liste_clients'))
+        self.assertIn('vente:liste_clients', journal.output[0])
+        self.assertIn('SELECT', journal.output[0])
+
+    @override_settings(VENTE_METRIQUES_JETONS=['jeton-metriques'])
+    def test_jeton_requis_si_configure(self):
+        self.assertEqual(self.client.get(reverse('vente:metriques')).status_code, 401)
+        reponse = self.client.get(reverse('vente:metriques'), HTTP_AUTHORIZATION='Bearer jeton-metriques')
+        self.assertEqual(reponse.status_code, 200)
+
+
+class SeedVentesTests(TestCase):
+    def generer(self):
+        call_command(
+            'seed_ventes', '--vider', '--clients', '20', '--produits', '15', '--ventes', '300',
+            '--jours', '60', '--fin', '2026-03-31', '--batch-size', '70', stdout=io.StringIO(),
+        )
+        return list(Vente.objects.order_by('id').values_list('date_vente', 'client__nom', 'total'))
+
+    def test_jeu_coherent_et_reproductible(self):
+        premier = self.generer()
+        self.assertEqual(len(premier), 300)
+        self.assertEqual(Produit.objects.count(), 15)
+        # Total des ventes = somme des lignes ; journal de stock = stock courant
+        sommes = dict(
+            LigneVente.objects.values_list('vente_id').annotate(s=Sum(F('quantite') * F('prix_unitaire'))).order_by()
+        )
+        self.assertTrue(all(vente.total == sommes[vente.pk] for vente in Vente.objects.all()))
+        self.assertEqual(list(verifier_stock()), [])
+        self.assertEqual(StatJour.objects.aggregate(n=Sum('nb_ventes'))['n'], 300)
+        self.assertEqual(self.generer(), premier)
+        # Séquence recalée après les id explicites
+        dernier = Vente.objects.order_by('-pk')[0].pk
+        self.assertEqual(Vente.objects.create().pk, dernier + 1)
+
+
+class BenchVenteTests(TestCase):
+    def test_resultats_et_comparaison(self):
+        call_command(
+            'seed_ventes', '--clients', '10', '--produits', '8', '--ventes', '50', '--jours', '10',
+            stdout=io.StringIO(),
+        )
+        with tempfile.TemporaryDirectory() as dossier:
+            sortie = os.path.join(dossier, 'resultats.json')
+            options = ['--base-actuelle', '--familles', 'micro', 'pages', '--repetitions', '1', '--sortie', sortie]
+            call_command('bench_vente', *options, stdout=io.StringIO())
+            with open(sortie) as fichier:
+                rapport = json.load(fichier)
+            resultats = rapport['resultats']
+            self.assertIn('micro:calculer_total', resultats)
+            self.assertIn('page:tableau_bord', resultats)
+            self.assertIn('page:exporter_ventes_pdf', resultats)
+            self.assertTrue(all(mesure['iterations'] == 1 for mesure in resultats.values()))
+
+            # Référence au même nombre de requêtes, durées largement tolérées : pas de régression
+            call_command(
+                'bench_vente', *options, '--reference', sortie, '--tolerance', '1000',
+                stdout=io.StringIO(),
+            )
+            # Une requête SQL de plus qu'à la référence : régression
+            resultats['page:tableau_bord']['requetes'] -= 1
+            with open(sortie, 'w') as fichier:
+                json.dump(rapport, fichier)
+            with self.assertRaises(CommandError):
+                call_command(
+                    'bench_vente', *options, '--sortie', os.path.join(dossier, 'autre.json'),
+                    '--reference', sortie, '--tolerance', '1000', stdout=io.StringIO(),
+                )
+
+
+class DemarrageTests(SimpleTestCase):
+    # Import des vues, des URLs et d'une commande, tel que le paie chaque worker
+    # (environ 50 ms ; plus de 150 ms avec reportlab chargé d'office)
+    BUDGET_IMPORT_S = 0.5
+
+    def test_reportlab_charge_a_la_demande(self):
+        resultat = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c',
+             'import django; django.setup(); import vente.urls, vente.jobs; '
+             'import vente.management.commands.remove_duplicates'],
+            cwd=settings.BASE_DIR, env={**os.environ, 'DJANGO_SETTINGS_MODULE': 'gestion_vente.settings'},
+            capture_output=True, text=True, check=True,
+        )
+        # Lignes "import time: propre | cumulé (µs) | module"
+        cumuls = {}
+        for ligne in resultat.stderr.splitlines():
+            if ligne.startswith('import time:'):
+                _, cumul, module = ligne.split('|')
+                cumuls[module.strip()] = cumul.strip()
+        self.assertIn('vente.reports', cumuls)
+        self.assertFalse([module for module in cumuls if module.startswith('reportlab')])
+        self.assertLess(int(cumuls['vente.urls']) / 1e6, self.BUDGET_IMPORT_S)
+
+
+class VuesAsyncTests(TransactionTestCase):
+    """Hors transaction de test : les requêtes en parallèle voient les données validées"""
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        reinitialiser_metriques()
+        self.addCleanup(reinitialiser_metriques)
+        self.utilisateur = User.objects.create_user('caissier', password='x')
+        produit = Produit.objects.create(nom='Riz', prix=Decimal('12.50'), stock=40, seuil_alerte=50)
+        client = Client.objects.create(nom='Awa')
+        passer_vente(Vente(client=client), [{'produit': produit, 'quantite': 3}])
+        passer_vente(Vente(), [{'produit': produit, 'quantite': 1}])
+
+    def test_statistiques_calculees_en_parallele(self):
+        maintenant = timezone.now()
+        self.assertEqual(
+            async_to_sync(DashboardStats(maintenant).acalculer)(),
+            DashboardStats(maintenant).calculer(),
+        )
+        # Chaque requête dans un thread du pool, pas dans celui de l'appelant
+        threads = async_to_sync(en_parallele)([threading.get_ident, threading.get_ident])
+        self.assertNotIn(threading.get_ident(), threads)
+
+    async def test_pages_servies_par_les_vues_async(self):
+        await self.async_client.aforce_login(self.utilisateur)
+        with vues_async():
+            for nom in ('tableau_bord', 'liste_produits', 'liste_clients', 'liste_ventes', 'clients_achetes'):
+                reponse = await self.async_client.get(reverse(f'vente:{nom}'))
+                self.assertEqual(reponse.status_code, 200, nom)
+            reponse = await self.async_client.get(reverse('vente:exporter_ventes_pdf'))
+            self.assertTrue(b''.join([morceau async for morceau in reponse]).startswith(b'%PDF'))
+            # Export en flux async : pas de lecture complète du générateur avant l'envoi
+            for params, debut in (({}, '\ufeffvente,date'.encode()), ({'format': 'xlsx'}, b'PK')):
+                reponse = await self.async_client.get(reverse('vente:exporter_lignes_ventes'), params)
+                self.assertTrue(reponse.is_async)
+                contenu = b''.join([morceau async for morceau in reponse])
+                self.assertTrue(contenu.startswith(debut))
+                if not params:
+                    self.assertEqual(len(contenu.splitlines()), 3)
+            self.assertEqual(resolve(reverse('vente:tableau_bord')).func.__name__, 'tableau_bord_async')
+        with vues_async(False):
+            self.assertEqual(resolve(reverse('vente:tableau_bord')).func.__name__, 'tableau_bord')
+        # Les requêtes faites dans les threads du pool sont comptées pour la vue
+        texte = exposition()
+        ligne = next(
+            ligne for ligne in texte.splitlines()
+            if ligne.startswith('vente_requete_sql_nombre_sum{vue="vente:tableau_bord"}')
+        )
+        self.assertGreaterEqual(float(ligne.split()[-1]), len(DashboardStats().requetes()))
+
+
+@skipUnless(NUMPY, 'numpy non installé')
+class PrevisionsTests(TestCase):
+    def setUp(self):
+        self.regulier = Produit.objects.create(nom='Riz', prix=10, stock=20)
+        self.nouveau = Produit.objects.create(nom='Huile', prix=10, stock=0)
+        self.invendu = Produit.objects.create(nom='Sel', prix=10, stock=4)
+        hier = timezone.localdate() - timedelta(days=1)
+        # 2 unités par jour depuis 60 jours ; 1 par jour depuis 10 jours
+        StatProduitJour.objects.bulk_create(
+            [StatProduitJour(date=hier - timedelta(days=i), produit=self.regulier, quantite=2) for i in range(60)]
+            + [StatProduitJour(date=hier - timedelta(days=i), produit=self.nouveau, quantite=1) for i in range(10)]
+        )
+
+    def previsions(self, *options):
+        sortie = io.StringIO()
+        call_command('refresh_forecasts', *options, stdout=sortie)
+        self.assertIn('3 produits', sortie.getvalue())
+        return {p.produit_id: p for p in PrevisionStock.objects.all()}
+
+    def test_demande_rupture_et_quantite_a_commander(self):
+        for methode in ('lissage', 'moyenne'):
+            with self.subTest(methode=methode):
+                previsions = self.previsions('--methode', methode, '--delai', '7', '--couverture', '14')
+                regulier = previsions[self.regulier.pk]
+                self.assertAlmostEqual(regulier.demande_jour, 2)
+                self.assertAlmostEqual(regulier.jours_avant_rupture, 10)
+                self.assertEqual(regulier.date_rupture, timezone.localdate() + timedelta(days=10))
+                # 21 jours à 2 unités, demande sans écart : pas de stock de sécurité
+                self.assertEqual(regulier.quantite_a_commander, 42 - 20)
+                # Historique court : demande non diluée par les jours d'avant la première vente
+                nouveau = previsions[self.nouveau.pk]
+                self.assertAlmostEqual(nouveau.demande_jour, 1)
+                self.assertEqual(nouveau.jours_avant_rupture, 0)
+                invendu = previsions[self.invendu.pk]
+                self.assertEqual(invendu.demande_jour, 0)
+                self.assertIsNone(invendu.jours_avant_rupture)
+                self.assertEqual(invendu.quantite_a_commander, 0)
+
+        ruptures = DashboardStats().calculer()['ruptures_prevues']
+        self.assertEqual([r['produit__nom'] for r in ruptures], ['Huile', 'Riz'])
+
+    def test_historique_d_un_produit_hors_catalogue_ignore(self):
+        import numpy as np
+        from .previsions import indexer_historique
+        # Produits 2 et 9 créés et vendus après la lecture du catalogue
+        index, jours, quantites = indexer_historique(
+            np.array([1, 3, 5]), np.array([1, 9, 3, 2, 5]), np.arange(5), np.arange(5.0)
+        )
+        self.assertEqual(index.tolist(), [0, 1, 2])
+        self.assertEqual(jours.tolist(), [0, 2, 4])
+        self.assertEqual(quantites.tolist(), [0.0, 2.0, 4.0])
+
+
+@skipUnless(NUMPY, 'numpy non installé')
+class ProfilClientTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_user('caissier', password='x'))
+        maintenant = timezone.now()
+        self.awa, self.binta, self.chris = (Client.objects.create(nom=nom) for nom in ('Awa', 'Binta', 'Chris'))
+        Vente.objects.bulk_create(
+            [Vente(client=self.awa, total=100, date_vente=maintenant - timedelta(days=i)) for i in range(3)]
+            + [Vente(client=self.binta, total=20, date_vente=maintenant - timedelta(days=200))]
+            + [Vente(client=self.chris, total=50, date_vente=maintenant - timedelta(days=90 + i)) for i in range(2)]
+            + [Vente(total=999, date_vente=maintenant)]
+        )
+
+    def rafraichir(self, *options):
+        call_command('refresh_customer_analytics', *options, stdout=io.StringIO())
+        return {p.client_id: p for p in ProfilClient.objects.all()}
+
+    def test_migration_identique_au_recalcul_complet(self):
+        from django.apps import apps
+        import_module('vente.migrations.0011_profils_clients').remplir_profils(apps, None)
+        migres = list(ProfilClient.objects.order_by('pk').values())
+        self.assertEqual(len(migres), 3)
+        self.rafraichir('--complet')
+        self.assertEqual(list(ProfilClient.objects.order_by('pk').values()), migres)
+
+    def test_notes_par_rang(self):
+        from .analyse_clients import noter
+        self.assertEqual(noter([5, 1, 4, 2, 3]).tolist(), [5, 1, 4, 2, 3])
+        self.assertEqual(noter([7, 7, 7]).tolist(), [3, 3, 3])
+
+    def test_profils_incrementaux(self):
+        profils = self.rafraichir()
+        self.assertEqual(set(profils), {self.awa.pk, self.binta.pk, self.chris.pk})
+        awa = profils[self.awa.pk]
+        self.assertEqual((awa.nb_achats, awa.montant_total), (3, Decimal('300.00')))
+        self.assertEqual((awa.score_recence, awa.score_frequence, awa.score_montant), (5, 5, 5))
+        self.assertEqual(awa.segment, ProfilClient.CHAMPION)
+        self.assertLess(awa.premier_achat, awa.dernier_achat)
+        self.assertEqual(profils[self.binta.pk].segment, ProfilClient.PERDU)
+
+        # Liste et PDF sans filtre : lus dans les profils, par montant décroissant
+        with self.assertNumQueries(1):
+            clients = [(c.nom, c.nombre_achats, c.montant_total, c.segment) for c in clients_avec_achats()]
+        self.assertEqual(clients, [
+            ('Awa', 3, Decimal('300.00'), ProfilClient.CHAMPION),
+            ('Chris', 2, Decimal('100.00'), ProfilClient.PROMETTEUR),
+            ('Binta', 1, Decimal('20.00'), ProfilClient.PERDU),
+        ])
+        self.assertContains(self.client.get(reverse('vente:clients_achetes')), 'Champion')
+
+        # Premier achat après le rafraîchissement : listé, cumuls calculés sur ses ventes
+        dina = Client.objects.create(nom='Dina')
+        Vente.objects.create(client=dina, total=40)
+        Vente.objects.create(client=dina, total=30)
+        Vente.objects.create(client=self.awa, total=10)
+        with self.assertNumQueries(1):
+            clients = {c.nom: (c.nombre_achats, c.montant_total, c.segment) for c in clients_avec_achats()}
+        self.assertEqual(clients['Dina'], (2, Decimal('70.00'), None))
+        self.assertEqual(clients['Awa'], (3, Decimal('300.00'), ProfilClient.CHAMPION))
+        self.assertEqual(len(clients), 4)
+        self.assertContains(self.client.get(reverse('vente:clients_achetes')), 'Dina')
+        self.rafraichir()
+
+        # Seules les nouvelles ventes sont lues
+        Vente.objects.create(client=self.binta, total=500)
+        sortie = io.StringIO()
+        call_command('refresh_customer_analytics', stdout=sortie)
+        self.assertIn('1 nouvelle(s) vente(s)', sortie.getvalue())
+        binta = ProfilClient.objects.get(pk=self.binta.pk)
+        self.assertEqual((binta.nb_achats, binta.montant_total), (2, Decimal('520.00')))
+        incremental = list(ProfilClient.objects.order_by('pk').values())
+        self.rafraichir('--complet')
+        self.assertEqual(list(ProfilClient.objects.order_by('pk').values()), incremental)
+
+
+class RapportJobTests(TestCase):
+    def setUp(self):
+        self.dossier = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dossier.cleanup)
+        reglages = override_settings(RAPPORTS_DIR=self.dossier.name)
+        reglages.enable()
+        self.addCleanup(reglages.disable)
+        # Validée comme en production : le travail différé est programmé une fois par transaction
+        with self.captureOnCommitCallbacks(execute=True):
+            self.awa = Client.objects.create(nom='Awa')
+
+    def test_reutilisation_tant_que_les_donnees_ne_changent_pas(self):
+        job = demander_rapport(RapportJob.TYPE_CLIENTS)
+        self.assertEqual(demander_rapport(RapportJob.TYPE_CLIENTS).pk, job.pk)
+        self.assertEqual(reserver_jobs(5), [job.pk])
+        self.assertEqual(reserver_jobs(5), [])
+        executer_job(job.pk)
+        job.refresh_from_db()
+        self.assertEqual(job.statut, RapportJob.TERMINE)
+        self.assertEqual(demander_rapport(RapportJob.TYPE_CLIENTS).pk, job.pk)
+        # Filtres différents : autre rapport
+        self.assertNotEqual(demander_rapport(RapportJob.TYPE_CLIENTS, {'client': self.awa.pk}).pk, job.pk)
+
+    def test_modification_invalide_pour_tous_les_processus(self):
+        job = demander_rapport(RapportJob.TYPE_CLIENTS)
+        version = version_donnees()
+        # Ni ajout ni suppression : seule la version enregistrée en base change
+        with self.captureOnCommitCallbacks(execute=True):
+            Client.objects.filter(pk=self.awa.pk).update(nom='Awa Diop')
+            self.awa.save()
+        # Le cache local d'un autre processus ne connaît pas la modification
+        cache.clear()
+        self.assertNotEqual(version_donnees(), version)
+        self.assertNotEqual(demander_rapport(RapportJob.TYPE_CLIENTS).pk, job.pk)
+
+        # Lue en une requête d'une ligne, sans compter les tables
+        with self.assertNumQueries(1):
+            version = version_donnees()
+        # Écritures groupées sans signal (API des caisses)
+        produit = Produit.objects.create(nom='Savon', prix=10, stock=3)
+        version = version_donnees()
+        with self.captureOnCommitCallbacks(execute=True):
+            importer_ventes([{'lignes': [{'produit': produit.pk, 'quantite': 1}]}])
+        self.assertNotEqual(version_donnees(), version)
+
+    def test_echec_sans_fichier_temporaire_et_nettoyage(self):
+        job = RapportJob.objects.create(type_rapport='inconnu', cle_cache='cle-erreur', statut=RapportJob.EN_COURS)
+        self.assertEqual(executer_job(job.pk), (job.pk, RapportJob.ERREUR))
+        self.assertEqual(os.listdir(self.dossier.name), [])
+
+        ancien, recent = (os.path.join(self.dossier.name, f'{nom}.pdf') for nom in ('ancien', 'recent'))
+        for chemin in (ancien, recent):
+            open(chemin, 'wb').close()
+        il_y_a = time.time() - settings.RAPPORTS_DUREE_CONSERVATION - 60
+        os.utime(ancien, (il_y_a, il_y_a))
+        self.assertEqual(nettoyer_rapports(), 1)
+        self.assertEqual(os.listdir(self.dossier.name), ['recent.pdf'])
+
+    def test_job_bloque_remis_en_attente(self):
+        job = demander_rapport(RapportJob.TYPE_CLIENTS)
+        self.assertEqual(reserver_jobs(5), [job.pk])
+        # Worker arrêté brutalement : le job reste "en cours"
+        self.assertEqual(demander_rapport(RapportJob.TYPE_CLIENTS).pk, job.pk)
+        self.assertEqual(reserver_jobs(5), [])
+        RapportJob.objects.filter(pk=job.pk).update(
+            demarre_le=timezone.now() - timedelta(seconds=settings.RAPPORTS_DELAI_BLOCAGE + 1)
+        )
+        self.assertEqual(reserver_jobs(5), [job.pk])
+        executer_job(job.pk)
+        job.refresh_from_db()
+        self.assertEqual(job.statut, RapportJob.TERMINE)
+
+
+class StatistiquesTests(TestCase):
+    def setUp(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.sac = Produit.objects.create(nom='Sac', prix=Decimal('25.00'), stock=100)
+            self.pagne = Produit.objects.create(nom='Pagne', prix=Decimal('12.50'), stock=100)
+            self.awa = Client.objects.create(nom='Awa')
+
+    def vendre(self, jours, client=None, **quantites):
+        produits = {'sac': self.sac, 'pagne': self.pagne}
+        with self.captureOnCommitCallbacks(execute=True):
+            passer_vente(
+                Vente(client=client, date_vente=timezone.now() - timedelta(days=jours)),
+                [{'produit': produits[nom], 'quantite': quantite} for nom, quantite in quantites.items()],
+            )
+        return Vente.objects.latest('id')
+
+    def agregats(self):
+        return [
+            list(modele.objects.order_by(*cles).values_list(*cles, 'nb_ventes', 'chiffre_affaires', 'quantite'))
+            for modele, cles in (
+                (StatJour, ['date']), (StatMois, ['annee', 'mois']),
+                (StatProduitJour, ['date', 'produit_id']), (StatClientJour, ['date', 'client_id']),
+            )
+        ]
+
+    def assertAgregatsExacts(self):
+        incrementaux = self.agregats()
+        reconstruire_statistiques()
+        self.assertEqual(incrementaux, self.agregats())
+
+    def test_increments_et_suppressions_egaux_a_la_reconstruction(self):
+        self.vendre(0, self.awa, sac=2, pagne=1)
+        vente = self.vendre(0, sac=1)
+        self.vendre(40, self.awa, pagne=3)
+        ancienne = self.vendre(40, self.awa, sac=1, pagne=1)
+        self.assertAgregatsExacts()
+        self.assertEqual(StatJour.objects.get(date=timezone.localdate()).nb_ventes, 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            ancienne.lignes.get(produit=self.pagne).delete()
+        self.assertAgregatsExacts()
+        with self.captureOnCommitCallbacks(execute=True):
+            vente.delete()
+            ancienne.delete()
+        self.assertAgregatsExacts()
+        self.assertEqual(StatJour.objects.get(date=timezone.localdate()).nb_ventes, 1)
+        self.assertEqual(StatMois.objects.aggregate(n=Sum('nb_ventes'))['n'], 2)
+
+
+class TableauBordCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.produits = Produit.objects.bulk_create([
+            Produit(nom=f'Produit {i}', prix=10, stock=i, seuil_alerte=10) for i in range(7)
+        ])
+
+    def test_instantane_en_cache(self):
+        stats = DashboardStats.snapshot()
+        self.assertEqual(stats['produits_count'], 7)
+        # Liste complète, le gabarit n'en affiche que 5
+        self.assertEqual([p['stock'] for p in stats['produits_seuil']], list(range(7)))
+        self.assertEqual(stats['produits_seuil_count'], 7)
+        with self.assertNumQueries(0):
+            self.assertEqual(DashboardStats.snapshot(), stats)
+
+    def test_invalidation_une_fois_a_la_validation(self):
+        DashboardStats.snapshot()
+        version = version_donnees()
+        with self.captureOnCommitCallbacks(execute=True) as rappels:
+            for i in range(3):
+                Produit.objects.create(nom=f'Nouveau {i}', prix=10, stock=50)
+            Client.objects.create(nom='Awa')
+            # Rien n'est invalidé avant la validation
+            self.assertEqual(DashboardStats.snapshot()['produits_count'], 7)
+        self.assertEqual(len(rappels), 1)
+        stats = DashboardStats.snapshot()
+        self.assertEqual((stats['produits_count'], stats['clients_count']), (10, 1))
+        self.assertEqual(int(version_donnees()), int(version) + 1)
+
+    def test_transaction_annulee_sans_invalidation(self):
+        DashboardStats.snapshot()
+        with self.captureOnCommitCallbacks(execute=True) as rappels:
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                Produit.objects.create(nom='Annulé', prix=10, stock=1)
+                raise RuntimeError
+            Client.objects.create(nom='Awa')
+        self.assertEqual(len(rappels), 1)
+        self.assertEqual(DashboardStats.snapshot()['clients_count'], 1)
+
+
+class RapportVentesPdfTests(TestCase):
+    def setUp(self):
+        from .reports import pdf
+        self.pdf = pdf
+        for nom, valeur in (('TAILLE_LOT_EXPORT', 20), ('LIGNES_PAR_TABLEAU', 10)):
+            self.addCleanup(setattr, pdf, nom, getattr(pdf, nom))
+            setattr(pdf, nom, valeur)
+        self.awa = Client.objects.create(nom='Awa')
+        self.autre = Client.objects.create(nom='Moussa')
+        self.produit = Produit.objects.create(nom='Sac', prix=25, stock=0)
+        self.maintenant = timezone.now()
+
+    def ajouter_ventes(self, client, nombre):
+        depart = Vente.objects.count()
+        ventes = Vente.objects.bulk_create([
+            Vente(client=client, total=25, date_vente=self.maintenant - timedelta(minutes=depart + i))
+            for i in range(nombre)
+        ])
+        LigneVente.objects.bulk_create([
+            LigneVente(vente=vente, produit=self.produit, quantite=1, prix_unitaire=25) for vente in ventes
+        ])
+        return {vente.pk for vente in ventes}
+
+    def generer(self):
+        """(PDF, ids des ventes des tableaux, flowables en attente au plus, nombre de requêtes)"""
+        suivi = {'ids': [], 'en_attente': 0}
+        flux = self.pdf.FluxFlowables
+        entete = list(self.pdf.styles.ENTETE_VENTES)
+
+        class FluxSuivi(flux):
+            def append(self, flowable):
+                valeurs = getattr(flowable, '_cellvalues', None)
+                if valeurs and valeurs[0] == entete:
+                    suivi['ids'].extend(int(ligne[0][1:]) for ligne in valeurs[1:])
+                super().append(flowable)
+                suivi['en_attente'] = max(suivi['en_attente'], list.__len__(self))
+
+        fichier = io.BytesIO()
+        self.pdf.FluxFlowables = FluxSuivi
+        try:
+            with CaptureQueriesContext(connection) as requetes:
+                self.pdf.generer_rapport_ventes(fichier, FiltreVentes(client=self.awa.pk))
+        finally:
+            self.pdf.FluxFlowables = flux
+        return fichier.getvalue(), suivi['ids'], suivi['en_attente'], len(requetes)
+
+    def test_export_filtre_par_lots(self):
+        attendues = self.ajouter_ventes(self.awa, 45)
+        self.ajouter_ventes(self.autre, 15)
+        contenu, ids, en_attente, requetes = self.generer()
+        self.assertTrue(contenu.startswith(b'%PDF-'))
+        self.assertTrue(contenu.rstrip().endswith(b'%%EOF'))
+        self.assertGreater(contenu.count(b'/Type /Page\n'), 1)
+        # Toutes les ventes filtrées, une seule fois, les plus récentes d'abord
+        self.assertEqual(len(ids), 45)
+        self.assertEqual(set(ids), attendues)
+        self.assertEqual(ids, list(
+            Vente.objects.filter(client=self.awa).order_by('-date_vente', '-id').values_list('id', flat=True)
+        ))
+
+        # Deux fois plus de ventes : deux requêtes de plus par lot, mémoire inchangée
+        self.ajouter_ventes(self.awa, 45)
+        _, ids_double, en_attente_double, requetes_double = self.generer()
+        self.assertEqual(len(ids_double), 90)
+        self.assertEqual(requetes_double - requetes, 2 * (5 - 3))
+        self.assertEqual(en_attente_double, en_attente)
+        self.assertLessEqual(en_attente, 2)
@@ -1,29 +1,54 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 
 app_name = 'vente'
 
+
+def _vue(vue):
+    """Variante async de la vue sous ASGI (VENTE_VUES_ASYNC, voir gestion_vente/asgi.py)"""
+    if settings.VENTE_VUES_ASYNC:
+        return getattr(views, f'{vue.__name__}_async')
+    return vue
+
+
 urlpatterns = [
-    path('', views.tableau_bord, name='tableau_bord'),
+    path('', _vue(views.tableau_bord), name='tableau_bord'),
 
     # Produits
-    path('produits/', views.liste_produits, name='liste_produits'),
+    path('produits/', _vue(views.liste_produits), name='liste_produits'),
     path('produits/ajouter/', views.ajouter_produit, name='ajouter_produit'),
     path('produits/modifier/<int:pk>/', views.modifier_produit, name='modifier_produit'),
     path('produits/supprimer/<int:pk>/', views.supprimer_produit, name='supprimer_produit'),
+    path('produits/recherche/', views.produits_autocomplete, name='produits_autocomplete'),
+    path('produits/catalogue/', views.catalogue_produits, name='catalogue_produits'),
 
     # Clients
-    path('clients/', views.liste_clients, name='liste_clients'),
+    path('clients/', _vue(views.liste_clients), name='liste_clients'),
     path('clients/ajouter/', views.ajouter_client, name='ajouter_client'),
     path('clients/modifier/<int:pk>/', views.modifier_client, name='modifier_client'),
     path('clients/supprimer/<int:pk>/', views.supprimer_client, name='supprimer_client'),
+    path('clients/recherche/', views.clients_autocomplete, name='clients_autocomplete'),
 
     # Ventes
-    path('ventes/', views.liste_ventes, name='liste_ventes'),
+    path('ventes/', _vue(views.liste_ventes), name='liste_ventes'),
     path('ventes/creer/', views.creer_vente, name='creer_vente'),
+
+    # Import CSV (produits, clients)
+    path('import/<str:type_import>/', views.importer_csv, name='importer_csv'),
+
+    # API
+    path('api/ventes/', views.api_importer_ventes, name='api_importer_ventes'),
     
     # Rapports
-    path('clients-achetes/', views.clients_ayant_achete, name='clients_achetes'),
-    path('export/clients-pdf/', views.exporter_clients_pdf, name='exporter_clients_pdf'),
-    path('export/ventes-pdf/', views.exporter_ventes_pdf, name='exporter_ventes_pdf'),
+    path('clients-achetes/', _vue(views.clients_ayant_achete), name='clients_achetes'),
+    path('export/clients-pdf/', _vue(views.exporter_clients_pdf), name='exporter_clients_pdf'),
+    path('export/ventes-pdf/', _vue(views.exporter_ventes_pdf), name='exporter_ventes_pdf'),
+    path('export/lignes-ventes/', _vue(views.exporter_lignes_ventes), name='exporter_lignes_ventes'),
+    path('rapports/<str:type_rapport>/demander/', views.demander_rapport_pdf, name='demander_rapport'),
+    path('rapports/<int:pk>/', views.statut_rapport, name='statut_rapport'),
+    path('rapports/<int:pk>/telecharger/', views.telecharger_rapport, name='telecharger_rapport'),
+
+    # Supervision (Prometheus)
+    path('metrics', views.metriques, name='metriques'),
 ]
@@ -2,127 +2,105 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.urls import reverse
 from django.contrib import messages
-from .models import Produit, Client, Vente, LigneVente
+from .models import Produit, Client, Vente, RapportJob, MouvementStock
+from .dashboard import DashboardStats
+from .services import passer_vente, StockInsuffisant
+from .ingestion import importer_ventes
+from .reports import clients_avec_achats, generer_rapport_clients, generer_rapport_ventes
+from .jobs import demander_rapport, chemin_rapport, NOMS_FICHIERS
+from .filtres import FiltreVentes
+from .stock import enregistrer_mouvement
+from .recherche import rechercher_produits, rechercher_clients
+from .catalogue import etat_actuel, instantane
+from .pagination import paginer_par_curseur
+from .exports import lignes_ventes, exporter_csv, exporter_xlsx
+from .import_csv import importer_fichier_csv, ImportInvalide, TYPES as TYPES_IMPORT
+from .replica import lecture_replica, lecture_sur_replica, alecture_sur_replica
+from .metriques import exposition
 from .forms import ProduitForm, ClientForm, VenteForm, LigneVenteFormSet
-from django.db.models import F, Sum, Count
+from asgiref.sync import sync_to_async
+from django.db import transaction
+from django.db.models import F
 from vente import models as vente_models
-from django.utils import timezone
-from datetime import timedelta
 import json
-from django.http import HttpResponse
-from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
-from reportlab.lib.pagesizes import letter, A4
-from reportlab.lib import colors
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, PageBreak
-from reportlab.lib.enums import TA_CENTER, TA_RIGHT, TA_LEFT
+from django.http import HttpResponse, JsonResponse, FileResponse, Http404, StreamingHttpResponse
+from django.conf import settings
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+import hmac
+from django.utils.cache import get_conditional_response, patch_cache_control
+from urllib.parse import urlencode
 import io
-from datetime import datetime
-    
+import tempfile
 
 
 # -----------------------
 # Dashboard
 # -----------------------
+# Les vues de lecture suivies d'une variante *_async sont servies par celle-ci
+# sous ASGI (VENTE_VUES_ASYNC, voir vente/urls.py) : les requêtes SQL et la
+# construction des PDF s'y font hors de la boucle d'événements.
+async def _en_thread(request, fonction, *args):
+    """
+    Termine une vue async dans un thread (ORM sync, gabarits, reportlab) ;
+    request.user reprend l'utilisateur déjà chargé par login_required.
+    """
+    request.user = await request.auser()
+    return await sync_to_async(fonction)(request, *args)
+
+def _contexte_tableau_bord(stats):
+    context = dict(stats)
+    context['ventes_par_jour'] = json.dumps(context['ventes_par_jour'])
+    context['ventes_par_mois'] = json.dumps(context['ventes_par_mois'])
+    return context
+
 @login_required
+@lecture_replica
 def tableau_bord(request):
-    # Statistiques de base (tous les temps)
-    produits_count = Produit.objects.count()
-    clients_count = Client.objects.count()
-    ventes_count = Vente.objects.count()
-    total_ca = sum([v.total for v in Vente.objects.all()])  # petit calcul
-    
-    # Statistiques des 24 dernières heures
-    date_24h = timezone.now() - timedelta(hours=24)
-    ventes_24h = Vente.objects.filter(date_vente__gte=date_24h)
-    ventes_count_24h = ventes_24h.count()
-    total_ca_24h = ventes_24h.aggregate(total=Sum('total'))['total'] or 0
-    produits_vendus_24h = ventes_24h.aggregate(total=Sum('lignes__quantite'))['total'] or 0
-    
-    # Statistiques de produits vendus (tous les temps)
-    produits_vendus = LigneVente.objects.aggregate(total=Sum('quantite'))['total'] or 0
-    
-    # Produits avec stock faible
-    produits_seuil = Produit.objects.filter(stock__lte=F('seuil_alerte')).order_by('stock')
-    
-    # Top 5 produits les plus vendus (24h)
-    top_produits = LigneVente.objects.filter(vente__date_vente__gte=date_24h).values('produit__nom').annotate(
-        quantite_totale=Sum('quantite')
-    ).order_by('-quantite_totale')[:5]
-    
-    # Top 5 clients (24h)
-    top_clients = Vente.objects.filter(date_vente__gte=date_24h).values('client__nom').annotate(
-        nb_achats=Count('id'),
-        montant_total=Sum('total')
-    ).filter(client__isnull=False).order_by('-montant_total')[:5]
-    
-    # Ventes des 7 derniers jours
-    date_debut = timezone.now() - timedelta(days=7)
-    ventes_7j = Vente.objects.filter(date_vente__gte=date_debut)
-    
-    # Données pour graphique (ventes par jour)
-    ventes_par_jour = {}
-    for i in range(7):
-        date = timezone.now() - timedelta(days=6-i)
-        date_str = date.strftime('%d/%m')
-        count = Vente.objects.filter(
-            date_vente__date=date.date()
-        ).aggregate(total=Sum('total'))['total'] or 0
-        ventes_par_jour[date_str] = float(count)
-    
-    # Ventes par mois (12 derniers mois)
-    ventes_par_mois = {}
-    for i in range(12):
-        date = timezone.now() - timedelta(days=30*i)
-        mois_str = date.strftime('%b %Y')
-        count = Vente.objects.filter(
-            date_vente__year=date.year,
-            date_vente__month=date.month
-        ).aggregate(total=Sum('total'))['total'] or 0
-        ventes_par_mois[mois_str] = float(count)
-    
-    context = {
-        'produits_count': produits_count,
-        'clients_count': clients_count,
-        'ventes_count': ventes_count,
-        'total_ca': total_ca,
-        'ventes_count_24h': ventes_count_24h,
-        'total_ca_24h': total_ca_24h,
-        'produits_vendus_24h': produits_vendus_24h,
-        'produits_vendus': produits_vendus,
-        'produits_seuil': produits_seuil,
-        'top_produits': top_produits,
-        'top_clients': top_clients,
-        'ventes_7j': ventes_7j.count(),
-        'ventes_par_jour': json.dumps(ventes_par_jour),
-        'ventes_par_mois': json.dumps(ventes_par_mois),
-        'produits_seuil_count': produits_seuil.count(),
-    }
-    return render(request, 'vente/dashboard.html', context)
+    # Statistiques calculées une fois puis servies depuis le cache
+    return render(request, 'vente/dashboard.html', _contexte_tableau_bord(DashboardStats.snapshot()))
+
+@login_required
+@lecture_replica
+async def tableau_bord_async(request):
+    # Sur un cache vide, les requêtes du calcul partent en parallèle
+    stats = await DashboardStats.asnapshot()
+    return await _en_thread(request, render, 'vente/dashboard.html', _contexte_tableau_bord(stats))
+
+def _querystring_pagination(request, filtre=None):
+    """Paramètres conservés par les liens de pagination (filtre, taille de page)"""
+    params = filtre.as_dict() if filtre else {}
+    if request.GET.get('taille'):
+        params['taille'] = request.GET['taille']
+    return urlencode(params)
 
 # -----------------------
 # Produits CRUD
 # -----------------------
 @login_required
 def liste_produits(request):
-    produits_list = Produit.objects.all().order_by('-id')
-    paginator = Paginator(produits_list, 5)  # 5 produits par page
-    page = request.GET.get('page')
-    try:
-        produits = paginator.page(page)
-    except PageNotAnInteger:
-        produits = paginator.page(1)
-    except EmptyPage:
-        produits = paginator.page(paginator.num_pages)
-    
-    total_produits = Produit.objects.count()
-    total_stock = Produit.objects.aggregate(total=Sum('stock'))['total'] or 0
+    with lecture_sur_replica(request):
+        stats = DashboardStats.snapshot()
+    return _page_produits(request, stats)
+
+@login_required
+async def liste_produits_async(request):
+    async with alecture_sur_replica(request):
+        stats = await DashboardStats.asnapshot()
+    return await _en_thread(request, _page_produits, stats)
+
+def _page_produits(request, stats):
+    total_produits = stats['produits_count']
+    total_stock = stats['total_stock']
+
+    # Pagination par curseur sur l'id (pas de OFFSET ni de COUNT par page)
+    produits = paginer_par_curseur(Produit.objects.all(), request.GET, ('id',), total=total_produits)
     
     return render(request, 'vente/produits.html', {
         'produits': produits,
         'total_produits': total_produits,
-        'total_stock': total_stock
+        'total_stock': total_stock,
+        'pagination_qs': _querystring_pagination(request),
     })
 
 @login_required
@@ -130,7 +108,9 @@ def ajouter_produit(request):
     if request.method == 'POST':
         form = ProduitForm(request.POST)
         if form.is_valid():
-            produit = form.save()
+            with transaction.atomic():
+                produit = form.save()
+                enregistrer_mouvement(produit, produit.stock, MouvementStock.INVENTAIRE)
             messages.success(request, f"Produit '{produit.nom}' ajouté.")
             return redirect('vente:liste_produits')
     else:
@@ -143,7 +123,11 @@ def modifier_produit(request, pk):
     if request.method == 'POST':
         form = ProduitForm(request.POST, instance=produit)
         if form.is_valid():
-            form.save()
+            with transaction.atomic():
+                # Écart relu sous verrou : une vente a pu modifier le stock depuis l'affichage
+                stock_avant = Produit.objects.select_for_update().values_list('stock', flat=True).get(pk=pk)
+                produit = form.save()
+                enregistrer_mouvement(produit, produit.stock - stock_avant)
             messages.success(request, "Produit modifié.")
             return redirect('vente:liste_produits')
     else:
@@ -164,21 +148,23 @@ def supprimer_produit(request, pk):
 # -----------------------
 @login_required
 def liste_clients(request):
-    clients_list = Client.objects.all().order_by('-id')
-    paginator = Paginator(clients_list, 5)  # 5 clients par page
-    page = request.GET.get('page')
-    try:
-        clients = paginator.page(page)
-    except PageNotAnInteger:
-        clients = paginator.page(1)
-    except EmptyPage:
-        clients = paginator.page(paginator.num_pages)
-    
-    total_clients = Client.objects.count()
+    with lecture_sur_replica(request):
+        total_clients = DashboardStats.snapshot()['clients_count']
+    return _page_clients(request, total_clients)
+
+@login_required
+async def liste_clients_async(request):
+    async with alecture_sur_replica(request):
+        total_clients = (await DashboardStats.asnapshot())['clients_count']
+    return await _en_thread(request, _page_clients, total_clients)
+
+def _page_clients(request, total_clients):
+    clients = paginer_par_curseur(Client.objects.all(), request.GET, ('id',), total=total_clients)
     
     return render(request, 'vente/clients.html', {
         'clients': clients,
-        'total_clients': total_clients
+        'total_clients': total_clients,
+        'pagination_qs': _querystring_pagination(request),
     })
 
 @login_required
@@ -220,138 +206,83 @@ def supprimer_client(request, pk):
 # -----------------------
 @login_required
 def liste_ventes(request):
-    ventes_list = Vente.objects.all().order_by('-date_vente')
-    
-    # Filtre par date
+    with lecture_sur_replica(request):
+        stats = DashboardStats.snapshot()
+    return _page_ventes(request, stats)
+
+@login_required
+async def liste_ventes_async(request):
+    async with alecture_sur_replica(request):
+        stats = await DashboardStats.asnapshot()
+    return await _en_thread(request, _page_ventes, stats)
+
+def _page_ventes(request, stats):
+    # Filtre par date (et par client / produit)
+    filtre = FiltreVentes.depuis_requete(request.GET)
     date_from = request.GET.get('date_from')
     date_to = request.GET.get('date_to')
-    
-    if date_from:
-        try:
-            from datetime import datetime
-            date_from_obj = datetime.strptime(date_from, '%Y-%m-%d')
-            ventes_list = ventes_list.filter(date_vente__date__gte=date_from_obj.date())
-        except:
-            pass
-    
-    if date_to:
-        try:
-            from datetime import datetime
-            date_to_obj = datetime.strptime(date_to, '%Y-%m-%d')
-            ventes_list = ventes_list.filter(date_vente__date__lte=date_to_obj.date())
-        except:
-            pass
-    
-    paginator = Paginator(ventes_list, 5)  # 5 ventes par page
-    page = request.GET.get('page')
-    try:
-        ventes = paginator.page(page)
-    except PageNotAnInteger:
-        ventes = paginator.page(1)
-    except EmptyPage:
-        ventes = paginator.page(paginator.num_pages)
-    
-    total_ventes = Vente.objects.count()
-    total_ca = Vente.objects.aggregate(total=Sum('total'))['total'] or 0
+    total_ventes = stats['ventes_count']
+    total_ca = stats['total_ca']
+
+    # Curseur sur (date_vente, id), servi par l'index vente_date_idx ;
+    # le client est joint pour afficher son nom sans une requête par ligne
+    ventes = paginer_par_curseur(
+        filtre.filtrer(Vente.objects.select_related('client')),
+        request.GET,
+        ('date_vente', 'id'),
+        total=None if filtre.est_actif else total_ventes,
+    )
     
     return render(request, 'vente/ventes.html', {
         'ventes': ventes,
         'total_ventes': total_ventes,
         'total_ca': total_ca,
         'date_from': date_from,
-        'date_to': date_to
+        'date_to': date_to,
+        'filtre': filtre,
+        'pagination_qs': _querystring_pagination(request, filtre),
     })
 
 @login_required
 def creer_vente(request):
     if request.method == 'POST':
         form = VenteForm(request.POST)
-        if form.is_valid():
+        formset = LigneVenteFormSet(request.POST, instance=Vente())
+        if form.is_valid() and formset.is_valid():
+            # Étape 1: Rassembler les lignes valides du panier
+            lignes = []
+            for form_ligne in formset:
+                if form_ligne.cleaned_data and not form_ligne.cleaned_data.get('DELETE'):
+                    produit = form_ligne.cleaned_data.get('produit')
+                    quantite = form_ligne.cleaned_data.get('quantite', 0)
+                    if produit and quantite and quantite > 0:
+                        lignes.append({
+                            'produit': produit,
+                            'quantite': quantite,
+                            'prix_unitaire': form_ligne.cleaned_data.get('prix_unitaire'),
+                        })
+            
+            # Étape 2: Enregistrer la vente (verrouillage, stock et lignes en une transaction)
             vente = form.save(commit=False)
-            vente.total = 0
-            vente.save()
-            formset = LigneVenteFormSet(request.POST, instance=vente)
-            if formset.is_valid():
-                # Étape 1: Vérifier le stock disponible pour tous les articles
-                stock_insuffisant = []
-                lignes_a_creer = []
-                
-                for form_ligne in formset:
-                    if form_ligne.cleaned_data and not form_ligne.cleaned_data.get('DELETE'):
-                        produit = form_ligne.cleaned_data.get('produit')
-                        quantite = form_ligne.cleaned_data.get('quantite', 0)
-                        prix_unitaire = form_ligne.cleaned_data.get('prix_unitaire')
-                        
-                        if produit and quantite and quantite > 0:
-                            if not produit.en_stock(quantite):
-                                stock_insuffisant.append(
-                                    f"{produit.nom}: {quantite} demandé(s) mais seulement {produit.stock} en stock"
-                                )
-                            else:
-                                lignes_a_creer.append({
-                                    'produit': produit,
-                                    'quantite': quantite,
-                                    'prix_unitaire': prix_unitaire or produit.prix
-                                })
-                
-                # Si stock insuffisant, rejeter la vente
-                if stock_insuffisant:
-                    vente.delete()
-                    for erreur in stock_insuffisant:
-                        messages.error(request, erreur)
-                    context = {
-                        'form': form,
-                        'formset': formset,
-                        'produits': Produit.objects.all()
-                    }
-                    return render(request, 'vente/creer_vente.html', context)
-                
-                # Étape 2: Créer les lignes de vente et décrémenter le stock
-                lignes_creees = []
-                try:
-                    for data_ligne in lignes_a_creer:
-                        ligne = LigneVente.objects.create(
-                            vente=vente,
-                            produit=data_ligne['produit'],
-                            quantite=data_ligne['quantite'],
-                            prix_unitaire=data_ligne['prix_unitaire']
-                        )
-                        
-                        # Décrémenter le stock immédiatement
-                        produit = data_ligne['produit']
-                        if produit.decrementer_stock(data_ligne['quantite']):
-                            ligne.stock_deduit = True
-                            ligne.save()
-                            lignes_creees.append(ligne)
-                        else:
-                            raise Exception(f"Impossible de décrémenter le stock pour {produit.nom}")
-                    
-                    # Étape 3: Calculer le total
-                    vente.calculer_total()
-                    
-                    # Étape 4: Afficher les avertissements de stock faible
-                    for ligne in vente.lignes.all():
-                        if ligne.produit.stock <= ligne.produit.seuil_alerte:
-                            messages.warning(
-                                request,
-                                f"⚠️ Attention: {ligne.produit.nom} est en stock faible ({ligne.produit.stock} restant)"
-                            )
-                    
-                    messages.success(request, f"✓ Vente #{vente.id} créée avec succès (Total: {vente.total})")
-                    return redirect('vente:liste_ventes')
-                    
-                except Exception as e:
-                    # En cas d'erreur, restaurer tous les stocks et supprimer la vente
-                    for ligne in lignes_creees:
-                        ligne.produit.restaurer_stock(ligne.quantite)
-                    vente.delete()
-                    messages.error(request, f"Erreur lors de la création de la vente: {str(e)}")
-                    return redirect('vente:creer_vente')
+            try:
+                lignes_creees = passer_vente(vente, lignes)
+            except StockInsuffisant as e:
+                for erreur in e.erreurs:
+                    messages.error(request, erreur)
             else:
-                # Si formset invalide, supprimer la vente temporaire
-                vente.delete()
-                for error in formset.non_form_errors():
-                    messages.error(request, error)
+                # Étape 3: Afficher les avertissements de stock faible
+                for ligne in lignes_creees:
+                    if ligne.produit.stock <= ligne.produit.seuil_alerte:
+                        messages.warning(
+                            request,
+                            f"⚠️ Attention: {ligne.produit.nom} est en stock faible ({ligne.produit.stock} restant)"
+                        )
+                
+                messages.success(request, f"✓ Vente #{vente.id} créée avec succès (Total: {vente.total})")
+                return redirect('vente:liste_ventes')
+        else:
+            for error in formset.non_form_errors():
+                messages.error(request, error)
     else:
         form = VenteForm()
         formset = LigneVenteFormSet()
@@ -363,240 +294,304 @@ def creer_vente(request):
         'form': form,
         'formset': formset,
         'produits_seuil': produits_seuil,
-        'produits': Produit.objects.all()
     }
     return render(request, 'vente/creer_vente.html', context)
 
 
+# -----------------------
+# Autocomplétion (formulaire de vente)
+# -----------------------
+def _limite_recherche(request):
+    try:
+        return int(request.GET.get('limite', 20))
+    except ValueError:
+        return 20
+
+
+@login_required
+def produits_autocomplete(request):
+    """Produits dont le nom correspond à ?q=, avec prix et stock"""
+    resultats = rechercher_produits(request.GET.get('q', ''), _limite_recherche(request))
+    for produit in resultats:
+        produit['prix'] = str(produit['prix'])
+    return JsonResponse({'resultats': resultats})
+
+
+@login_required
+def clients_autocomplete(request):
+    """Clients dont le nom correspond à ?q="""
+    return JsonResponse({'resultats': rechercher_clients(request.GET.get('q', ''), _limite_recherche(request))})
+
+
+# -----------------------
+# Catalogue produits (page de vente, caisses)
+# -----------------------
+def catalogue_produits(request):
+    """
+    Instantané JSON du catalogue ; ?depuis=<version> ne renvoie que les
+    produits modifiés. Revalidation par ETag : 304 si rien n'a changé.
+    """
+    if not request.user.is_authenticated and not _jeton_api_valide(request):
+        return JsonResponse({'erreur': 'Authentification requise'}, status=401)
+    try:
+        depuis = int(request.GET['depuis'])
+    except (KeyError, ValueError):
+        depuis = None
+
+    compteur, suppression = etat_actuel()
+    etag = f'"catalogue-{compteur}-{depuis if depuis is not None else "complet"}"'
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = JsonResponse(instantane(depuis, suppression))
+    response['ETag'] = etag
+    # Le navigateur garde la réponse mais revalide à chaque chargement de page
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+# -----------------------
+# API d'import de ventes (caisses, site marchand)
+# -----------------------
+def _jeton_api_valide(request, jetons=None):
+    if jetons is None:
+        jetons = settings.VENTE_API_TOKENS
+    entete = request.headers.get('Authorization', '')
+    if not entete.startswith('Bearer '):
+        return False
+    jeton = entete[len('Bearer '):].strip()
+    return any(hmac.compare_digest(jeton, valide) for valide in jetons)
+
+
+@csrf_exempt
+@require_POST
+def api_importer_ventes(request):
+    """Enregistre un lot de ventes envoyé en JSON: {"ventes": [...]}"""
+    if not _jeton_api_valide(request):
+        return JsonResponse({'erreur': 'Authentification requise'}, status=401)
+    try:
+        donnees = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({'erreur': 'JSON invalide'}, status=400)
+    ventes = donnees.get('ventes') if isinstance(donnees, dict) else None
+    if not isinstance(ventes, list):
+        return JsonResponse({'erreur': 'Le champ "ventes" doit être une liste'}, status=400)
+    if len(ventes) > settings.VENTE_API_MAX_VENTES:
+        return JsonResponse(
+            {'erreur': f'Maximum {settings.VENTE_API_MAX_VENTES} ventes par requête'}, status=413
+        )
+    return JsonResponse({'resultats': importer_ventes(ventes)})
+
+
+# -----------------------
+# Import CSV
+# -----------------------
+@login_required
+def importer_csv(request, type_import):
+    """Import (ou mise à jour par nom) de produits / clients depuis un fichier CSV"""
+    if type_import not in TYPES_IMPORT:
+        raise Http404
+    resultat = None
+    if request.method == 'POST' and request.FILES.get('fichier'):
+        # Le fichier téléversé est lu au fil de l'eau, sans être chargé en mémoire
+        flux = io.TextIOWrapper(request.FILES['fichier'].file, encoding='utf-8-sig', newline='')
+        try:
+            resultat = importer_fichier_csv(flux, type_import)
+        except (ImportInvalide, UnicodeDecodeError) as e:
+            messages.error(request, f"❌ Fichier invalide: {e}")
+        else:
+            messages.success(
+                request,
+                f"✅ {resultat.crees} créé(s), {resultat.mis_a_jour} mis à jour, {resultat.rejetees} ligne(s) rejetée(s)"
+            )
+    elif request.method == 'POST':
+        messages.error(request, "❌ Aucun fichier sélectionné")
+    return render(request, 'vente/import_csv.html', {
+        'type_import': type_import,
+        'colonnes': list(TYPES_IMPORT[type_import][1].base_fields),
+        'resultat': resultat,
+    })
+
 # -----------------------
 # Rapports et PDF
 # -----------------------
 
 @login_required
+@lecture_replica
 def clients_ayant_achete(request):
     """Liste les clients qui ont acheté avec leurs numéros de téléphone"""
-    # Récupérer les clients qui ont au moins une vente
-    clients_avec_achats = Client.objects.filter(
-        vente__isnull=False
-    ).distinct().annotate(
-        nombre_achats=Count('vente'),
-        montant_total=Sum('vente__total')
-    ).order_by('-montant_total')
-    
-    context = {
-        'clients': clients_avec_achats,
-        'total_clients': clients_avec_achats.count(),
+    # Récupérer les clients qui ont au moins une vente (sur la période filtrée)
+    filtre = FiltreVentes.depuis_requete(request.GET)
+    clients = clients_avec_achats(filtre)
+    return render(request, 'vente/clients_achetes.html', _contexte_clients_achetes(request, filtre, clients))
+
+
+@login_required
+@lecture_replica
+async def clients_ayant_achete_async(request):
+    filtre = FiltreVentes.depuis_requete(request.GET)
+    clients = [client async for client in clients_avec_achats(filtre)]
+    return await _en_thread(
+        request, render, 'vente/clients_achetes.html', _contexte_clients_achetes(request, filtre, clients)
+    )
+
+
+def _contexte_clients_achetes(request, filtre, clients):
+    return {
+        'clients': clients,
+        'total_clients': len(clients),
+        'filtre': filtre,
+        'date_from': request.GET.get('date_from'),
+        'date_to': request.GET.get('date_to'),
     }
-    return render(request, 'vente/clients_achetes.html', context)
 
 
 @login_required
+@lecture_replica
 def exporter_clients_pdf(request):
     """Exporte la liste des clients qui ont acheté en PDF"""
-    # Récupérer les clients qui ont acheté
-    clients = Client.objects.filter(
-        vente__isnull=False
-    ).distinct().annotate(
-        nombre_achats=Count('vente'),
-        montant_total=Sum('vente__total')
-    ).order_by('-montant_total')
-    
-    # Créer la réponse PDF
+    return _pdf_clients(request)
+
+
+@login_required
+@lecture_replica
+async def exporter_clients_pdf_async(request):
+    # reportlab et ses requêtes tournent dans un thread, hors de la boucle d'événements
+    return await _en_thread(request, _pdf_clients)
+
+
+def _pdf_clients(request):
     response = HttpResponse(content_type='application/pdf')
     response['Content-Disposition'] = 'attachment; filename="rapport_clients.pdf"'
-    
-    # Créer le document PDF
-    doc = SimpleDocTemplate(response, pagesize=A4)
-    story = []
-    styles = getSampleStyleSheet()
-    
-    # Titre
-    title_style = ParagraphStyle(
-        'Title',
-        parent=styles['Heading1'],
-        fontSize=18,
-        textColor=colors.HexColor('#2c3e50'),
-        spaceAfter=30,
-        alignment=TA_CENTER
-    )
-    story.append(Paragraph("RAPPORT DES CLIENTS", title_style))
-    story.append(Spacer(1, 0.3*inch))
-    
-    # Date du rapport
-    date_style = ParagraphStyle(
-        'Date',
-        parent=styles['Normal'],
-        fontSize=10,
-        textColor=colors.grey,
-        alignment=TA_RIGHT
-    )
-    story.append(Paragraph(f"Généré le: {datetime.now().strftime('%d/%m/%Y %H:%M')}", date_style))
-    story.append(Spacer(1, 0.2*inch))
-    
-    # Statistiques
-    stats_data = [
-        ['Total de clients ayant acheté:', str(clients.count())],
-        ['Nombre total d\'achats:', str(sum(c.nombre_achats for c in clients))],
-        ['Montant total généré:', f"{sum(c.montant_total for c in clients if c.montant_total)}"]
-    ]
-    stats_table = Table(stats_data, colWidths=[3*inch, 2*inch])
-    stats_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#ecf0f1')),
-        ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('FONTNAME', (0, 0), (-1, -1), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, -1), 11),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 12),
-        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-    ]))
-    story.append(stats_table)
-    story.append(Spacer(1, 0.3*inch))
-    
-    # Tableau des clients
-    data = [['Nom', 'Téléphone', 'Email', 'Nombre d\'achats', 'Montant Total']]
-    
-    for client in clients:
-        data.append([
-            client.nom,
-            client.telephone or '-',
-            client.email or '-',
-            str(client.nombre_achats),
-            f"{client.montant_total:.2f} DZD" if client.montant_total else "0.00 DZD"
-        ])
-    
-    # Créer le tableau
-    table = Table(data, colWidths=[1.8*inch, 1.3*inch, 1.5*inch, 1.2*inch, 1.2*inch])
-    table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#3498db')),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('ALIGN', (0, 0), (0, -1), 'LEFT'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 11),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black),
-        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#ecf0f1')]),
-        ('FONTSIZE', (0, 1), (-1, -1), 9),
-    ]))
-    
-    story.append(table)
-    story.append(Spacer(1, 0.3*inch))
-    
-    # Footer
-    footer_style = ParagraphStyle(
-        'Footer',
-        parent=styles['Normal'],
-        fontSize=8,
-        textColor=colors.grey,
-        alignment=TA_CENTER
-    )
-    story.append(Paragraph("Rapport généré automatiquement par le système de gestion des ventes", footer_style))
-    
-    # Générer le PDF
-    doc.build(story)
+    generer_rapport_clients(response, FiltreVentes.depuis_requete(request.GET))
     return response
 
 
 @login_required
+@lecture_replica
 def exporter_ventes_pdf(request):
     """Exporte le rapport de ventes en PDF"""
-    ventes = Vente.objects.all().select_related('client').prefetch_related('lignes__produit').order_by('-date_vente')
-    
-    # Créer la réponse PDF
-    response = HttpResponse(content_type='application/pdf')
+    return _pdf_ventes(request)
+
+
+@login_required
+@lecture_replica
+async def exporter_ventes_pdf_async(request):
+    fichier, taille = await _en_thread(request, _fichier_pdf_ventes)
+    # Sous ASGI, un FileResponse sur un fichier sync serait d'abord lu en entier en mémoire
+    response = StreamingHttpResponse(_morceaux(fichier), content_type='application/pdf')
     response['Content-Disposition'] = 'attachment; filename="rapport_ventes.pdf"'
-    
-    # Créer le document PDF
-    doc = SimpleDocTemplate(response, pagesize=A4)
-    story = []
-    styles = getSampleStyleSheet()
-    
-    # Titre
-    title_style = ParagraphStyle(
-        'Title',
-        parent=styles['Heading1'],
-        fontSize=18,
-        textColor=colors.HexColor('#2c3e50'),
-        spaceAfter=30,
-        alignment=TA_CENTER
-    )
-    story.append(Paragraph("RAPPORT DE VENTES", title_style))
-    story.append(Spacer(1, 0.3*inch))
-    
-    # Date du rapport
-    date_style = ParagraphStyle(
-        'Date',
-        parent=styles['Normal'],
-        fontSize=10,
-        textColor=colors.grey,
-        alignment=TA_RIGHT
-    )
-    story.append(Paragraph(f"Généré le: {datetime.now().strftime('%d/%m/%Y %H:%M')}", date_style))
-    story.append(Spacer(1, 0.2*inch))
-    
-    # Statistiques
-    total_montant = sum(v.total for v in ventes)
-    stats_data = [
-        ['Total de ventes:', str(ventes.count())],
-        ['Montant total généré:', f"{total_montant:.2f} FC"],
-        ['Nombre de lignes vendues:', str(LigneVente.objects.count())]
-    ]
-    stats_table = Table(stats_data, colWidths=[3*inch, 2*inch])
-    stats_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#ecf0f1')),
-        ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('FONTNAME', (0, 0), (-1, -1), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, -1), 11),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 12),
-        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-    ]))
-    story.append(stats_table)
-    story.append(Spacer(1, 0.3*inch))
-    
-    # Tableau des ventes
-    data = [['N° Vente', 'Client', 'Date', 'Montant', 'Produits']]
-    
-    for vente in ventes:
-        produits = ', '.join([f"{l.produit.nom} (×{l.quantite})" for l in vente.lignes.all()])
-        data.append([
-            f"#{vente.id}",
-            vente.client.nom if vente.client else 'N/A',
-            vente.date_vente.strftime('%d/%m/%Y'),
-            f"{vente.total:.2f} Fc",
-            produits[:50] + '...' if len(produits) > 50 else produits
-        ])
-    
-    # Créer le tableau
-    table = Table(data, colWidths=[0.8*inch, 1.5*inch, 1.2*inch, 1*inch, 2.5*inch])
-    table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#27ae60')),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('ALIGN', (0, 0), (0, -1), 'LEFT'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 10),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black),
-        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#ecf0f1')]),
-        ('FONTSIZE', (0, 1), (-1, -1), 8),
-    ]))
-    
-    story.append(table)
-    story.append(Spacer(1, 0.3*inch))
-    
-    # Footer
-    footer_style = ParagraphStyle(
-        'Footer',
-        parent=styles['Normal'],
-        fontSize=8,
-        textColor=colors.grey,
-        alignment=TA_CENTER
-    )
-    story.append(Paragraph("Rapport généré automatiquement par le système de gestion des ventes", footer_style))
-    
-    # Générer le PDF
-    doc.build(story)
+    response['Content-Length'] = taille
     return response
+
+
+def _pdf_ventes(request):
+    fichier, _ = _fichier_pdf_ventes(request)
+    return FileResponse(fichier, as_attachment=True, filename='rapport_ventes.pdf', content_type='application/pdf')
+
+
+def _fichier_pdf_ventes(request):
+    # Fichier temporaire en mémoire, basculé sur disque au-delà de 10 Mo
+    fichier = tempfile.SpooledTemporaryFile(max_size=10 * 1024 * 1024)
+    generer_rapport_ventes(fichier, FiltreVentes.depuis_requete(request.GET))
+    taille = fichier.tell()
+    fichier.seek(0)
+    return fichier, taille
+
+
+async def _morceaux(fichier, taille=64 * 1024):
+    """Contenu d'un fichier temporaire local, par morceaux (lectures courtes, faites dans la boucle)"""
+    try:
+        while morceau := fichier.read(taille):
+            yield morceau
+    finally:
+        fichier.close()
+
+
+@login_required
+def exporter_lignes_ventes(request):
+    """Lignes de vente brutes (comptabilité) en CSV, ou en XLSX avec ?format=xlsx, envoyées en flux"""
+    return _export_lignes(request, iter)
+
+
+@login_required
+async def exporter_lignes_ventes_async(request):
+    # Sous ASGI, Django lirait d'abord en entier un générateur sync (sync_to_async(list))
+    return _export_lignes(request, _flux_async)
+
+
+def _export_lignes(request, flux):
+    lignes = lignes_ventes(FiltreVentes.depuis_requete(request.GET))
+    if request.GET.get('format') == 'xlsx':
+        response = StreamingHttpResponse(
+            flux(exporter_xlsx(lignes)),
+            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+        )
+        nom_fichier = 'lignes_ventes.xlsx'
+    else:
+        response = StreamingHttpResponse(flux(exporter_csv(lignes)), content_type='text/csv; charset=utf-8')
+        nom_fichier = 'lignes_ventes.csv'
+    response['Content-Disposition'] = f'attachment; filename="{nom_fichier}"'
+    return response
+
+
+async def _flux_async(generateur):
+    """
+    Morceaux d'un générateur sync (ORM, écriture CSV/XLSX) produits un à un
+    dans le thread de l'ORM : la mémoire reste constante et l'envoi commence
+    au premier morceau
+    """
+    suivant = sync_to_async(next)
+    fin = object()
+    try:
+        while (morceau := await suivant(generateur, fin)) is not fin:
+            yield morceau
+    finally:
+        await sync_to_async(generateur.close)()
+
+
+# -----------------------
+# Rapports en arrière-plan
+# -----------------------
+@login_required
+@require_POST
+def demander_rapport_pdf(request, type_rapport):
+    """Met un rapport PDF en file d'attente (ou réutilise celui déjà généré)"""
+    if type_rapport not in dict(RapportJob.TYPES):
+        raise Http404("Type de rapport inconnu")
+    filtre = FiltreVentes.depuis_requete(request.GET)
+    job = demander_rapport(type_rapport, filtres=filtre.as_dict(), demandeur=request.user)
+    return redirect('vente:statut_rapport', pk=job.pk)
+
+
+@login_required
+def statut_rapport(request, pk):
+    """Page de suivi d'un rapport ; renvoie du JSON avec ?format=json"""
+    job = get_object_or_404(RapportJob, pk=pk)
+    if request.GET.get('format') == 'json':
+        return JsonResponse({
+            'id': job.pk,
+            'statut': job.statut,
+            'erreur': job.erreur,
+            'url': reverse('vente:telecharger_rapport', args=[job.pk]) if job.statut == RapportJob.TERMINE else None,
+        })
+    return render(request, 'vente/rapport_job.html', {'job': job})
+
+
+@login_required
+def telecharger_rapport(request, pk):
+    job = get_object_or_404(RapportJob, pk=pk, statut=RapportJob.TERMINE)
+    chemin = chemin_rapport(job.cle_cache)
+    if not chemin.exists():
+        raise Http404("Rapport expiré, veuillez le redemander")
+    return FileResponse(open(chemin, 'rb'), as_attachment=True, filename=NOMS_FICHIERS[job.type_rapport],
+                        content_type='application/pdf')
+
+
+# -----------------------
+# Supervision
+# -----------------------
+def metriques(request):
+    """Histogrammes de performance par vue, au format texte de Prometheus"""
+    if settings.VENTE_METRIQUES_JETONS and not _jeton_api_valide(request, settings.VENTE_METRIQUES_JETONS):
+        return HttpResponse('Authentification requise', status=401, content_type='text/plain')
+    return HttpResponse(exposition(), content_type='text/plain; version=0.0.4; charset=utf-8')